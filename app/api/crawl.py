@@ -1,11 +1,22 @@
 import json
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from typing import Literal
+from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi.responses import HTMLResponse
 from pydantic import BaseModel, HttpUrl
-from datetime import datetime
 from app.database import get_db
-from app.services.crawler import crawl
-from app.services.ai_mapper import map_to_structure
-from app.services.confidence import calculate_overall
+from app.services.scheduler import scheduler, CrawlTask, QueueFullError
+from app.services.browser_pool import browser_pool
+from app.services.leases import feeder, claim_job, release_job
+from app.services.pipeline import pipeline
+from app.services.challenge import cooldowns
+from app.services.retry import breakers
+from app.services.mapping_cache import cache_stats
+from app.services.ai_mapper import mapper_stats
+from app.services.llm_client import llm
+from app.services.lookup_cache import get_website, lookup_stats
+from app.services.blob_store import get_html, store_stats
+from app.services.pagination import ORDER, NEXT_CURSOR_HEADER, after_cursor, paginate
+from app.config import CRAWL_DISPATCH_MODE, CRAWL_QUEUE_SIZE
 
 router = APIRouter(prefix="/api/crawl", tags=["crawl"])
 
@@ -33,99 +44,62 @@ class CrawlJobDetail(BaseModel):
     url: str
     status: str
     error: str | None
+    fetchTier: str | None = None
+    readyWaitMs: int | None = None
+    trafficStats: dict | None = None
+    errorClass: str | None = None
+    attemptHistory: list | None = None
+    contentStats: dict | None = None
+    mappingCache: str | None = None
+    unchanged: bool = False
+    eventCount: int | None = None
+    htmlHash: str | None = None
+    htmlSize: int | None = None
+    htmlStoredSize: int | None = None
     createdAt: str
     completedAt: str | None
 
 
-async def process_crawl(job_id: str, website_id: str, url: str, use_javascript: bool):
-    """Background task to process a single crawl job"""
-    db = get_db()
-
+async def _queue_capacity() -> int:
+    """Number of new jobs that can be accepted right now"""
+    if CRAWL_DISPATCH_MODE == "queue":
+        db = get_db()
+        pending = await db.crawljob.count(where={"status": "pending"})
+        return max(0, CRAWL_QUEUE_SIZE - pending)
+    return scheduler.capacity()
+
+
+async def _dispatch(task: CrawlTask):
+    """
+    Hand a new job to the local scheduler (workers claim it in queue mode).
+
+    The job is claimed first, so the job feeder (which also runs in local
+    mode) cannot claim the same pending job into a second scheduler slot.
+    """
+    if CRAWL_DISPATCH_MODE == "queue":
+        return
+    if not await claim_job(task.job_id):
+        # The feeder got there first
+        return
+    task.claimed = True
     try:
-        # Update status to processing
-        await db.crawljob.update(
-            where={"id": job_id},
-            data={"status": "processing"}
-        )
-
-        # Get website info
-        website = await db.targetwebsite.find_unique(where={"id": website_id})
-        if not website:
-            raise Exception("Website not found")
-
-        # Get active structure
-        structure = await db.eventstructure.find_first(where={"isActive": True})
-        if not structure:
-            raise Exception("No active event structure found")
-
-        # Crawl the page
-        raw_html = await crawl(url, use_javascript)
-
-        # Validate we got the right content (basic check)
-        if "scrapingbee" in raw_html.lower() or "cloudflare" in raw_html.lower():
-            # Check if we got blocked or redirected
-            if "scrapingbee" in raw_html.lower():
-                raise Exception("Got redirected to ScrapingBee page - possible bot detection")
-            if "challenge" in raw_html.lower() and "cloudflare" in raw_html.lower():
-                raise Exception("Cloudflare challenge detected - bot protection active")
-
-        # Save raw HTML (first 50k chars to avoid huge database entries)
-        await db.crawljob.update(
-            where={"id": job_id},
-            data={"rawHtml": raw_html[:50000] if len(raw_html) > 50000 else raw_html}
-        )
-
-        # Map with AI
-        ai_result = await map_to_structure(
-            raw_html,
-            json.loads(structure.structure),  # Deserialize JSON string
-            website.notes or ""
-        )
-
-        # Calculate overall confidence
-        overall_confidence = calculate_overall(ai_result["field_confidences"])
-
-        # Save event
-        await db.event.create(
-            data={
-                "crawlJobId": job_id,
-                "websiteId": website_id,
-                "eventData": json.dumps(ai_result["event_data"]),  # Serialize to JSON string
-                "overallConfidence": overall_confidence,
-                "fieldConfidences": json.dumps(ai_result["field_confidences"]),  # Serialize to JSON string
-                "aiNotes": ai_result["notes"],
-                "sourceUrl": url
-            }
-        )
-
-        # Mark job as completed
-        await db.crawljob.update(
-            where={"id": job_id},
-            data={
-                "status": "completed",
-                "completedAt": datetime.utcnow()
-            }
-        )
-
-    except Exception as e:
-        # Mark job as failed
-        await db.crawljob.update(
-            where={"id": job_id},
-            data={
-                "status": "failed",
-                "error": str(e),
-                "completedAt": datetime.utcnow()
-            }
-        )
+        scheduler.submit(task)
+    except QueueFullError:
+        # Back to pending; the job feeder picks it up later
+        await release_job(task.job_id)
 
 
 @router.post("", response_model=CrawlJobResponse)
-async def trigger_crawl(request: CrawlRequest, background_tasks: BackgroundTasks):
+async def trigger_crawl(request: CrawlRequest):
     """Trigger a single crawl job"""
     db = get_db()
 
+    # Apply backpressure before doing any work
+    if await _queue_capacity() < 1:
+        raise HTTPException(status_code=429, detail="Crawl queue is full, retry later")
+
     # Verify website exists
-    website = await db.targetwebsite.find_unique(where={"id": request.website_id})
+    website = await get_website(request.website_id)
     if not website:
         raise HTTPException(status_code=404, detail="Website not found")
 
@@ -134,29 +108,33 @@ async def trigger_crawl(request: CrawlRequest, background_tasks: BackgroundTasks
         data={
             "websiteId": request.website_id,
             "url": str(request.url),
-            "status": "pending"
+            "status": "pending",
+            "useJavascript": request.use_javascript
         }
     )
 
-    # Queue background task
-    background_tasks.add_task(
-        process_crawl,
-        job.id,
-        request.website_id,
-        str(request.url),
-        request.use_javascript
-    )
+    # Queue job
+    await _dispatch(CrawlTask(job.id, request.website_id, str(request.url), request.use_javascript))
 
     return CrawlJobResponse(job_id=job.id, status="pending")
 
 
 @router.post("/batch", response_model=list[CrawlJobResponse])
-async def trigger_batch_crawl(request: BatchCrawlRequest, background_tasks: BackgroundTasks):
+async def trigger_batch_crawl(request: BatchCrawlRequest):
     """Trigger multiple crawl jobs"""
     db = get_db()
 
+    # Reject the whole batch up front if it cannot be queued
+    capacity = await _queue_capacity()
+    if capacity < len(request.urls):
+        raise HTTPException(
+            status_code=429,
+            detail=f"Crawl queue cannot take {len(request.urls)} jobs "
+                   f"({capacity} slots free), retry later"
+        )
+
     # Verify website exists
-    website = await db.targetwebsite.find_unique(where={"id": request.website_id})
+    website = await get_website(request.website_id)
     if not website:
         raise HTTPException(status_code=404, detail="Website not found")
 
@@ -168,24 +146,101 @@ async def trigger_batch_crawl(request: BatchCrawlRequest, background_tasks: Back
             data={
                 "websiteId": request.website_id,
                 "url": str(url),
-                "status": "pending"
+                "status": "pending",
+                "useJavascript": request.use_javascript
             }
         )
 
         jobs.append(CrawlJobResponse(job_id=job.id, status="pending"))
 
-        # Queue background task
-        background_tasks.add_task(
-            process_crawl,
-            job.id,
-            request.website_id,
-            str(url),
-            request.use_javascript
-        )
+        # Queue job
+        await _dispatch(CrawlTask(job.id, request.website_id, str(url), request.use_javascript))
 
     return jobs
 
 
+@router.get("/stats")
+async def crawl_stats():
+    """Scheduler, pipeline stage, job feeder and browser pool metrics"""
+    return {
+        "dispatch_mode": CRAWL_DISPATCH_MODE,
+        "scheduler": scheduler.snapshot(),
+        "pipeline": pipeline.snapshot(),
+        "feeder": feeder.snapshot(),
+        "browser_pool": browser_pool.snapshot(),
+        "challenge_cooldowns": cooldowns(),
+        "circuit_breakers": breakers(),
+        "mapping_cache": cache_stats(),
+        "ai_mapper": mapper_stats(),
+        "llm_client": llm.snapshot(),
+        "lookup_cache": lookup_stats(),
+        "html_store": store_stats(),
+    }
+
+
+def _job_detail(result) -> CrawlJobDetail:
+    return CrawlJobDetail(
+        id=result.id,
+        websiteId=result.websiteId,
+        url=result.url,
+        status=result.status,
+        error=result.error,
+        fetchTier=result.fetchTier,
+        readyWaitMs=result.readyWaitMs,
+        trafficStats=json.loads(result.trafficStats) if result.trafficStats else None,  # Deserialize JSON string
+        errorClass=result.errorClass,
+        attemptHistory=json.loads(result.attemptHistory) if result.attemptHistory else None,  # Deserialize JSON string
+        contentStats=json.loads(result.contentStats) if result.contentStats else None,  # Deserialize JSON string
+        mappingCache=result.mappingCache,
+        unchanged=result.unchanged,
+        eventCount=result.eventCount,
+        htmlHash=result.htmlHash,
+        htmlSize=result.htmlSize,
+        htmlStoredSize=result.htmlStoredSize,
+        createdAt=result.createdAt.isoformat(),
+        completedAt=result.completedAt.isoformat() if result.completedAt else None
+    )
+
+
+@router.get("", response_model=list[CrawlJobDetail])
+async def list_crawl_jobs(
+    response: Response,
+    status: Literal["pending", "processing", "completed", "failed"] | None = None,
+    website_id: str | None = None,
+    limit: int = Query(default=50, ge=1, le=500),
+    cursor: str | None = Query(default=None, description=f"Next page, from the {NEXT_CURSOR_HEADER} response header")
+):
+    """
+    List crawl jobs, newest first.
+
+    Pages are at most `limit` jobs; while there are more, the response
+    carries the cursor of the next page in the X-Next-Cursor header.
+    """
+    db = get_db()
+
+    where = {}
+    if status:
+        where["status"] = status
+    if website_id:
+        where["websiteId"] = website_id
+    if cursor:
+        try:
+            where.update(after_cursor(cursor))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    results = await db.crawljob.find_many(
+        where=where,
+        order=ORDER,
+        take=limit + 1
+    )
+
+    page, next_cursor = paginate(results, limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return [_job_detail(job) for job in page]
+
+
 @router.get("/{job_id}", response_model=CrawlJobDetail)
 async def get_crawl_job(job_id: str):
     """Get crawl job status and details"""
@@ -196,12 +251,22 @@ async def get_crawl_job(job_id: str):
     if not result:
         raise HTTPException(status_code=404, detail="Crawl job not found")
 
-    return CrawlJobDetail(
-        id=result.id,
-        websiteId=result.websiteId,
-        url=result.url,
-        status=result.status,
-        error=result.error,
-        createdAt=result.createdAt.isoformat(),
-        completedAt=result.completedAt.isoformat() if result.completedAt else None
-    )
+    return _job_detail(result)
+
+
+@router.get("/{job_id}/html", response_class=HTMLResponse)
+async def get_crawl_job_html(job_id: str):
+    """Get the full raw HTML a crawl job captured"""
+    db = get_db()
+
+    result = await db.crawljob.find_unique(where={"id": job_id})
+
+    if not result:
+        raise HTTPException(status_code=404, detail="Crawl job not found")
+
+    html = await get_html(result.htmlHash) if result.htmlHash else None
+    # Jobs from before the blob store kept a truncated copy inline
+    html = html or result.rawHtml
+    if not html:
+        raise HTTPException(status_code=404, detail="No HTML snapshot for this crawl job")
+    return HTMLResponse(html)
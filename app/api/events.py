@@ -1,7 +1,13 @@
-import json
-from fastapi import APIRouter, HTTPException, Query
+from datetime import datetime
+from typing import Literal
+from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from app.database import get_db
+from app.database import get_db, as_document
+from app.services.event_query import build_filter, find_events, parse_pairs
+from app.services.event_export import export_csv, export_ndjson
+from app.services.lookup_cache import get_active_structure
+from app.services.pagination import ORDER, NEXT_CURSOR_HEADER, after_cursor, paginate
 
 router = APIRouter(prefix="/api/events", tags=["events"])
 
@@ -14,45 +20,148 @@ class EventResponse(BaseModel):
     overallConfidence: float
     fieldConfidences: dict
     aiNotes: str
+    extractionMethod: str | None = None
+    modelTier: str | None = None
     sourceUrl: str
     createdAt: str
 
 
+def _event_response(e) -> EventResponse:
+    """Event record (Prisma model or events document) -> EventResponse"""
+    get = e.get if isinstance(e, dict) else lambda name: getattr(e, name)
+    return EventResponse(
+        id=get("id"),
+        crawlJobId=get("crawlJobId"),
+        websiteId=get("websiteId"),
+        eventData=as_document(get("eventData")),
+        overallConfidence=get("overallConfidence"),
+        fieldConfidences=as_document(get("fieldConfidences")),
+        aiNotes=get("aiNotes"),
+        extractionMethod=get("extractionMethod"),
+        modelTier=get("modelTier"),
+        sourceUrl=get("sourceUrl"),
+        createdAt=get("createdAt").isoformat()
+    )
+
+
 @router.get("", response_model=list[EventResponse])
 async def list_events(
+    response: Response,
     website_id: str | None = None,
+    review_status: Literal["pending", "approved", "rejected"] | None = None,
     min_confidence: float = Query(default=0, ge=0, le=100),
-    limit: int = Query(default=50, ge=1, le=500)
+    date_from: str | None = Query(default=None, description="ISO 8601 date or datetime"),
+    date_to: str | None = Query(default=None, description="ISO 8601 date (inclusive) or datetime"),
+    date_field: str | None = Query(default=None, description="Field the date range applies to (default: the structure's date field)"),
+    field: list[str] = Query(default=[], description="path:text, the field contains text (e.g. location.city:berlin)"),
+    confidence: list[str] = Query(default=[], description="path:min, minimum confidence of a field (e.g. start_date:80)"),
+    limit: int = Query(default=50, ge=1, le=500),
+    cursor: str | None = Query(default=None, description=f"Next page, from the {NEXT_CURSOR_HEADER} response header")
 ):
-    """List events with optional filters"""
-    db = get_db()
+    """
+    List events, newest first, with optional filters (all filters run in the database).
+
+    Pages are at most `limit` events; while there are more, the response
+    carries the cursor of the next page in the X-Next-Cursor header.
+    """
+    # Filters inside the event documents are beyond Prisma on MongoDB
+    if date_from or date_to or field or confidence:
+        structure = await get_active_structure()
+        try:
+            where = build_filter(
+                structure.structure if structure else None,
+                website_id=website_id,
+                review_status=review_status,
+                min_confidence=min_confidence,
+                date_from=date_from,
+                date_to=date_to,
+                date_path=date_field,
+                fields=parse_pairs(field, "field"),
+                confidences=parse_pairs(confidence, "confidence"),
+            )
+            results = await find_events(where, limit + 1, cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    else:
+        db = get_db()
+
+        where = {}
+        if website_id:
+            where["websiteId"] = website_id
+        if review_status:
+            where["reviewStatus"] = review_status
+        if min_confidence > 0:
+            where["overallConfidence"] = {"gte": min_confidence}
+        if cursor:
+            try:
+                where.update(after_cursor(cursor))
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
+        results = await db.event.find_many(
+            where=where,
+            order=ORDER,
+            take=limit + 1
+        )
 
-    where = {}
-    if website_id:
-        where["websiteId"] = website_id
-    if min_confidence > 0:
-        where["overallConfidence"] = {"gte": min_confidence}
+    page, next_cursor = paginate(results, limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return [_event_response(e) for e in page]
 
-    results = await db.event.find_many(
-        where=where,
-        order={"createdAt": "desc"},
-        take=limit
-    )
 
-    return [
-        EventResponse(
-            id=e.id,
-            crawlJobId=e.crawlJobId,
-            websiteId=e.websiteId,
-            eventData=json.loads(e.eventData),  # Deserialize JSON string
-            overallConfidence=e.overallConfidence,
-            fieldConfidences=json.loads(e.fieldConfidences),  # Deserialize JSON string
-            aiNotes=e.aiNotes,
-            sourceUrl=e.sourceUrl,
-            createdAt=e.createdAt.isoformat()
+@router.get("/export")
+async def export_events(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    website_id: str | None = None,
+    review_status: Literal["pending", "approved", "rejected"] | None = None,
+    reviewed_since: datetime | None = Query(default=None, description="Only events reviewed at or after this time"),
+    published_since: datetime | None = Query(default=None, description="Only events published at or after this time"),
+    min_confidence: float = Query(default=0, ge=0, le=100),
+    date_from: str | None = Query(default=None, description="ISO 8601 date or datetime"),
+    date_to: str | None = Query(default=None, description="ISO 8601 date (inclusive) or datetime"),
+    date_field: str | None = Query(default=None, description="Field the date range applies to (default: the structure's date field)"),
+    field: list[str] = Query(default=[], description="path:text, the field contains text (e.g. location.city:berlin)"),
+    confidence: list[str] = Query(default=[], description="path:min, minimum confidence of a field (e.g. start_date:80)"),
+):
+    """
+    Stream every matching event, oldest first, as NDJSON or CSV.
+
+    Takes the filters of the event listing, plus review/publish timestamps for
+    incremental syncs (e.g. review_status=approved&published_since=<last sync>).
+    Events are read from a database cursor batch by batch and written out as
+    they arrive.
+    """
+    structure = await get_active_structure()
+    try:
+        where = build_filter(
+            structure.structure if structure else None,
+            website_id=website_id,
+            review_status=review_status,
+            min_confidence=min_confidence,
+            date_from=date_from,
+            date_to=date_to,
+            date_path=date_field,
+            fields=parse_pairs(field, "field"),
+            confidences=parse_pairs(confidence, "confidence"),
+            reviewed_since=reviewed_since,
+            published_since=published_since,
         )
-        for e in results
-    ]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    if format == "csv":
+        body = export_csv(where, structure.structure if structure else None)
+        media_type = "text/csv; charset=utf-8"
+    else:
+        body = export_ndjson(where)
+        media_type = "application/x-ndjson"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="events-{stamp}.{format}"'}
+    )
 
 
 @router.get("/{event_id}", response_model=EventResponse)
@@ -65,17 +174,7 @@ async def get_event(event_id: str):
     if not result:
         raise HTTPException(status_code=404, detail="Event not found")
 
-    return EventResponse(
-        id=result.id,
-        crawlJobId=result.crawlJobId,
-        websiteId=result.websiteId,
-        eventData=json.loads(result.eventData),  # Deserialize JSON string
-        overallConfidence=result.overallConfidence,
-        fieldConfidences=json.loads(result.fieldConfidences),  # Deserialize JSON string
-        aiNotes=result.aiNotes,
-        sourceUrl=result.sourceUrl,
-        createdAt=result.createdAt.isoformat()
-    )
+    return _event_response(result)
 
 
 @router.delete("/{event_id}")
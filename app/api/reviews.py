@@ -1,8 +1,8 @@
-import json
+from bson import ObjectId
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel, validator
 from datetime import datetime
-from app.database import get_db
+from app.database import get_db, get_mongo
 
 router = APIRouter(prefix="/api/events", tags=["reviews"])
 
@@ -32,6 +32,9 @@ class EditRequest(BaseModel):
     def validate_event_data(cls, v):
         if not isinstance(v, dict) or not v:
             raise ValueError("event_data must be a non-empty dictionary")
+        for name in v:
+            if not name or "." in name or name.startswith("$"):
+                raise ValueError(f"Invalid field name in event_data: {name!r}")
         return v
 
 # Review Response Model
@@ -87,26 +90,20 @@ async def review_event(event_id: str, request: ReviewRequest):
 @router.put("/{event_id}/edit", response_model=dict)
 async def edit_event(event_id: str, request: EditRequest):
     """Edit event data (e.g., correct AI-extracted fields)"""
-    db = get_db()
-    
-    # Fetch existing event
-    event = await db.event.find_unique(where={"id": event_id})
-    if not event:
+    if not ObjectId.is_valid(event_id):
         raise HTTPException(status_code=404, detail="Event not found")
     
-    # Update event_data
+    # Merge the fields into the stored document in place (one atomic update)
     try:
-        current_data = json.loads(event.eventData) if event.eventData else {}
-        updated_data = {**current_data, **request.event_data}  # Merge dictionaries
-        updated_event = await db.event.update(
-            where={"id": event_id},
-            data={"eventData": json.dumps(updated_data)}
+        result = await get_mongo()["events"].update_one(
+            {"_id": ObjectId(event_id)},
+            {"$set": {f"eventData.{name}": value for name, value in request.event_data.items()}}
         )
-        return {"message": "Event updated successfully", "id": updated_event.id}
-    except json.JSONDecodeError as e:
-        raise HTTPException(status_code=500, detail="Invalid JSON in event data")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to update event: {str(e)}")
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Event not found")
+    return {"message": "Event updated successfully", "id": event_id}
 
 @router.get("/{event_id}/review", response_model=ReviewResponse)
 async def get_review_status(event_id: str):
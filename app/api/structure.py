@@ -1,7 +1,8 @@
-import json
 from fastapi import APIRouter, HTTPException
+from prisma.fields import Json
 from pydantic import BaseModel
-from app.database import get_db
+from app.database import get_db, as_document
+from app.services.lookup_cache import invalidate, STRUCTURE
 
 router = APIRouter(prefix="/api/structure", tags=["structure"])
 
@@ -40,15 +41,18 @@ async def create_structure(data: StructureCreate):
         data={
             "version": next_version,
             "isActive": True,
-            "structure": json.dumps(data.structure)  # Serialize to JSON string
+            "structure": Json(data.structure)
         }
     )
 
+    # Every process reloads the active structure
+    await invalidate(STRUCTURE)
+
     return StructureResponse(
         id=result.id,
         version=result.version,
         isActive=result.isActive,
-        structure=json.loads(result.structure),  # Deserialize from JSON string
+        structure=as_document(result.structure),
         createdAt=result.createdAt.isoformat()
     )
 
@@ -69,7 +73,7 @@ async def get_active_structure():
         id=result.id,
         version=result.version,
         isActive=result.isActive,
-        structure=json.loads(result.structure),  # Deserialize from JSON string
+        structure=as_document(result.structure),
         createdAt=result.createdAt.isoformat()
     )
 
@@ -88,7 +92,7 @@ async def list_structures():
             id=s.id,
             version=s.version,
             isActive=s.isActive,
-            structure=json.loads(s.structure),  # Deserialize from JSON string
+            structure=as_document(s.structure),
             createdAt=s.createdAt.isoformat()
         )
         for s in results
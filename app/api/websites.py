@@ -1,6 +1,8 @@
+import json
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, HttpUrl
 from app.database import get_db
+from app.services.lookup_cache import invalidate, WEBSITES
 
 router = APIRouter(prefix="/api/websites", tags=["websites"])
 
@@ -33,6 +35,7 @@ async def create_website(website: WebsiteCreate):
             "active": True
         }
     )
+    await invalidate(WEBSITES)
 
     return WebsiteResponse(
         id=result.id,
@@ -88,6 +91,83 @@ async def get_website(website_id: str):
     )
 
 
+class CrawlProfileResponse(BaseModel):
+    websiteId: str
+    fetchTier: str | None
+    samples: int
+    successRate: float
+    avgReadyMs: float | None
+    selector: str | None
+    readyMaxWaitMs: int | None
+    pageTimeoutMs: int | None
+    updatedAt: str
+
+
+class SiteTemplateResponse(BaseModel):
+    websiteId: str
+    structureVersion: int
+    fields: dict
+    activeFields: int
+    hits: int
+    failures: int
+    updatedAt: str
+
+
+@router.get("/{website_id}/profile", response_model=CrawlProfileResponse)
+async def get_crawl_profile(website_id: str):
+    """Get the crawl settings learned for a website"""
+    db = get_db()
+
+    result = await db.crawlprofile.find_unique(where={"websiteId": website_id})
+
+    if not result:
+        raise HTTPException(status_code=404, detail="No crawl profile yet for this website")
+
+    return CrawlProfileResponse(
+        websiteId=result.websiteId,
+        fetchTier=result.fetchTier,
+        samples=result.samples,
+        successRate=round(result.successes / result.samples * 100, 2) if result.samples else 0.0,
+        avgReadyMs=result.avgReadyMs,
+        selector=result.selector,
+        readyMaxWaitMs=result.readyMaxWaitMs,
+        pageTimeoutMs=result.pageTimeoutMs,
+        updatedAt=result.updatedAt.isoformat()
+    )
+
+
+@router.get("/{website_id}/template", response_model=SiteTemplateResponse)
+async def get_site_template(website_id: str):
+    """Get the selector template learned for a website"""
+    db = get_db()
+
+    result = await db.sitetemplate.find_unique(where={"websiteId": website_id})
+
+    if not result:
+        raise HTTPException(status_code=404, detail="No selector template yet for this website")
+
+    return SiteTemplateResponse(
+        websiteId=result.websiteId,
+        structureVersion=result.structureVersion,
+        fields=json.loads(result.fields),  # Deserialize JSON string
+        activeFields=result.activeFields,
+        hits=result.hits,
+        failures=result.failures,
+        updatedAt=result.updatedAt.isoformat()
+    )
+
+
+@router.delete("/{website_id}/template")
+async def reset_site_template(website_id: str):
+    """Forget a website's selector template (it is relearned from AI extractions)"""
+    db = get_db()
+
+    deleted = await db.sitetemplate.delete_many(where={"websiteId": website_id})
+    if not deleted:
+        raise HTTPException(status_code=404, detail="No selector template yet for this website")
+    return {"message": "Selector template reset"}
+
+
 @router.delete("/{website_id}")
 async def delete_website(website_id: str):
     """Delete a website"""
@@ -95,6 +175,7 @@ async def delete_website(website_id: str):
 
     try:
         await db.targetwebsite.delete(where={"id": website_id})
-        return {"message": "Website deleted successfully"}
     except:
         raise HTTPException(status_code=404, detail="Website not found")
+    await invalidate(WEBSITES)
+    return {"message": "Website deleted successfully"}
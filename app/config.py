@@ -7,11 +7,151 @@ load_dotenv()
 # Database
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+# LLM providers for AI mapping, in order of preference: gemini, openai, local
+LLM_PROVIDERS = [p.strip().lower() for p in os.getenv("LLM_PROVIDERS", "gemini").split(",") if p.strip()]
+
 # Gemini API key
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
+if "gemini" in LLM_PROVIDERS and not GEMINI_API_KEY:
     raise ValueError("GEMINI_API_KEY must be set")
 
+# OpenAI (or any OpenAI-compatible API)
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+if "openai" in LLM_PROVIDERS and not OPENAI_API_KEY:
+    raise ValueError("OPENAI_API_KEY must be set when LLM_PROVIDERS includes openai")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")
+OPENAI_FAST_MODEL = os.getenv("OPENAI_FAST_MODEL", "gpt-4o-mini")
+OPENAI_PRO_MODEL = os.getenv("OPENAI_PRO_MODEL", "gpt-4o")
+
+# Local OpenAI-compatible server (e.g. `python -m app.llm_standin` for testing)
+LLM_LOCAL_URL = os.getenv("LLM_LOCAL_URL", "http://localhost:8090/v1")
+LLM_LOCAL_MODEL = os.getenv("LLM_LOCAL_MODEL", "standin")
+LLM_STANDIN_PORT = int(os.getenv("LLM_STANDIN_PORT", 8090))
+LLM_STANDIN_DELAY_MS = int(os.getenv("LLM_STANDIN_DELAY_MS", 200))
+LLM_STANDIN_ERROR_RATE = float(os.getenv("LLM_STANDIN_ERROR_RATE", 0))
+
+# In-process cache of the active structure and website records; other
+# processes' changes are picked up within LOOKUP_CACHE_CHECK_SECONDS
+LOOKUP_CACHE_CHECK_SECONDS = float(os.getenv("LOOKUP_CACHE_CHECK_SECONDS", 5))
+LOOKUP_CACHE_TTL = int(os.getenv("LOOKUP_CACHE_TTL", 300))
+
 # Other configs
 CRAWL_TIMEOUT = int(os.getenv("CRAWL_TIMEOUT", 30))
 MAX_RETRIES = int(os.getenv("MAX_RETRIES", 3))
+
+# Browser pool
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", 2))
+BROWSER_MAX_PAGES = int(os.getenv("BROWSER_MAX_PAGES", 50))
+
+# Crawl scheduler
+MAX_CONCURRENT_CRAWLS = int(os.getenv("MAX_CONCURRENT_CRAWLS", 4))
+MAX_CONCURRENT_PER_WEBSITE = int(os.getenv("MAX_CONCURRENT_PER_WEBSITE", 2))
+CRAWL_QUEUE_SIZE = int(os.getenv("CRAWL_QUEUE_SIZE", 1000))
+SCHEDULER_DRAIN_TIMEOUT = int(os.getenv("SCHEDULER_DRAIN_TIMEOUT", 60))
+
+# Job leases / worker fleet
+# "local": the API process runs crawl jobs itself
+# "queue": the API only records jobs; run `python -m app.worker` to process them
+CRAWL_DISPATCH_MODE = os.getenv("CRAWL_DISPATCH_MODE", "local")
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", 120))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 2))
+MAX_JOB_ATTEMPTS = int(os.getenv("MAX_JOB_ATTEMPTS", 3))
+# A job re-queued on exhausted AI quota waits this long before it is claimed
+# again, doubling with every attempt
+JOB_RETRY_DELAY = int(os.getenv("JOB_RETRY_DELAY", 300))
+
+# Crawl pipeline (fetch runs on the scheduler's MAX_CONCURRENT_CRAWLS workers)
+PIPELINE_CLEAN_WORKERS = int(os.getenv("PIPELINE_CLEAN_WORKERS", 2))
+PIPELINE_MAP_WORKERS = int(os.getenv("PIPELINE_MAP_WORKERS", 8))
+PIPELINE_PERSIST_WORKERS = int(os.getenv("PIPELINE_PERSIST_WORKERS", 2))
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", 20))
+
+# Plain-HTTP fetch tier
+HTTP_FETCH_TIMEOUT = float(os.getenv("HTTP_FETCH_TIMEOUT", 15))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", 20))
+# Pages with less visible text than this are treated as JS-rendered
+HTTP_MIN_TEXT_CHARS = int(os.getenv("HTTP_MIN_TEXT_CHARS", 200))
+
+# Page readiness: "dom" waits until the page is stable, "fixed" sleeps 10s
+CRAWL_READINESS = os.getenv("CRAWL_READINESS", "dom")
+READY_QUIET_MS = int(os.getenv("READY_QUIET_MS", 500))
+READY_MAX_WAIT_MS = int(os.getenv("READY_MAX_WAIT_MS", 8000))
+
+# Learned per-website crawl profiles
+PROFILE_MIN_SAMPLES = int(os.getenv("PROFILE_MIN_SAMPLES", 3))
+# Websites learned to need the browser are re-probed over plain HTTP every N crawls (0 = never)
+PROFILE_HTTP_REPROBE_EVERY = int(os.getenv("PROFILE_HTTP_REPROBE_EVERY", 25))
+
+# Browser request interception: none, media, lean or strict
+BLOCK_PROFILE = os.getenv("BLOCK_PROFILE", "lean")
+
+# Bot challenge detection
+CHALLENGE_COOLDOWN_SECONDS = int(os.getenv("CHALLENGE_COOLDOWN_SECONDS", 900))
+
+# Retry policy and per-domain circuit breakers (MAX_RETRIES is attempts per page)
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", 1))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", 30))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 5))
+CIRCUIT_OPEN_SECONDS = int(os.getenv("CIRCUIT_OPEN_SECONDS", 300))
+
+# Raw page snapshots: zstd-compressed, deduplicated by content hash
+# "disk" (files under HTML_STORE_DIR), "db" (GridFS-style chunks in MongoDB) or "none"
+HTML_STORE = os.getenv("HTML_STORE", "disk").lower()
+HTML_STORE_DIR = os.getenv("HTML_STORE_DIR", "data/html")
+HTML_STORE_LEVEL = int(os.getenv("HTML_STORE_LEVEL", 10))
+
+# Streaming event export: events read from the database per round trip
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+
+# Prompt content reduction (estimated tokens of page content sent to the AI)
+MAP_TOKEN_BUDGET = int(os.getenv("MAP_TOKEN_BUDGET", 6000))
+
+# Long and listing pages are split into chunks mapped in parallel (several events per page)
+MAP_CHUNKING = os.getenv("MAP_CHUNKING", "true").lower() == "true"
+MAP_CHUNK_TOKENS = int(os.getenv("MAP_CHUNK_TOKENS", MAP_TOKEN_BUDGET))
+MAP_MAX_CHUNKS = int(os.getenv("MAP_MAX_CHUNKS", 8))
+
+# Map embedded schema.org/OpenGraph event data without AI; AI only fills the gaps
+USE_STRUCTURED_DATA = os.getenv("USE_STRUCTURED_DATA", "true").lower() == "true"
+
+# Per-website selector templates learned from AI extractions
+USE_SITE_TEMPLATES = os.getenv("USE_SITE_TEMPLATES", "true").lower() == "true"
+TEMPLATE_MIN_CONFIDENCE = int(os.getenv("TEMPLATE_MIN_CONFIDENCE", 85))
+TEMPLATE_CONFIRMATIONS = int(os.getenv("TEMPLATE_CONFIRMATIONS", 2))
+TEMPLATE_AUDIT_EVERY = int(os.getenv("TEMPLATE_AUDIT_EVERY", 25))
+
+# Persistent cache of mapping results for unchanged pages
+USE_MAP_CACHE = os.getenv("USE_MAP_CACHE", "true").lower() == "true"
+MAP_CACHE_TTL_HOURS = int(os.getenv("MAP_CACHE_TTL_HOURS", 168))
+MAP_CACHE_MAX_ENTRIES = int(os.getenv("MAP_CACHE_MAX_ENTRIES", 50000))
+
+# AI model tiering: the fast model answers first, the pro model only when needed
+MAP_MODEL_TIERING = os.getenv("MAP_MODEL_TIERING", "true").lower() == "true"
+MAP_FAST_MODEL = os.getenv("MAP_FAST_MODEL", "gemini-2.5-flash")
+MAP_PRO_MODEL = os.getenv("MAP_PRO_MODEL", "gemini-2.5-pro")
+MAP_ESCALATE_BELOW = float(os.getenv("MAP_ESCALATE_BELOW", 70))
+MAP_REQUIRED_FIELDS = [f.strip() for f in os.getenv("MAP_REQUIRED_FIELDS", "title,start_date").split(",") if f.strip()]
+
+# Micro-batching of AI mapping requests for pages of the same website (1 = off)
+MAP_BATCH_SIZE = int(os.getenv("MAP_BATCH_SIZE", 4))
+MAP_BATCH_WINDOW_MS = int(os.getenv("MAP_BATCH_WINDOW_MS", 250))
+
+# Constrain AI answers to a response schema compiled from the event structure
+MAP_RESPONSE_SCHEMA = os.getenv("MAP_RESPONSE_SCHEMA", "true").lower() == "true"
+
+# Shared Gemini client limits
+LLM_RPM = int(os.getenv("LLM_RPM", 60))
+LLM_TPM = int(os.getenv("LLM_TPM", 1000000))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 4))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", 2))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", 60))
+LLM_TIMEOUT = int(os.getenv("LLM_TIMEOUT", 120))
+
+# Provider routing: hedged requests go to a second provider after the p95 latency
+LLM_HEDGE = os.getenv("LLM_HEDGE", "false").lower() == "true"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", 95))
+LLM_HEDGE_DELAY_MS = int(os.getenv("LLM_HEDGE_DELAY_MS", 15000))
+LLM_PROVIDER_FAILURES = int(os.getenv("LLM_PROVIDER_FAILURES", 3))
+LLM_PROVIDER_COOLDOWN = int(os.getenv("LLM_PROVIDER_COOLDOWN", 60))
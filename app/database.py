@@ -1,19 +1,41 @@
-from prisma import Prisma
+import json
+import prisma
+from pymongo import AsyncMongoClient
+from app.config import DATABASE_URL
 
-# Global Prisma client instance
-db = Prisma()
+# Global Prisma client instance, created on first use so that modules
+# import before `prisma generate` has run (the unit tests need no client)
+_db = None
+
+# Driver client for what Prisma cannot express on MongoDB
+# (filters inside JSON documents, partial document updates)
+mongo = AsyncMongoClient(DATABASE_URL, tz_aware=True)
 
 
 async def connect_db():
     """Connect to database"""
-    await db.connect()
+    await get_db().connect()
 
 
 async def disconnect_db():
     """Disconnect from database"""
-    await db.disconnect()
+    await get_db().disconnect()
+    await mongo.close()
 
 
-def get_db() -> Prisma:
+def get_db() -> "prisma.Prisma":
     """Get database client"""
-    return db
+    global _db
+    if _db is None:
+        _db = prisma.Prisma()
+    return _db
+
+
+def get_mongo():
+    """Get the MongoDB database of DATABASE_URL"""
+    return mongo.get_default_database()
+
+
+def as_document(value):
+    """A Json field value (rows written before `python -m app.migrate_json` still hold a JSON string)"""
+    return json.loads(value) if isinstance(value, str) else value
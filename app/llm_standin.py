@@ -0,0 +1,74 @@
+"""
+Stand-in LLM server for testing.
+
+    python -m app.llm_standin
+
+Serves an OpenAI-compatible /v1/chat/completions endpoint that answers
+every request with a valid but empty answer for its JSON schema (every
+field null, every confidence 0) after LLM_STANDIN_DELAY_MS, failing a
+share of requests (LLM_STANDIN_ERROR_RATE) with a 503. Point the local
+provider at it (LLM_PROVIDERS=local, LLM_LOCAL_URL=http://localhost:8090/v1)
+to exercise the pipeline, routing, failover and hedging without API keys.
+"""
+import asyncio
+import json
+import random
+import time
+import uuid
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from app.config import LLM_STANDIN_PORT, LLM_STANDIN_DELAY_MS, LLM_STANDIN_ERROR_RATE
+from app.services.content import estimate_tokens
+
+app = FastAPI(title="LLM stand-in")
+
+
+def _empty(schema: dict):
+    """The emptiest value that satisfies a JSON schema"""
+    kinds = schema.get("type", "string")
+    kinds = kinds if isinstance(kinds, list) else [kinds]
+    if "null" in kinds:
+        return None
+    if "object" in kinds:
+        return {name: _empty(child) for name, child in schema.get("properties", {}).items()}
+    if "array" in kinds:
+        return []
+    if "integer" in kinds or "number" in kinds:
+        return 0
+    if "boolean" in kinds:
+        return False
+    return ""
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    # Jitter so latency percentiles mean something
+    await asyncio.sleep(LLM_STANDIN_DELAY_MS / 1000 * random.uniform(0.5, 1.5))
+    if random.random() < LLM_STANDIN_ERROR_RATE:
+        raise HTTPException(status_code=503, detail="Stand-in failure")
+
+    response_format = body.get("response_format") or {}
+    schema = (response_format.get("json_schema") or {}).get("schema")
+    content = json.dumps(_empty(schema) if schema else {})
+    prompt_tokens = sum(estimate_tokens(str(message.get("content", ""))) for message in body.get("messages", []))
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "standin"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": estimate_tokens(content),
+            "total_tokens": prompt_tokens + estimate_tokens(content),
+        },
+    }
+
+
+if __name__ == "__main__":
+    uvicorn.run(app, host="127.0.0.1", port=LLM_STANDIN_PORT)
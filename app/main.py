@@ -4,6 +4,8 @@ import nest_asyncio
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
 from app.database import connect_db, disconnect_db
+from app.worker import start_workers, stop_workers
+from app.config import CRAWL_DISPATCH_MODE
 from app.api import websites, structure, crawl, events, reviews
 import logging
  
@@ -35,7 +37,12 @@ async def lifespan(app: FastAPI):
     """Startup & Shutdown events"""
     logger.info("Connecting to database...")
     await connect_db()
+    # In queue mode crawl jobs are processed by `python -m app.worker`
+    if CRAWL_DISPATCH_MODE == "local":
+        await start_workers()
     yield
+    if CRAWL_DISPATCH_MODE == "local":
+        await stop_workers()
     logger.info("Disconnecting from database...")
     await disconnect_db()
 
@@ -0,0 +1,61 @@
+"""
+Move inline page snapshots out of crawl_jobs.
+
+    python -m app.migrate_html
+
+Copies the legacy `rawHtml` of every crawl job into the HTML blob store
+(see app/services/blob_store.py), records the reference on the job and
+clears the inline copy. Safe to run again: moved jobs have no inline copy left.
+"""
+import asyncio
+from app.database import connect_db, disconnect_db, get_db
+from app.config import HTML_STORE
+from app.services.blob_store import put_html
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 100
+
+
+async def migrate() -> int:
+    db = get_db()
+    moved = 0
+    while True:
+        jobs = await db.crawljob.find_many(
+            where={"rawHtml": {"not": None}},
+            take=BATCH_SIZE
+        )
+        if not jobs:
+            return moved
+        for job in jobs:
+            data = {"rawHtml": None}
+            if job.rawHtml:
+                snapshot = await put_html(job.rawHtml)
+                if snapshot is None:
+                    raise RuntimeError(f"Could not store the snapshot of job {job.id}, stopping")
+                data.update({
+                    "htmlHash": snapshot["hash"],
+                    "htmlSize": snapshot["size"],
+                    "htmlStoredSize": snapshot["storedSize"],
+                })
+            await db.crawljob.update(where={"id": job.id}, data=data)
+            moved += 1
+        logger.info(f"Moved {moved} snapshots")
+
+
+async def main():
+    if HTML_STORE == "none":
+        raise SystemExit("HTML_STORE is none; set it to disk or db first")
+    await connect_db()
+    try:
+        moved = await migrate()
+        logger.info(f"Done: {moved} crawl job snapshots moved to the {HTML_STORE} store")
+    finally:
+        await disconnect_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
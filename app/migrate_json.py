@@ -0,0 +1,71 @@
+"""
+Turn JSON strings into native documents.
+
+    python -m app.migrate_json
+
+`Event.eventData`, `Event.fieldConfidences` and `EventStructure.structure`
+used to be stored as JSON strings. This parses every remaining string into
+a MongoDB document so the events API can filter on event fields. Safe to
+run again: only string values are touched.
+"""
+import asyncio
+import json
+from pymongo import UpdateOne
+from app.database import connect_db, disconnect_db, get_mongo
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+# collection -> fields that hold JSON documents
+FIELDS = {
+    "events": ["eventData", "fieldConfidences"],
+    "event_structure": ["structure"],
+}
+
+
+async def migrate(collection_name: str, fields: list[str]) -> int:
+    collection = get_mongo()[collection_name]
+    cursor = collection.find(
+        {"$or": [{name: {"$type": "string"}} for name in fields]},
+        {name: 1 for name in fields}
+    )
+    updates = []
+    moved = 0
+    async for doc in cursor:
+        data = {}
+        for name in fields:
+            if not isinstance(doc.get(name), str):
+                continue
+            try:
+                data[name] = json.loads(doc[name])
+            except json.JSONDecodeError:
+                logger.warning(f"{collection_name} {doc['_id']}: {name} is not valid JSON, left as is")
+        if data:
+            updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": data}))
+        if len(updates) >= BATCH_SIZE:
+            await collection.bulk_write(updates, ordered=False)
+            moved += len(updates)
+            updates = []
+            logger.info(f"Converted {moved} {collection_name} documents")
+    if updates:
+        await collection.bulk_write(updates, ordered=False)
+        moved += len(updates)
+    return moved
+
+
+async def main():
+    await connect_db()
+    try:
+        for collection_name, fields in FIELDS.items():
+            moved = await migrate(collection_name, fields)
+            logger.info(f"Done: {moved} {collection_name} documents converted")
+    finally:
+        await disconnect_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,18 +1,162 @@
+import asyncio
 import json
-import google.generativeai as genai
-from app.config import GEMINI_API_KEY
+import time
+from app.config import (
+    MAP_MODEL_TIERING,
+    MAP_ESCALATE_BELOW,
+    MAP_REQUIRED_FIELDS,
+    MAP_BATCH_SIZE,
+    MAP_BATCH_WINDOW_MS,
+    MAP_RESPONSE_SCHEMA,
+)
+from app.services.confidence import calculate_overall
+from app.services.structured_data import get_path, leaf_paths
+from app.services.llm_client import llm, LLMRateLimitError
+from app.services.response_schema import describe_fields, response_schema, validate_result
+import logging
 
+# Configure logging
+logger = logging.getLogger(__name__)
 
-# Configure Gemini client
-genai.configure(api_key=GEMINI_API_KEY)
+# Per-tier counters for this process (see /api/crawl/stats)
+_stats = {
+    "fast": {"calls": 0, "pages": 0, "errors": 0, "seconds": 0.0},
+    "pro": {"calls": 0, "pages": 0, "errors": 0, "seconds": 0.0},
+    "escalations": {"low_confidence": 0, "missing_required": 0, "error": 0},
+    "batching": {"batches": 0, "pages": 0, "fallbacks": 0},
+}
 
 
-async def map_to_structure(raw_html: str, event_structure: dict, website_notes: str = "") -> dict:
+# Field rules shared by single-page and batched prompts
+_FIELD_RULES = """
+For each field in the structure:
+1. Find the value in the page content
+2. Transform it to match the type (string, datetime, number, etc.)
+3. Give a confidence score (0-100):
+   - 90-100: Perfect match, certain
+   - 70-89: Good match, minor uncertainty
+   - 40-69: Had to guess or interpret
+   - 0-39: Missing or very uncertain
+"""
+
+_FORMAT_RULES = """
+- Fields with a dot are nested objects in event_data (e.g. location.venue)
+- field_confidences is keyed by the dotted field name (e.g. "location.venue": 85)
+- All dates should be ISO 8601 format
+- If a field is missing, set it to null and give low confidence
+"""
+
+# Only needed when the answer is not constrained by a response schema
+_SHAPE = """
+Return JSON: {"event_data": {...}, "field_confidences": {"field_path": score, ...}, "notes": "..."}
+"""
+_LISTING_SHAPE = """
+Return a JSON array with one object per event:
+[{"event_data": {...}, "field_confidences": {"field_path": score, ...}, "notes": "..."}]
+"""
+_BATCH_SHAPE = """
+Return a JSON array with one object per page, in page order:
+[{"page": 1, "event_data": {...}, "field_confidences": {"field_path": score, ...}, "notes": "..."}]
+"""
+
+
+def _build_prompt(page_content: str, event_structure: dict, website_notes: str) -> str:
+    return f"""
+Extract event information from this web page into the fields below.
+The page has been reduced to its structured data (JSON-LD, meta tags) and main text.
+
+FIELDS:
+{describe_fields(event_structure)}
+
+PAGE CONTENT:
+{page_content}
+
+WEBSITE NOTES:
+{website_notes if website_notes else "No specific notes"}
+{_FIELD_RULES}
+IMPORTANT:{_FORMAT_RULES}{"" if MAP_RESPONSE_SCHEMA else _SHAPE}"""
+
+
+def _build_batch_prompt(pages: list[str], event_structure: dict, website_notes: str) -> str:
+    """One prompt for several pages of the same website and structure"""
+    sections = "\n".join(
+        f"\n=== PAGE {number} ===\n{content}" for number, content in enumerate(pages, start=1)
+    )
+    return f"""
+Extract event information from each of the {len(pages)} web pages below into the fields
+below, one answer per page with its page number. Every page has been reduced to its
+structured data (JSON-LD, meta tags) and main text. Treat each page on its own; never
+copy values between pages.
+
+FIELDS:
+{describe_fields(event_structure)}
+
+WEBSITE NOTES:
+{website_notes if website_notes else "No specific notes"}
+{_FIELD_RULES}
+IMPORTANT:{_FORMAT_RULES}{"" if MAP_RESPONSE_SCHEMA else _BATCH_SHAPE}
+PAGES:
+{sections}
+"""
+
+
+async def _generate(
+    tier: str,
+    prompt: str,
+    event_structure: dict,
+    pages: int = 1,
+    mode: str | None = None,
+):
+    """Run the tier's model (on the best available provider) and parse its JSON answer"""
+    stats = _stats[tier]
+    started = time.monotonic()
+    generation_config = {
+        "temperature": 0.1,
+        "response_mime_type": "application/json",
+    }
+    if MAP_RESPONSE_SCHEMA:
+        generation_config["response_schema"] = response_schema(
+            event_structure, mode or ("batch" if pages > 1 else "single")
+        )
+    try:
+        text = await llm.generate(tier, prompt, generation_config=generation_config)
+
+        # Parse JSON safely
+        content = text.strip()
+        return json.loads(content)
+
+    except Exception:
+        stats["errors"] += 1
+        raise
+    finally:
+        stats["calls"] += 1
+        stats["pages"] += pages
+        stats["seconds"] += time.monotonic() - started
+
+
+def escalation_reason(result: dict, event_structure: dict) -> str | None:
+    """Why a fast-model result is not good enough, or None to keep it"""
+    if calculate_overall(result["field_confidences"]) < MAP_ESCALATE_BELOW:
+        return "low_confidence"
+    paths = {path for path, _ in leaf_paths(event_structure)}
+    for path in MAP_REQUIRED_FIELDS:
+        if path in paths and get_path(result["event_data"], path) is None:
+            return "missing_required"
+    return None
+
+
+async def map_to_structure(page_content: str, event_structure: dict, website_notes: str = "") -> dict:
     """
-    Use Gemini AI to extract event data from HTML and map to structure
+    Use the AI to extract event data from a page and map to structure
+
+    With MAP_MODEL_TIERING the fast model answers first; the pro model is
+    only asked when the fast answer has low overall confidence, leaves a
+    required field null, or fails. Answers are constrained to the
+    structure's response schema and repaired locally (see
+    app.services.response_schema) rather than rejected.
 
     Args:
-        raw_html: Raw HTML content
+        page_content: Reduced page content (see app.services.content.reduce_page)
         event_structure: Target structure definition
         website_notes: Optional hints about the website
 
@@ -20,72 +164,254 @@ async def map_to_structure(raw_html: str, event_structure: dict, website_notes:
         {
             "event_data": {...},
             "field_confidences": {"field": score, ...},
-            "notes": "explanation"
+            "notes": "explanation",
+            "tier": "fast" or "pro"
         }
     """
-    # Limit HTML to avoid token overflow
-    html_content = raw_html[:15000]
+    prompt = _build_prompt(page_content, event_structure, website_notes)
+
+    if MAP_MODEL_TIERING:
+        try:
+            result = validate_result(await _generate("fast", prompt, event_structure), event_structure)
+            reason = escalation_reason(result, event_structure)
+            if reason is None:
+                result["tier"] = "fast"
+                return result
+        except LLMRateLimitError:
+            # Out of quota: the pro model is throttled too, re-queue the job
+            raise
+        except Exception as e:
+            logger.warning(f"Fast model failed, escalating: {str(e)}")
+            reason = "error"
+        return await _escalate(prompt, event_structure, reason)
 
-    prompt = f"""
-Extract event information from this HTML and map it to the exact structure provided.
+    return await _map_pro(prompt, event_structure)
 
-TARGET STRUCTURE:
-{json.dumps(event_structure, indent=2)}
 
-HTML CONTENT:
-{html_content}
+async def _map_pro(prompt: str, event_structure: dict) -> dict:
+    try:
+        result = validate_result(await _generate("pro", prompt, event_structure), event_structure)
+        result["tier"] = "pro"
+        return result
+
+    except LLMRateLimitError:
+        # Out of quota: the job is re-queued rather than failed
+        raise
+    except Exception as e:
+        raise Exception(f"AI mapping failed: {str(e)}")
+
+
+async def _escalate(prompt: str, event_structure: dict, reason: str) -> dict:
+    _stats["escalations"][reason] += 1
+    logger.info(f"[ESCALATE] Mapping with the pro model ({reason})")
+    return await _map_pro(prompt, event_structure)
+
+
+def _build_listing_prompt(chunk: str, event_structure: dict, website_notes: str) -> str:
+    """Prompt for one chunk of a long or listing page that may hold several events"""
+    return f"""
+Extract every event described in this part of a web page into the fields below, one
+answer per event. The page may be a listing (calendar, programme) or one long event page;
+it has been reduced to its structured data (JSON-LD, meta tags) and main text and split
+into parts. Skip events whose title is cut off; they are complete in the neighbouring part.
+If this part describes no event, return an empty array.
+
+FIELDS:
+{describe_fields(event_structure)}
+
+PAGE CONTENT:
+{chunk}
 
 WEBSITE NOTES:
 {website_notes if website_notes else "No specific notes"}
+{_FIELD_RULES}
+IMPORTANT:{_FORMAT_RULES}{"" if MAP_RESPONSE_SCHEMA else _LISTING_SHAPE}"""
 
-For each field in the structure:
-1. Find the value in the HTML
-2. Transform it to match the type (string, datetime, number, etc.)
-3. Give a confidence score (0-100):
-   - 90-100: Perfect match, certain
-   - 70-89: Good match, minor uncertainty
-   - 40-69: Had to guess or interpret
-   - 0-39: Missing or very uncertain
 
-Return JSON in this exact format:
-{{
-    "event_data": {{...matches structure exactly...}},
-    "field_confidences": {{"field_path": score, ...}},
-    "notes": "Brief explanation of uncertainties or issues"
-}}
+async def map_events(chunk: str, event_structure: dict, website_notes: str = "") -> list[dict]:
+    """
+    Map every event in one chunk of a page (see app.services.listing)
 
-IMPORTANT:
-- Use dot notation for nested fields (e.g., "location.venue": 85)
-- Ensure event_data matches the structure exactly
-- All dates should be ISO 8601 format
-- If a field is missing, set it to null and give low confidence
-"""
+    The fast model answers with tiering on; the pro model retries a chunk
+    the fast model failed on.
 
-    try:
-        # Use Gemini 2.5 Pro model for structured reasoning
-        model = genai.GenerativeModel("gemini-2.5-pro")
+    Returns:
+        A list of results in the map_to_structure format (may be empty)
+    """
+    prompt = _build_listing_prompt(chunk, event_structure, website_notes)
+    tiers = ["fast", "pro"] if MAP_MODEL_TIERING else ["pro"]
 
+    for tier in tiers:
+        try:
+            response = await _generate(tier, prompt, event_structure, mode="listing")
+        except LLMRateLimitError:
+            raise
+        except Exception as e:
+            if tier == "fast":
+                logger.warning(f"Fast model failed on a page chunk, escalating: {str(e)}")
+                _stats["escalations"]["error"] += 1
+                continue
+            raise Exception(f"AI mapping failed: {str(e)}")
 
-        response = await model.generate_content_async(
-            prompt,
-            generation_config={
-                "temperature": 0.1,
-                "response_mime_type": "application/json",
-            },
-        )
+        if isinstance(response, dict):
+            response = response.get("events") or [response]
+        results = []
+        for item in response if isinstance(response, list) else []:
+            try:
+                result = validate_result(item, event_structure)
+            except ValueError:
+                continue
+            result["tier"] = tier
+            results.append(result)
+        return results
+    return []
 
-        # Parse JSON safely
-        content = response.text.strip()
-        result = json.loads(content)
 
-        # Validate response structure
-        if "event_data" not in result or "field_confidences" not in result:
-            raise ValueError("Gemini response missing required fields")
+def _split_batch(response, count: int, event_structure: dict) -> list[dict | None]:
+    """Per-page results of a batched answer, in page order (None where unusable)"""
+    if isinstance(response, dict):
+        response = response.get("pages") or response.get("results")
+    results: list[dict | None] = [None] * count
+    if not isinstance(response, list):
+        return results
+    for position, item in enumerate(response):
+        if not isinstance(item, dict):
+            continue
+        number = item.pop("page", position + 1)
+        index = number - 1 if isinstance(number, int) else position
+        if 0 <= index < count and results[index] is None:
+            try:
+                results[index] = validate_result(item, event_structure)
+            except ValueError:
+                pass
+    return results
 
-        if "notes" not in result:
-            result["notes"] = ""
 
-        return result
+class MapBatcher:
+    """
+    Micro-batches mapping requests for pages of the same website and structure.
 
-    except Exception as e:
-        raise Exception(f"AI mapping failed (Gemini): {str(e)}")
+    Requests with the same group, structure and notes that arrive within
+    MAP_BATCH_WINDOW_MS are sent as one prompt (up to MAP_BATCH_SIZE pages)
+    with the structure, instructions and notes stated once. Pages missing
+    from the answer, or whose batch failed, are mapped on their own; with
+    tiering, pages the fast model was unsure about escalate one by one.
+    """
+
+    def __init__(self, size: int = MAP_BATCH_SIZE, window_ms: int = MAP_BATCH_WINDOW_MS):
+        self.size = size
+        self.window = window_ms / 1000
+        self._open: dict[tuple, list[tuple[str, asyncio.Future]]] = {}
+        self._timers: dict[tuple, asyncio.TimerHandle] = {}
+        self._running: set[asyncio.Task] = set()
+
+    async def map(
+        self,
+        page_content: str,
+        event_structure: dict,
+        website_notes: str = "",
+        group: str = "",
+    ) -> dict:
+        """Same contract as map_to_structure; `group` is usually the website id"""
+        if self.size <= 1:
+            return await map_to_structure(page_content, event_structure, website_notes)
+
+        loop = asyncio.get_running_loop()
+        key = (group, json.dumps(event_structure, sort_keys=True), website_notes or "")
+        future = loop.create_future()
+        batch = self._open.setdefault(key, [])
+        batch.append((page_content, future))
+        if len(batch) >= self.size:
+            self._flush(key)
+        elif len(batch) == 1:
+            self._timers[key] = loop.call_later(self.window, self._flush, key)
+        return await future
+
+    def _flush(self, key: tuple):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._open.pop(key, None)
+        if batch:
+            task = asyncio.create_task(self._run(key, batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, key: tuple, batch: list[tuple[str, asyncio.Future]]):
+        _, structure_json, notes = key
+        event_structure = json.loads(structure_json)
+        pages = [content for content, _ in batch]
+
+        results: list[dict | None] = [None] * len(batch)
+        tier = "fast" if MAP_MODEL_TIERING else "pro"
+        if len(batch) > 1:
+            _stats["batching"]["batches"] += 1
+            _stats["batching"]["pages"] += len(batch)
+            try:
+                response = await _generate(
+                    tier,
+                    _build_batch_prompt(pages, event_structure, notes),
+                    event_structure,
+                    pages=len(batch)
+                )
+                results = _split_batch(response, len(batch), event_structure)
+            except LLMRateLimitError as e:
+                # Mapping the pages one by one would only hit the quota harder
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            except Exception as e:
+                logger.warning(f"Batched mapping of {len(batch)} pages failed, mapping one by one: {str(e)}")
+            _stats["batching"]["fallbacks"] += results.count(None)
+
+        await asyncio.gather(*(
+            self._finish(content, future, result, tier, event_structure, notes)
+            for (content, future), result in zip(batch, results)
+        ))
+
+    async def _finish(self, content, future, result, tier, event_structure, notes):
+        """Settle one page's future, mapping it alone when the batch fell short"""
+        try:
+            if result is None:
+                result = await map_to_structure(content, event_structure, notes)
+            elif tier == "fast" and (reason := escalation_reason(result, event_structure)):
+                result = await _escalate(_build_prompt(content, event_structure, notes), event_structure, reason)
+            else:
+                result["tier"] = tier
+            if not future.done():
+                future.set_result(result)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+
+
+def mapper_stats() -> dict:
+    """Per-tier call counts, error counts and latency, and escalation rate"""
+    tiers = {}
+    for tier in ("fast", "pro"):
+        stats = _stats[tier]
+        tiers[tier] = {
+            "calls": stats["calls"],
+            "pages": stats["pages"],
+            "errors": stats["errors"],
+            "avg_seconds": round(stats["seconds"] / stats["calls"], 3) if stats["calls"] else 0.0,
+        }
+    escalations = sum(_stats["escalations"].values())
+    fast_pages = _stats["fast"]["pages"]
+    batching = _stats["batching"]
+    return {
+        "tiering": MAP_MODEL_TIERING,
+        "models": {provider.name: provider.models for provider in llm.providers},
+        **tiers,
+        "escalations": dict(_stats["escalations"]),
+        "escalation_rate": round(escalations / fast_pages * 100, 2) if fast_pages else 0.0,
+        "batching": {
+            **batching,
+            "avg_batch_size": round(batching["pages"] / batching["batches"], 2) if batching["batches"] else 0.0,
+        },
+    }
+
+
+# Global batcher used by the pipeline's map stage
+map_batcher = MapBatcher()
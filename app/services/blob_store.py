@@ -0,0 +1,135 @@
+import asyncio
+import hashlib
+import os
+import zstandard
+from prisma.fields import Base64
+from app.database import get_db
+from app.config import HTML_STORE, HTML_STORE_DIR, HTML_STORE_LEVEL
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Chunk size of the database backend (GridFS uses 255 KiB chunks too)
+_CHUNK_BYTES = 255 * 1024
+
+# Counters for this process (see /api/crawl/stats)
+_stats = {"stored": 0, "deduplicated": 0, "raw_bytes": 0, "stored_bytes": 0, "errors": 0}
+
+
+def _compress(data: bytes) -> bytes:
+    return zstandard.ZstdCompressor(level=HTML_STORE_LEVEL).compress(data)
+
+
+def _decompress(data: bytes) -> bytes:
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+def _disk_path(digest: str) -> str:
+    return os.path.join(HTML_STORE_DIR, digest[:2], digest[2:4], f"{digest}.html.zst")
+
+
+def _write_file(digest: str, blob: bytes):
+    path = _disk_path(digest)
+    if os.path.exists(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write then rename so readers never see a partial file
+    temp = f"{path}.{os.getpid()}.tmp"
+    with open(temp, "wb") as f:
+        f.write(blob)
+    os.replace(temp, path)
+
+
+def _read_file(digest: str) -> bytes | None:
+    try:
+        with open(_disk_path(digest), "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+async def _write_chunks(digest: str, blob: bytes):
+    db = get_db()
+    # A crashed earlier write may have left some chunks behind
+    await db.htmlblobchunk.delete_many(where={"hash": digest})
+    await db.htmlblobchunk.create_many(
+        data=[
+            {"hash": digest, "n": n, "data": Base64.encode(blob[offset:offset + _CHUNK_BYTES])}
+            for n, offset in enumerate(range(0, len(blob), _CHUNK_BYTES))
+        ]
+    )
+
+
+async def _read_chunks(digest: str) -> bytes | None:
+    db = get_db()
+    chunks = await db.htmlblobchunk.find_many(where={"hash": digest}, order={"n": "asc"})
+    return b"".join(chunk.data.decode() for chunk in chunks) if chunks else None
+
+
+async def put_html(html: str) -> dict | None:
+    """
+    Store a page snapshot, compressed and deduplicated by content hash.
+
+    Returns:
+        {"hash", "size", "storedSize", "deduplicated"} or None if the store
+        is off or the write failed (a snapshot never fails a job)
+    """
+    if HTML_STORE == "none" or not html:
+        return None
+    db = get_db()
+    data = html.encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()
+    try:
+        existing = await db.htmlblob.find_unique(where={"hash": digest})
+        if existing:
+            await db.htmlblob.update(where={"hash": digest}, data={"refs": {"increment": 1}})
+            _stats["deduplicated"] += 1
+            return {"hash": digest, "size": existing.size, "storedSize": existing.storedSize, "deduplicated": True}
+
+        blob = await asyncio.to_thread(_compress, data)
+        if HTML_STORE == "disk":
+            await asyncio.to_thread(_write_file, digest, blob)
+        else:
+            await _write_chunks(digest, blob)
+        # Upsert: another job may have stored the same page meanwhile
+        await db.htmlblob.upsert(
+            where={"hash": digest},
+            data={
+                "create": {"hash": digest, "size": len(data), "storedSize": len(blob), "backend": HTML_STORE},
+                "update": {"refs": {"increment": 1}},
+            }
+        )
+    except Exception as e:
+        _stats["errors"] += 1
+        logger.warning(f"Could not store page snapshot {digest[:12]}: {str(e)}")
+        return None
+
+    _stats["stored"] += 1
+    _stats["raw_bytes"] += len(data)
+    _stats["stored_bytes"] += len(blob)
+    return {"hash": digest, "size": len(data), "storedSize": len(blob), "deduplicated": False}
+
+
+async def get_html(digest: str) -> str | None:
+    """A stored page snapshot (None if it is not in the store)"""
+    db = get_db()
+    meta = await db.htmlblob.find_unique(where={"hash": digest})
+    if meta is None:
+        return None
+    if meta.backend == "disk":
+        blob = await asyncio.to_thread(_read_file, digest)
+    else:
+        blob = await _read_chunks(digest)
+    if blob is None:
+        logger.warning(f"Page snapshot {digest[:12]} is registered but missing from the {meta.backend} store")
+        return None
+    return (await asyncio.to_thread(_decompress, blob)).decode("utf-8")
+
+
+def store_stats() -> dict:
+    return {
+        "backend": HTML_STORE,
+        **_stats,
+        "compression_ratio": round(_stats["raw_bytes"] / _stats["stored_bytes"], 2) if _stats["stored_bytes"] else 0.0,
+    }
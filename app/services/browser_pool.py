@@ -0,0 +1,209 @@
+import asyncio
+from contextlib import asynccontextmanager
+from crawl4ai import AsyncWebCrawler, BrowserConfig
+from app.config import BROWSER_POOL_SIZE, BROWSER_MAX_PAGES, BLOCK_PROFILE
+from app.services.readiness import install_probe
+from app.services.interception import TrafficStats, apply_block_profile
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+USER_AGENT = (
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/131.0.0.0 Safari/537.36"
+)
+
+
+def build_browser_config() -> BrowserConfig:
+    """Browser configuration shared by every pooled crawler"""
+    return BrowserConfig(
+        headless=True,
+        verbose=True,
+        user_agent=USER_AGENT,
+        viewport_width=1920,
+        viewport_height=1080,
+    )
+
+
+class PooledBrowser:
+    """
+    A warm crawler plus per-page state.
+
+    A pooled browser serves one page at a time, so the block profile and
+    traffic counters for the current page live here and are picked up by
+    the page hook Crawl4AI calls for every new page.
+    """
+
+    def __init__(self):
+        self.crawler: AsyncWebCrawler | None = None
+        self.pages = 0
+        self.target_url: str | None = None
+        self.traffic = TrafficStats()
+
+    def prepare(self, url: str, block_profile: str = BLOCK_PROFILE):
+        """Reset per-page state before crawling `url`"""
+        self.target_url = url
+        self.traffic = TrafficStats(block_profile)
+
+    async def on_page_created(self, page, context=None, **kwargs):
+        """Crawl4AI on_page_context_created hook"""
+        # Readiness probe must be in place before page scripts run
+        await install_probe(page)
+        await apply_block_profile(page, self.traffic.profile, self.target_url, self.traffic)
+        return page
+
+
+class BrowserPool:
+    """
+    Fixed-size pool of warm AsyncWebCrawler instances.
+
+    Each slot keeps its Chromium process (and the contexts Crawl4AI caches
+    inside it) alive between crawls. Slots are health-checked when borrowed
+    and returned, and recycled after `max_pages` pages.
+    """
+
+    def __init__(self, size: int = BROWSER_POOL_SIZE, max_pages: int = BROWSER_MAX_PAGES):
+        self.size = max(1, size)
+        self.max_pages = max(1, max_pages)
+        self._idle: asyncio.Queue | None = None
+        self._started = False
+        self.stats = {"launched": 0, "recycled": 0, "unhealthy": 0, "pages": 0}
+
+    @property
+    def started(self) -> bool:
+        return self._started
+
+    async def start(self):
+        """Launch all browsers up front"""
+        if self._started:
+            return
+        self._idle = asyncio.Queue()
+        for _ in range(self.size):
+            slot = PooledBrowser()
+            try:
+                slot.crawler = await self._launch(slot)
+            except Exception as e:
+                # Leave an empty slot; it is launched again on first use
+                logger.error(f"Browser pool failed to launch browser: {str(e)}")
+            self._idle.put_nowait(slot)
+        self._started = True
+        logger.info(f"Browser pool started with {self.size} browsers")
+
+    async def close(self):
+        """Close idle browsers; borrowed ones are closed when returned"""
+        if not self._started:
+            return
+        self._started = False
+        while not self._idle.empty():
+            slot = self._idle.get_nowait()
+            await self._close_crawler(slot.crawler)
+        logger.info("Browser pool closed")
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Borrow a warm browser for a single page"""
+        if not self._started:
+            # Pool not running (scripts, tests): fall back to a one-off browser
+            slot = PooledBrowser()
+            slot.crawler = await self._launch(slot)
+            try:
+                yield slot
+            finally:
+                await self._close_crawler(slot.crawler)
+            return
+
+        slot = await self._idle.get()
+        try:
+            if slot.crawler is None or not self._is_healthy(slot.crawler):
+                if slot.crawler is not None:
+                    self.stats["unhealthy"] += 1
+                    logger.warning("Browser pool: replacing unhealthy browser")
+                await self._recycle(slot)
+            yield slot
+        finally:
+            slot.pages += 1
+            self.stats["pages"] += 1
+            await self._release(slot)
+
+    async def _release(self, slot: PooledBrowser):
+        """Return a slot to the pool, recycling it if needed"""
+        if not self._started:
+            await self._close_crawler(slot.crawler)
+            return
+        try:
+            if slot.crawler is None or not self._is_healthy(slot.crawler):
+                self.stats["unhealthy"] += 1
+                await self._recycle(slot)
+            elif slot.pages >= self.max_pages:
+                logger.info(f"Browser pool: recycling browser after {slot.pages} pages")
+                await self._recycle(slot)
+        except Exception as e:
+            logger.error(f"Browser pool failed to recycle browser: {str(e)}")
+            slot.crawler = None
+        finally:
+            self._idle.put_nowait(slot)
+
+    async def _recycle(self, slot: PooledBrowser):
+        """Close a slot's browser and launch a fresh one in its place"""
+        old = slot.crawler
+        slot.crawler = None
+        slot.pages = 0
+        await self._close_crawler(old)
+        slot.crawler = await self._launch(slot)
+        self.stats["recycled"] += 1
+
+    async def _launch(self, slot: PooledBrowser) -> AsyncWebCrawler:
+        crawler = AsyncWebCrawler(config=build_browser_config())
+        crawler.crawler_strategy.set_hook("on_page_context_created", slot.on_page_created)
+        await crawler.start()
+        self.stats["launched"] += 1
+        return crawler
+
+    @staticmethod
+    async def _close_crawler(crawler: AsyncWebCrawler | None):
+        if crawler is None:
+            return
+        try:
+            await crawler.close()
+        except Exception as e:
+            logger.warning(f"Browser pool: error closing browser: {str(e)}")
+
+    @staticmethod
+    def _is_healthy(crawler: AsyncWebCrawler) -> bool:
+        """Check the underlying Playwright browser is still connected"""
+        strategy = getattr(crawler, "crawler_strategy", None)
+        manager = getattr(strategy, "browser_manager", None)
+        browser = getattr(manager, "browser", None)
+        if browser is None:
+            # Persistent/managed contexts expose no browser handle
+            return manager is not None
+        try:
+            return browser.is_connected()
+        except Exception:
+            return False
+
+    def snapshot(self) -> dict:
+        """Pool size, idle count and lifetime counters"""
+        return {
+            "size": self.size,
+            "idle": self._idle.qsize() if self._idle else 0,
+            "max_pages": self.max_pages,
+            **self.stats,
+        }
+
+
+# Global pool instance, started and closed by the app lifespan
+browser_pool = BrowserPool()
+
+
+async def start_browser_pool():
+    """Launch pooled browsers"""
+    await browser_pool.start()
+
+
+async def close_browser_pool():
+    """Close pooled browsers"""
+    await browser_pool.close()
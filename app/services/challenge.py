@@ -0,0 +1,129 @@
+import time
+from urllib.parse import urlparse
+from app.config import CHALLENGE_COOLDOWN_SECONDS
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Only the start of a page is scanned for challenge markers
+SCAN_CHARS = 32000
+
+# Challenge kinds a real browser may get through (JS challenges)
+BROWSER_PASSABLE = {"cloudflare_challenge"}
+
+# (marker, kind) pairs found in the first bytes of a challenge page
+_HTML_MARKERS = (
+    ("cf-chl-", "cloudflare_challenge"),
+    ("/cdn-cgi/challenge-platform", "cloudflare_challenge"),
+    ("<title>just a moment", "cloudflare_challenge"),
+    ("attention required! | cloudflare", "cloudflare_block"),
+    ("error code: 1020", "cloudflare_block"),
+    ("captcha-delivery.com", "datadome"),
+    ("px-captcha", "perimeterx"),
+    ("_incapsula_resource", "incapsula"),
+    ("scrapingbee", "scrapingbee_redirect"),
+)
+
+# JS expression that is true when the current DOM is a challenge page;
+# used by the readiness wait condition to stop waiting immediately
+CHALLENGE_DOM_CHECK = (
+    '(document.title || "").toLowerCase().startsWith("just a moment")'
+    ' || !!document.querySelector('
+    '"#challenge-form, #challenge-running, #cf-challenge-running, .cf-browser-verification,'
+    ' #px-captcha, iframe[src*=\'captcha-delivery.com\'], iframe[src*=\'_Incapsula_Resource\']")'
+)
+
+# Domain -> (monotonic time the cooldown ends, challenge kind)
+_cooldowns: dict[str, tuple[float, str]] = {}
+
+
+class BotChallengeError(Exception):
+    """Raised when a site answers with a bot challenge or block page"""
+
+    def __init__(self, kind: str, url: str, cooling_down: bool = False):
+        self.kind = kind
+        self.url = url
+        self.domain = domain_of(url)
+        if cooling_down:
+            message = f"Skipped: {self.domain} is cooling down after a bot challenge ({kind})"
+        else:
+            message = f"Bot challenge detected ({kind}) on {self.domain}"
+        super().__init__(message)
+
+
+def domain_of(url: str) -> str:
+    host = (urlparse(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def classify_challenge(
+    status_code: int | None = None,
+    headers: dict | None = None,
+    url: str | None = None,
+    html: str | None = None,
+) -> str | None:
+    """
+    Classify a response as a bot challenge/block.
+
+    Works on whatever is available: status and headers as soon as a
+    response starts, the final URL, and the first bytes of the HTML.
+    Returns the challenge kind or None. Only challenge markers count: a bare
+    403/5xx from a CDN-fronted origin or a plain 429 is left to classify_error
+    (retry with backoff) rather than treated as a block.
+    """
+    if url:
+        lowered_url = url.lower()
+        if "scrapingbee" in lowered_url:
+            return "scrapingbee_redirect"
+        if "/cdn-cgi/challenge-platform" in lowered_url:
+            return "cloudflare_challenge"
+
+    head = html[:SCAN_CHARS].lower() if html else ""
+
+    if headers:
+        lowered = {str(k).lower(): str(v).lower() for k, v in headers.items()}
+        server = lowered.get("server", "")
+        if lowered.get("cf-mitigated") == "challenge":
+            return "cloudflare_challenge"
+        if "x-datadome" in lowered or "datadome" in server:
+            if status_code in (401, 403):
+                return "datadome"
+        if status_code == 403 and "akamaighost" in server and "access denied" in head:
+            return "akamai_block"
+
+    for marker, kind in _HTML_MARKERS:
+        if marker in head:
+            return kind
+    return None
+
+
+def check_cooldown(url: str):
+    """Raise right away if the URL's domain is cooling down after a challenge"""
+    domain = domain_of(url)
+    entry = _cooldowns.get(domain)
+    if entry is None:
+        return
+    until, kind = entry
+    if time.monotonic() < until:
+        raise BotChallengeError(kind, url, cooling_down=True)
+    del _cooldowns[domain]
+
+
+def challenge_detected(kind: str, url: str) -> BotChallengeError:
+    """Start the domain's cooldown and build the error to raise"""
+    domain = domain_of(url)
+    seconds = CHALLENGE_COOLDOWN_SECONDS
+    _cooldowns[domain] = (time.monotonic() + seconds, kind)
+    logger.warning(f"[CHALLENGE] {kind} on {domain}; cooling down for {int(seconds)}s")
+    return BotChallengeError(kind, url)
+
+
+def cooldowns() -> dict:
+    """Domains currently cooling down, with seconds left"""
+    now = time.monotonic()
+    return {
+        domain: {"kind": kind, "seconds_left": int(until - now)}
+        for domain, (until, kind) in _cooldowns.items()
+        if until > now
+    }
@@ -0,0 +1,327 @@
+import json
+import re
+from html.parser import HTMLParser
+from app.config import MAP_TOKEN_BUDGET, MAP_CHUNK_TOKENS, MAP_MAX_CHUNKS
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Rough token estimate for prompt budgeting (Gemini averages ~4 chars/token)
+CHARS_PER_TOKEN = 4
+
+# Never rendered: code, styling and widgets
+_SKIP_TAGS = {
+    "script", "style", "noscript", "template", "svg", "canvas", "iframe",
+    "form", "button", "select", "textarea", "nav", "aside",
+}
+# Page chrome, unless it sits inside the main content (an article's own header)
+_CHROME_TAGS = {"header", "footer"}
+# Main content containers
+_MAIN_TAGS = {"main", "article"}
+_BLOCK_TAGS = {
+    "p", "div", "section", "article", "main", "li", "ul", "ol", "table", "tr",
+    "h1", "h2", "h3", "h4", "h5", "h6", "dl", "dt", "dd", "br", "address",
+    "blockquote", "figcaption", "header", "footer",
+}
+_VOID_TAGS = {"br", "img", "meta", "link", "input", "hr", "source", "wbr", "col", "area", "base"}
+# Meta tags worth keeping (OpenGraph, event and description tags)
+_META_NAMES = re.compile(r"^(og:|event:|article:|twitter:(title|description))|^description$", re.I)
+# The main region is only used when it holds at least this much text
+_MIN_MAIN_CHARS = 200
+# Share of the budget structured data may take before page text is cut
+_STRUCTURED_SHARE = 0.4
+# Share of a chunk the page-level meta tags may take
+_CHUNK_META_SHARE = 0.1
+# A heading starts a new chunk once the current one is this full
+_CHUNK_HEADING_FILL = 0.6
+# Lines repeated at the start of the next chunk
+_CHUNK_OVERLAP_LINES = 3
+_SPACES = re.compile(r"[ \t\r\f\v]+")
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+class _Reducer(HTMLParser):
+    """Single pass over a page collecting text, JSON-LD, meta and microdata"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack: list[str] = []
+        self.skip_depth = 0
+        self.main_depth = 0
+        self.in_json_ld = False
+        self.json_ld: list[str] = []
+        self.meta: list[str] = []
+        self.microdata: list[str] = []
+        self.all_text: list[str] = []
+        self.main_text: list[str] = []
+        self.link: str | None = None
+
+    def _emit(self, text: str):
+        self.all_text.append(text)
+        if self.main_depth:
+            self.main_text.append(text)
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "meta":
+            name = attrs.get("property") or attrs.get("name") or attrs.get("itemprop") or ""
+            content = (attrs.get("content") or "").strip()
+            if content and (_META_NAMES.search(name) or attrs.get("itemprop")):
+                self.meta.append(f"{name}: {content}")
+            return
+        if tag in _VOID_TAGS:
+            if tag == "br" and not self.skip_depth:
+                self._emit("\n")
+            return
+
+        self.stack.append(tag)
+        if tag == "script" and "ld+json" in (attrs.get("type") or "").lower():
+            self.in_json_ld = True
+        if self.skip_depth or tag in _SKIP_TAGS or (tag in _CHROME_TAGS and not self.main_depth):
+            self.skip_depth += 1
+            return
+        if tag in _MAIN_TAGS:
+            self.main_depth += 1
+
+        # Microdata values that are not in the visible text
+        itemprop = attrs.get("itemprop")
+        value = attrs.get("content") or attrs.get("datetime")
+        if itemprop and value:
+            self.microdata.append(f"{itemprop}: {value.strip()}")
+        elif tag == "time" and attrs.get("datetime"):
+            self.microdata.append(f"time: {attrs['datetime'].strip()}")
+
+        if tag in _BLOCK_TAGS:
+            self._emit("\n")
+        if tag in ("h1", "h2", "h3", "h4", "h5", "h6"):
+            self._emit("#" * int(tag[1]) + " ")
+        elif tag in ("li", "dt"):
+            self._emit("- ")
+        elif tag == "a":
+            href = (attrs.get("href") or "").strip()
+            self.link = href if href and not href.startswith(("#", "javascript:", "mailto:")) else None
+
+    def handle_endtag(self, tag):
+        if tag in _VOID_TAGS or tag not in self.stack:
+            return
+        # Close any unclosed children along with this tag
+        while self.stack:
+            open_tag = self.stack.pop()
+            if open_tag == "script":
+                self.in_json_ld = False
+            if self.skip_depth:
+                self.skip_depth -= 1
+            elif open_tag in _MAIN_TAGS:
+                self.main_depth -= 1
+            if open_tag == "a" and self.link:
+                self._emit(f" ({self.link})")
+                self.link = None
+            if open_tag in _BLOCK_TAGS and not self.skip_depth:
+                self._emit("\n")
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if self.in_json_ld:
+            self.json_ld.append(data)
+            return
+        if self.skip_depth:
+            return
+        self._emit(data)
+
+
+def _tidy(chunks: list[str]) -> str:
+    """Collapse whitespace and drop repeated lines"""
+    seen = set()
+    lines = []
+    for line in "".join(chunks).split("\n"):
+        line = _SPACES.sub(" ", line).strip()
+        if not line or line in ("-", "#") or line in seen:
+            continue
+        seen.add(line)
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def _compact_json_ld(blocks: list[str]) -> list[str]:
+    """Re-serialise JSON-LD without whitespace (kept raw if it doesn't parse)"""
+    compacted = []
+    for block in blocks:
+        block = block.strip()
+        if not block:
+            continue
+        try:
+            compacted.append(json.dumps(json.loads(block), ensure_ascii=False, separators=(",", ":")))
+        except ValueError:
+            compacted.append(_SPACES.sub(" ", block))
+    return compacted
+
+
+def _cut(text: str, max_chars: int) -> str:
+    """Cut text at a line boundary where possible"""
+    if len(text) <= max_chars:
+        return text
+    cut = text.rfind("\n", 0, max_chars)
+    return text[:cut if cut > max_chars // 2 else max_chars]
+
+
+def _json_ld_items(blocks: list[str]) -> list[str]:
+    """Compact JSON-LD split into its top-level items (lists and @graph flattened)"""
+    items = []
+    for block in blocks:
+        block = block.strip()
+        if not block:
+            continue
+        try:
+            data = json.loads(block)
+        except ValueError:
+            items.append(_SPACES.sub(" ", block))
+            continue
+        if isinstance(data, dict) and isinstance(data.get("@graph"), list):
+            data = data["@graph"]
+        for item in data if isinstance(data, list) else [data]:
+            # Listing pages often wrap their events in an ItemList
+            elements = item.get("itemListElement") if isinstance(item, dict) else None
+            if isinstance(elements, list):
+                for element in elements:
+                    if isinstance(element, dict) and isinstance(element.get("item"), dict):
+                        element = element["item"]
+                    items.append(json.dumps(element, ensure_ascii=False, separators=(",", ":")))
+                continue
+            items.append(json.dumps(item, ensure_ascii=False, separators=(",", ":")))
+    return items
+
+
+def _is_event(item: str) -> bool:
+    try:
+        data = json.loads(item)
+    except ValueError:
+        return False
+    kinds = data.get("@type") if isinstance(data, dict) else None
+    kinds = kinds if isinstance(kinds, list) else [kinds]
+    return any(isinstance(kind, str) and kind.endswith("Event") for kind in kinds)
+
+
+def _parse(html: str, markdown: str | None) -> tuple[_Reducer, str, str]:
+    """Run the reducer over a page; returns (parser, text source, page text)"""
+    parser = _Reducer()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception as e:
+        # Malformed markup: use whatever was parsed so far
+        logger.warning(f"HTML reduction stopped early: {str(e)}")
+
+    if markdown and len(markdown.strip()) >= _MIN_MAIN_CHARS:
+        return parser, "markdown", _tidy([markdown])
+    main_text = _tidy(parser.main_text)
+    if len(main_text) >= _MIN_MAIN_CHARS:
+        return parser, "html_main", main_text
+    return parser, "html", _tidy(parser.all_text)
+
+
+def reduce_page(html: str, markdown: str | None = None, token_budget: int = MAP_TOKEN_BUDGET) -> tuple[str, dict]:
+    """
+    Turn a crawled page into a compact prompt representation.
+
+    Keeps structured data (JSON-LD, OpenGraph/meta, microdata values) and
+    the main content text, drops scripts, styles, navigation and
+    attributes, and fits the result into `token_budget` (estimated).
+    The crawler's pruned markdown is used as page text when available.
+
+    Returns:
+        (content, stats) - stats compare the input and reduced sizes
+    """
+    parser, source, text = _parse(html, markdown)
+    structured = _compact_json_ld(parser.json_ld)
+    meta = list(dict.fromkeys(parser.meta + parser.microdata))
+
+    budget_chars = max(1, token_budget) * CHARS_PER_TOKEN
+    sections = []
+    if structured:
+        sections.append("STRUCTURED DATA (JSON-LD):\n" + "\n".join(structured))
+    if meta:
+        sections.append("META:\n" + "\n".join(meta))
+    head = _cut("\n\n".join(sections), int(budget_chars * _STRUCTURED_SHARE))
+    body_budget = budget_chars - len(head) - 20
+    body = "PAGE TEXT:\n" + text
+    truncated = len(body) > body_budget or len(head) < len("\n\n".join(sections))
+    content = "\n\n".join(part for part in (head, _cut(body, max(0, body_budget))) if part)
+
+    stats = {
+        "source": source,
+        "inputChars": len(html),
+        "inputTokens": estimate_tokens(html),
+        "reducedChars": len(content),
+        "reducedTokens": estimate_tokens(content),
+        "tokenBudget": token_budget,
+        "truncated": truncated,
+        "jsonLdBlocks": len(structured),
+        "jsonLdEvents": sum(1 for item in _json_ld_items(parser.json_ld) if _is_event(item)),
+    }
+    return content, stats
+
+
+def chunk_page(
+    html: str,
+    markdown: str | None = None,
+    token_budget: int = MAP_CHUNK_TOKENS,
+    max_chunks: int = MAP_MAX_CHUNKS,
+) -> tuple[list[str], dict]:
+    """
+    Split a long or listing page into prompt chunks of `token_budget` each.
+
+    Every JSON-LD item and text line lands in one chunk (long lines are
+    cut); chunks prefer to start at a heading and repeat the last few lines
+    of the previous chunk so an event on a boundary is seen whole at least
+    once. Page-level meta tags head every chunk.
+
+    Returns:
+        (chunks, stats) - at most `max_chunks` chunks
+    """
+    parser, _, text = _parse(html, markdown)
+    meta = list(dict.fromkeys(parser.meta + parser.microdata))
+    budget_chars = max(1, token_budget) * CHARS_PER_TOKEN
+    head = _cut("META:\n" + "\n".join(meta), int(budget_chars * _CHUNK_META_SHARE)) if meta else ""
+    room = max(1, budget_chars - len(head) - 40)
+
+    lines = []
+    for line in _json_ld_items(parser.json_ld) + text.split("\n"):
+        lines.extend(line[i:i + room] for i in range(0, len(line), room))
+
+    bodies: list[list[str]] = []
+    current: list[str] = []
+    size = 0
+    for line in lines:
+        full = size + len(line) + 1 > room
+        at_heading = line.startswith("#") and size > room * _CHUNK_HEADING_FILL
+        if current and (full or at_heading):
+            bodies.append(current)
+            # Overlap only when an item may have been cut in two
+            current = current[-_CHUNK_OVERLAP_LINES:] if full else []
+            size = sum(len(kept) + 1 for kept in current)
+            if size + len(line) + 1 > room:
+                current, size = [], 0
+        current.append(line)
+        size += len(line) + 1
+    if current:
+        bodies.append(current)
+
+    truncated = len(bodies) > max_chunks
+    bodies = bodies[:max(1, max_chunks)]
+    chunks = []
+    for number, body in enumerate(bodies, start=1):
+        part = f"PAGE CONTENT (part {number} of {len(bodies)}):\n" + "\n".join(body)
+        chunks.append("\n\n".join(piece for piece in (head, part) if piece))
+
+    stats = {
+        "chunks": len(chunks),
+        "chunkTokens": token_budget,
+        "chunkedTokens": sum(estimate_tokens(chunk) for chunk in chunks),
+        "chunksTruncated": truncated,
+    }
+    return chunks, stats
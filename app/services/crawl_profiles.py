@@ -0,0 +1,140 @@
+from app.database import get_db
+from app.config import (
+    CRAWL_READINESS,
+    READY_QUIET_MS,
+    READY_MAX_WAIT_MS,
+    PROFILE_MIN_SAMPLES,
+)
+from app.services.crawler import DEFAULT_PAGE_TIMEOUT_MS
+from app.services.readiness import CONTENT_SELECTORS, build_wait_condition
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Weight of the newest sample in the ready-time moving average
+_ALPHA = 0.3
+# Peak ready time decays per sample so one slow page doesn't pin the cap
+_PEAK_DECAY = 0.9
+# Headroom over the peak ready time when tuning the cap
+_CAP_HEADROOM = 1.5
+_MIN_PAGE_TIMEOUT_MS = 60000
+# Consecutive failures before tuned settings are dropped
+_MAX_FAILURE_STREAK = 2
+
+
+async def get_profile(website_id: str):
+    """Get the learned crawl profile for a website (None if never crawled)"""
+    db = get_db()
+    return await db.crawlprofile.find_unique(where={"websiteId": website_id})
+
+
+def crawl_overrides(profile) -> dict | None:
+    """Browser run configuration overrides for a website's profile"""
+    if profile is None:
+        return None
+
+    overrides = {}
+    if CRAWL_READINESS == "dom" and (profile.readyMaxWaitMs or profile.selector):
+        overrides["wait_for"] = build_wait_condition(
+            selectors=[profile.selector] if profile.selector else CONTENT_SELECTORS,
+            max_wait_ms=profile.readyMaxWaitMs or READY_MAX_WAIT_MS,
+        )
+    if profile.pageTimeoutMs:
+        overrides["page_timeout"] = profile.pageTimeoutMs
+    return overrides or None
+
+
+def _clamp(value: float, low: int, high: int) -> int:
+    return int(max(low, min(high, value)))
+
+
+def next_profile(
+    profile,
+    success: bool,
+    tier: str | None = None,
+    ready_reason: str | None = None,
+    ready_ms: int | None = None,
+    selector: str | None = None,
+) -> tuple[dict, dict]:
+    """
+    Fold one crawl outcome into a profile.
+
+    Returns (create, update): the fields of a website's first profile and
+    the update of an existing one. Counters are incremented by the
+    database so concurrent crawls of a website don't overwrite each
+    other's counts; settings are tuned from the counts it hands back
+    (see tuned_settings).
+    """
+    timed_out = success and ready_ms is not None and ready_reason == "timeout"
+    create = {
+        "samples": 1,
+        "successes": int(success),
+        "failureStreak": 0 if success else 1,
+        "timeouts": int(timed_out),
+    }
+    update = {
+        "samples": {"increment": 1},
+        "successes": {"increment": int(success)},
+        "failureStreak": 0 if success else {"increment": 1},
+        "timeouts": {"increment": int(timed_out)},
+    }
+
+    observed = {}
+    if success and tier:
+        observed["fetchTier"] = tier
+
+    if success and ready_ms is not None:
+        avg = profile.avgReadyMs if profile else None
+        peak = max(ready_ms, int((profile.peakReadyMs or 0) * _PEAK_DECAY)) if profile else ready_ms
+        observed["avgReadyMs"] = ready_ms if avg is None else avg * (1 - _ALPHA) + ready_ms * _ALPHA
+        observed["peakReadyMs"] = peak
+        if selector:
+            observed["selector"] = selector
+
+    return {**create, **observed}, {**update, **observed}
+
+
+def tuned_settings(profile, success: bool, ready_reason: str | None = None, ready_ms: int | None = None) -> dict:
+    """
+    Readiness settings for a profile that has just recorded a crawl.
+
+    Settings are only tightened after PROFILE_MIN_SAMPLES crawls, and fall
+    back to the defaults as soon as the tuned cap is hit or crawls keep
+    failing.
+    """
+    if profile.failureStreak >= _MAX_FAILURE_STREAK:
+        return {"readyMaxWaitMs": None, "pageTimeoutMs": None, "selector": None}
+    if not success or ready_ms is None:
+        return {}
+    if ready_reason == "timeout":
+        # The page needed the whole wait: stop trimming it
+        return {"readyMaxWaitMs": None, "pageTimeoutMs": None}
+    if profile.samples < PROFILE_MIN_SAMPLES:
+        return {}
+    cap = _clamp(profile.peakReadyMs * _CAP_HEADROOM + READY_QUIET_MS, READY_QUIET_MS * 4, READY_MAX_WAIT_MS)
+    return {
+        "readyMaxWaitMs": cap,
+        "pageTimeoutMs": _clamp(cap * 8, _MIN_PAGE_TIMEOUT_MS, DEFAULT_PAGE_TIMEOUT_MS),
+    }
+
+
+async def record_outcome(website_id: str, profile, success: bool, **observed):
+    """Update a website's profile with the outcome of one crawl"""
+    db = get_db()
+    create, update = next_profile(profile, success, **observed)
+    try:
+        updated = await db.crawlprofile.upsert(
+            where={"websiteId": website_id},
+            data={
+                "create": {"websiteId": website_id, **create},
+                "update": update,
+            }
+        )
+        settings = tuned_settings(updated, success, observed.get("ready_reason"), observed.get("ready_ms"))
+        changed = {name: value for name, value in settings.items() if getattr(updated, name) != value}
+        if changed:
+            await db.crawlprofile.update(where={"websiteId": website_id}, data=changed)
+    except Exception as e:
+        # Profiles are an optimisation; never fail a job over them
+        logger.warning(f"Could not update crawl profile for {website_id}: {str(e)}")
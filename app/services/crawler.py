@@ -1,25 +1,50 @@
 import asyncio
 from crawl4ai import (
-    AsyncWebCrawler,
-    BrowserConfig,
     CrawlerRunConfig,
     DefaultMarkdownGenerator,
     PruningContentFilter,
 )
-from playwright.async_api import async_playwright
-from app.config import MAX_RETRIES
+from app.config import CRAWL_READINESS, BLOCK_PROFILE
+from app.services.browser_pool import browser_pool
+from app.services.http_fetcher import fetch_html, HttpFetchError
+from app.services.readiness import CONTENT_SELECTOR, build_wait_condition, parse_readiness
+from app.services.challenge import classify_challenge, challenge_detected, check_cooldown
+from app.services.retry import run_with_retries, classify_error, PERMANENT
 import logging
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-async def crawl(url: str, use_javascript: bool = False, config: dict = None) -> str:
+DEFAULT_PAGE_TIMEOUT_MS = 240000  # 4 minutes
+
+
+class CrawlError(Exception):
+    """Raised when the browser could not load a page"""
+
+    def __init__(self, message: str, status_code: int | None = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+async def crawl(
+    url: str,
+    use_javascript: bool = False,
+    config: dict = None,
+    block_profile: str = BLOCK_PROFILE,
+    traffic: dict = None,
+    page: dict = None,
+) -> str:
     """
-    Fetch HTML from URL using Crawl4AI with Playwright.
+    Fetch HTML from URL using Crawl4AI with Playwright (a single attempt;
+    fetch_page() applies the retry policy).
+    Browsers are borrowed from the shared pool in app.services.browser_pool.
     Args:
         url (str): Target URL
         use_javascript (bool): Enable JS rendering via headless browser
         config (dict): Optional runtime configuration overrides
+        block_profile (str): Request interception profile (see app.services.interception)
+        traffic (dict): Filled with request/block counters for the page
+        page (dict): Filled with the pruned markdown of the page ("markdown")
     Returns:
         str: Extracted HTML content
     """
@@ -27,26 +52,26 @@ async def crawl(url: str, use_javascript: bool = False, config: dict = None) ->
     loop = asyncio.get_running_loop()
     logger.info(f"Using event loop: {loop} (running={loop.is_running()}, closed={loop.is_closed()})")
 
-    # Browser configuration
-    browser_config = BrowserConfig(
-        headless=True,
-        verbose=True,
-        user_agent=(
-            "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/131.0.0.0 Safari/537.36"
-        ),
-        viewport_width=1920,
-        viewport_height=1080,
-    )
+    # Wait strategy: return as soon as the DOM is stable, or the legacy fixed delay
+    if CRAWL_READINESS == "dom":
+        wait_options = {
+            "wait_until": "domcontentloaded",
+            "delay_before_return_html": 0.0,
+            "wait_for": build_wait_condition(),
+        }
+    else:
+        wait_options = {
+            "wait_until": "networkidle" if use_javascript else "commit",
+            "delay_before_return_html": 10.0,  # Increased for stability
+            "wait_for": CONTENT_SELECTOR,
+        }
+
     # Default crawler configuration
     default_config = CrawlerRunConfig(
         markdown_generator=DefaultMarkdownGenerator(
             content_filter=PruningContentFilter()
         ),
-        wait_until="networkidle" if use_javascript else "commit",
-        delay_before_return_html=10.0,  # Increased for stability
-        wait_for="article, main, [role='main'], .event, [class*='event']",
+        **wait_options,
         excluded_tags=[
             "nav",
             "footer",
@@ -57,7 +82,7 @@ async def crawl(url: str, use_javascript: bool = False, config: dict = None) ->
             "noscript",
         ],
         exclude_external_links=False,
-        page_timeout=240000,  # Increased to 4 minutes
+        page_timeout=DEFAULT_PAGE_TIMEOUT_MS,
         process_iframes=False,
     )
     # Apply any user overrides
@@ -66,50 +91,108 @@ async def crawl(url: str, use_javascript: bool = False, config: dict = None) ->
             if hasattr(default_config, key):
                 setattr(default_config, key, value)
 
-    # Pre-initialize Playwright browser if JS is enabled
-    if use_javascript:
-        logger.info("Pre-initializing Playwright browser...")
-        try:
-            async with async_playwright() as p:
-                browser = await p.chromium.launch(headless=True)
-                logger.info("Playwright browser launched successfully")
-                await browser.close()
-        except Exception as e:
-            logger.error(f"Playwright pre-launch failed: {str(e)}")
-            raise
-
-    # Retry mechanism with detailed logging
-    for attempt in range(MAX_RETRIES):
+    async with browser_pool.acquire() as browser:
+        browser.prepare(url, block_profile)
+        result = await browser.crawler.arun(url=url, config=default_config)
+        if traffic is not None:
+            traffic.update(browser.traffic.as_dict())
+
+    reason, waited_ms, _ = parse_readiness(result.html or "")
+    # Challenge pages end the readiness wait early
+    kind = "cloudflare_challenge" if reason == "challenge" else classify_challenge(
+        result.status_code,
+        result.response_headers,
+        result.redirected_url or result.url,
+        result.html,
+    )
+    if kind:
+        raise challenge_detected(kind, url)
+    if not result.success:
+        raise CrawlError(result.error_message or "Unknown error", result.status_code)
+    if result.status_code and result.status_code >= 400:
+        raise CrawlError(f"HTTP {result.status_code} for {url}", result.status_code)
+
+    if page is not None and result.markdown:
+        page["markdown"] = result.markdown.fit_markdown
+    logger.info(f"[SUCCESS] Crawled: {url}")
+    logger.info(f"[INFO] Final URL: {result.url}")
+    logger.info(f"[INFO] Status: {result.status_code}")
+    logger.info(f"[INFO] HTML length: {len(result.html)}")
+    logger.info(f"[INFO] Markdown length: {len(result.markdown.raw_markdown)}")
+    if reason:
+        logger.info(f"[INFO] Ready after {waited_ms}ms ({reason})")
+    logger.info(
+        f"[INFO] Requests: {browser.traffic.requests}, "
+        f"blocked: {browser.traffic.blocked} ({block_profile})"
+    )
+    return result.html
+
+
+async def fetch_page(
+    url: str,
+    use_javascript: bool = False,
+    tier: str | None = None,
+    config: dict = None,
+    traffic: dict = None,
+    history: list = None,
+    page: dict = None,
+) -> tuple[str, str]:
+    """
+    Fetch a page with the cheapest tier that works, under the retry policy.
+
+    Plain HTTP is tried first unless JavaScript was requested or the site
+    is known to need a browser; the browser is used when the HTTP response
+    looks JS-dependent (empty app root, noscript wall, challenge page).
+    Transient failures are retried; permanent ones, bot challenges and
+    open circuits fail at once (see app.services.retry).
+    Args:
+        url (str): Target URL
+        use_javascript (bool): Force the browser tier
+        tier (str): Tier that last worked for this website ("http"/"browser")
+        config (dict): Browser run configuration overrides
+        traffic (dict): Filled with browser request/block counters
+        history (list): Failed attempts are appended here
+        page (dict): Filled with the pruned markdown when the browser is used,
+            and "escalation": why the browser was used after trying HTTP
+            (content reason, or "http_error" when the HTTP tier failed)
+    Returns:
+        tuple: (html, tier used)
+    """
+    check_cooldown(url)
+    return await run_with_retries(
+        url,
+        lambda: _fetch_once(url, use_javascript, tier, config, traffic, page),
+        history
+    )
+
+
+async def _fetch_once(
+    url: str,
+    use_javascript: bool,
+    tier: str | None,
+    config: dict | None,
+    traffic: dict | None,
+    page: dict | None,
+) -> tuple[str, str]:
+    """One fetch attempt: HTTP tier, escalating to the browser"""
+    if page is not None:
+        page.pop("escalation", None)
+    if not use_javascript and tier != "browser":
         try:
-            async with AsyncWebCrawler(config=browser_config) as crawler:
-                logger.info(f"Attempt {attempt + 1}/{MAX_RETRIES} to launch crawler for {url}")
-                logger.info("Initiating browser connection...")
-                result = await crawler.arun(url=url, config=default_config)
-                if not result.success:
-                    err = result.error_message or "Unknown error"
-                    if attempt < MAX_RETRIES - 1:
-                        logger.warning(f"[RETRY {attempt + 1}/{MAX_RETRIES}] Crawl failed: {err}")
-                        await asyncio.sleep(2 ** attempt)
-                        continue
-                    raise Exception(err)
-                logger.info(f"[SUCCESS] Crawled: {url}")
-                logger.info(f"[INFO] Final URL: {result.url}")
-                logger.info(f"[INFO] Status: {result.status_code}")
-                logger.info(f"[INFO] HTML length: {len(result.html)}")
-                logger.info(f"[INFO] Markdown length: {len(result.markdown.raw_markdown)}")
-                if result.url != url and (
-                    "scrapingbee" in result.url.lower()
-                    or "cloudflare" in result.url.lower()
-                ):
-                    raise Exception(
-                        f"Redirected to {result.url} — possible bot detection"
-                    )
-                return result.html
-        except Exception as e:
-            logger.error(f"Exception during attempt {attempt + 1}: {str(e)}")
-            if attempt == MAX_RETRIES - 1:
-                logger.error(f"Failed after {MAX_RETRIES} attempts: {str(e)}")
-                raise Exception(f"Failed after {MAX_RETRIES} attempts: {str(e)}")
-            logger.warning(f"[RETRY {attempt + 1}/{MAX_RETRIES}] Retrying after error: {str(e)}")
-            await asyncio.sleep(2 ** attempt)
-    raise Exception(f"Failed to crawl {url} after {MAX_RETRIES} attempts")
\ No newline at end of file
+            html, reason = await fetch_html(url)
+            if reason is None:
+                return html, "http"
+            logger.info(f"[ESCALATE] {url} needs a browser ({reason})")
+        except HttpFetchError as e:
+            # Missing pages and dead hosts will not load in a browser either,
+            # and an overloaded or failing host is retried with backoff
+            # rather than hit again at once from a browser
+            error_class, reason = classify_error(e)
+            if error_class == PERMANENT or (e.status_code and reason in ("rate_limited", "http_5xx")):
+                raise
+            logger.info(f"[ESCALATE] {url} HTTP tier failed: {str(e)}")
+            reason = "http_error"
+        if page is not None:
+            page["escalation"] = reason
+
+    return await crawl(url, use_javascript, config, traffic=traffic, page=page), "browser"
@@ -0,0 +1,88 @@
+import csv
+import io
+import json
+from datetime import datetime
+from app.database import as_document
+from app.services.event_query import iter_events
+from app.services.structured_data import get_path, leaf_paths
+
+# Output is flushed to the client in pieces of about this size
+_FLUSH_BYTES = 64 * 1024
+
+# Event columns, in export order (eventData and fieldConfidences follow)
+_COLUMNS = [
+    "id", "crawlJobId", "websiteId", "sourceUrl", "createdAt",
+    "reviewStatus", "reviewedAt", "publishedAt",
+    "overallConfidence", "extractionMethod", "modelTier", "aiNotes",
+]
+
+
+def _value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _row(event: dict) -> dict:
+    """An exported event: the API fields plus the review state"""
+    return {
+        **{name: _value(event.get(name)) for name in _COLUMNS},
+        "eventData": as_document(event.get("eventData")),
+        "fieldConfidences": as_document(event.get("fieldConfidences")),
+    }
+
+
+async def export_ndjson(where: dict):
+    """One JSON object per line"""
+    buffer = []
+    size = 0
+    async for event in iter_events(where):
+        line = json.dumps(_row(event), ensure_ascii=False, default=str) + "\n"
+        buffer.append(line)
+        size += len(line)
+        if size >= _FLUSH_BYTES:
+            yield "".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def _cell(value):
+    """CSV cell: objects and lists as JSON"""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, default=str)
+    return value
+
+
+async def export_csv(where: dict, event_structure: dict | None):
+    """
+    One row per event: the event columns, then one column per structure
+    field (`eventData.<path>`) and its confidence (`confidence.<path>`).
+    Without an active structure eventData and fieldConfidences are JSON cells.
+    """
+    paths = [path for path, _ in leaf_paths(event_structure or {})]
+    if paths:
+        header = _COLUMNS + [f"eventData.{p}" for p in paths] + [f"confidence.{p}" for p in paths]
+    else:
+        header = _COLUMNS + ["eventData", "fieldConfidences"]
+
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(header)
+    async for event in iter_events(where):
+        row = _row(event)
+        cells = [row[name] for name in _COLUMNS]
+        if paths:
+            data = row["eventData"] or {}
+            confidences = row["fieldConfidences"] or {}
+            cells += [_cell(get_path(data, p)) for p in paths]
+            cells += [confidences.get(p) for p in paths]
+        else:
+            cells += [_cell(row["eventData"]), _cell(row["fieldConfidences"])]
+        writer.writerow(cells)
+        if output.tell() >= _FLUSH_BYTES:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+    if output.tell():
+        yield output.getvalue()
@@ -0,0 +1,165 @@
+import re
+from datetime import date, datetime, timedelta
+from bson import ObjectId
+from app.config import MAP_REQUIRED_FIELDS, EXPORT_BATCH_SIZE
+from app.database import get_mongo
+from app.services.pagination import after_cursor_mongo
+from app.services.structured_data import leaf_paths
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+_DATE_TYPES = {"datetime", "date"}
+
+
+def date_field(event_structure: dict) -> str | None:
+    """The field date filters apply to: a required date field, else the first date field"""
+    dates = [
+        path for path, field_type in leaf_paths(event_structure)
+        if isinstance(field_type, str) and field_type.lower() in _DATE_TYPES
+    ]
+    required = [path for path in MAP_REQUIRED_FIELDS if path in dates]
+    return (required or dates or [None])[0]
+
+
+def parse_pairs(values: list[str], name: str) -> dict[str, str]:
+    """`path:value` query parameters -> {path: value}"""
+    pairs = {}
+    for value in values:
+        path, sep, rest = value.partition(":")
+        if not sep or not path.strip() or not rest.strip():
+            raise ValueError(f"{name} must look like path:value, got {value!r}")
+        pairs[path.strip()] = rest.strip()
+    return pairs
+
+
+def _date_bound(value: str, upper: bool) -> dict:
+    """
+    Range condition on an ISO 8601 string field.
+
+    Event dates are stored as ISO 8601 strings, which sort in time order
+    (within one UTC offset). A plain date as upper bound includes that day.
+    """
+    try:
+        if len(value) == 10:
+            day = date.fromisoformat(value)
+            return {"$lt": (day + timedelta(days=1)).isoformat()} if upper else {"$gte": day.isoformat()}
+        datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError(f"Invalid ISO 8601 date: {value!r}")
+    return {"$lte": value} if upper else {"$gte": value}
+
+
+def build_filter(
+    event_structure: dict | None,
+    website_id: str | None = None,
+    review_status: str | None = None,
+    min_confidence: float = 0,
+    date_from: str | None = None,
+    date_to: str | None = None,
+    date_path: str | None = None,
+    fields: dict[str, str] | None = None,
+    confidences: dict[str, str] | None = None,
+    reviewed_since: datetime | None = None,
+    published_since: datetime | None = None,
+) -> dict:
+    """
+    MongoDB filter on the events collection.
+
+    Args:
+        event_structure: Active event structure (field paths are checked against it)
+        date_from/date_to: Range on `date_path` (default: the structure's date field)
+        fields: Field path -> text the value contains (case-insensitive)
+        confidences: Field path -> minimum confidence of that field
+        reviewed_since/published_since: Only events reviewed/published at or after this time
+
+    Raises:
+        ValueError: Unknown field or invalid value
+    """
+    paths = {path for path, _ in leaf_paths(event_structure or {})}
+
+    def check(path: str) -> str:
+        if path not in paths:
+            raise ValueError(f"Unknown event field: {path}")
+        return path
+
+    where = {}
+    conditions = []
+    if website_id:
+        if not ObjectId.is_valid(website_id):
+            raise ValueError(f"Invalid website id: {website_id}")
+        where["websiteId"] = ObjectId(website_id)
+    if review_status:
+        where["reviewStatus"] = review_status
+    if min_confidence > 0:
+        where["overallConfidence"] = {"$gte": min_confidence}
+    if reviewed_since:
+        where["reviewedAt"] = {"$gte": reviewed_since}
+    if published_since:
+        where["publishedAt"] = {"$gte": published_since}
+
+    if date_from or date_to:
+        path = check(date_path) if date_path else date_field(event_structure or {})
+        if path is None:
+            raise ValueError("The event structure has no date field; pass date_field")
+        bounds = {}
+        if date_from:
+            bounds.update(_date_bound(date_from, upper=False))
+        if date_to:
+            bounds.update(_date_bound(date_to, upper=True))
+        where[f"eventData.{path}"] = bounds
+
+    for path, text in (fields or {}).items():
+        where[f"eventData.{check(path)}"] = {"$regex": re.escape(text), "$options": "i"}
+
+    for path, minimum in (confidences or {}).items():
+        try:
+            minimum = float(minimum)
+        except ValueError:
+            raise ValueError(f"Invalid confidence for {path}: {minimum!r}")
+        # Confidence keys are dot paths themselves, so they are read with $getField
+        conditions.append({
+            "$gte": [{"$getField": {"field": check(path), "input": "$fieldConfidences"}}, minimum]
+        })
+
+    if conditions:
+        where["$expr"] = {"$and": conditions} if len(conditions) > 1 else conditions[0]
+    return where
+
+
+def _document(doc: dict) -> dict:
+    """An events document in the shape of the Prisma Event model"""
+    doc_id = doc.pop("_id")
+    return {
+        **doc,
+        "id": str(doc_id),
+        "crawlJobId": str(doc["crawlJobId"]),
+        "websiteId": str(doc["websiteId"]),
+    }
+
+
+async def find_events(where: dict, take: int, cursor: str | None = None) -> list[dict]:
+    """Newest events matching a filter from build_filter(), after a page cursor"""
+    if cursor:
+        where = {**where, **after_cursor_mongo(cursor)}
+    collection = get_mongo()["events"]
+    rows = collection.find(where).sort([("createdAt", -1), ("_id", -1)]).limit(take)
+    return [_document(doc) async for doc in rows]
+
+
+async def iter_events(where: dict):
+    """
+    Every event matching a filter from build_filter(), oldest first.
+
+    The cursor fetches EXPORT_BATCH_SIZE documents per round trip, so only
+    one batch is held in memory however many events match.
+    """
+    collection = get_mongo()["events"]
+    rows = collection.find(where).sort([("createdAt", 1), ("_id", 1)]).batch_size(EXPORT_BATCH_SIZE)
+    try:
+        async for doc in rows:
+            yield _document(doc)
+    finally:
+        # The client may disconnect mid-export
+        await rows.close()
@@ -0,0 +1,133 @@
+import re
+import httpx
+from app.config import (
+    HTTP_FETCH_TIMEOUT,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE,
+    HTTP_MIN_TEXT_CHARS,
+)
+from app.services.browser_pool import USER_AGENT
+from app.services.challenge import classify_challenge, challenge_detected, BROWSER_PASSABLE
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Shared client; keep-alive connections are pooled per host
+_client: httpx.AsyncClient | None = None
+
+_INVISIBLE = re.compile(r"<(script|style|noscript|template|svg)\b[^>]*>.*?</\1\s*>", re.S | re.I)
+_TAG = re.compile(r"<[^>]+>")
+_WHITESPACE = re.compile(r"\s+")
+_NOSCRIPT = re.compile(r"<noscript\b[^>]*>(.*?)</noscript\s*>", re.S | re.I)
+# SPA mount points left empty by the server
+_EMPTY_ROOT = re.compile(
+    r"<div[^>]+id=[\"'](?:root|app|__next|__nuxt|svelte)[\"'][^>]*>\s*</div>",
+    re.I,
+)
+
+
+class HttpFetchError(Exception):
+    """Raised when the plain-HTTP tier cannot fetch the page at all"""
+
+    def __init__(self, message: str, status_code: int | None = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _build_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=True,
+        follow_redirects=True,
+        timeout=HTTP_FETCH_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+        ),
+        headers={
+            "User-Agent": USER_AGENT,
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+            "Accept-Language": "en-US,en;q=0.9",
+        },
+    )
+
+
+def get_client() -> httpx.AsyncClient:
+    """Get the shared HTTP client, creating it on first use"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+
+async def start_http_client():
+    """Open the shared HTTP client"""
+    get_client()
+
+
+async def close_http_client():
+    """Close the shared HTTP client"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def visible_text(html: str) -> str:
+    """Rough visible text of a page (no scripts, styles or tags)"""
+    text = _INVISIBLE.sub(" ", html)
+    text = _TAG.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def escalation_reason(html: str) -> str | None:
+    """
+    Decide whether a plain-HTTP page needs a real browser to render.
+
+    Returns None if the HTML is usable as is, otherwise one of
+    "empty_root", "noscript" or "no_content".
+    """
+    text = visible_text(html)
+    if len(text) >= HTTP_MIN_TEXT_CHARS:
+        return None
+    if _EMPTY_ROOT.search(html):
+        return "empty_root"
+    if any("javascript" in block.lower() for block in _NOSCRIPT.findall(html)):
+        return "noscript"
+    return "no_content"
+
+
+async def fetch_html(url: str) -> tuple[str, str | None]:
+    """
+    Fetch a page over plain HTTP.
+
+    Returns:
+        (html, escalation_reason) - reason is None when no browser is needed
+    Raises:
+        BotChallengeError: the site blocked us in a way a browser won't get past
+    """
+    try:
+        response = await get_client().get(url)
+    except httpx.HTTPError as e:
+        raise HttpFetchError(f"HTTP fetch failed: {type(e).__name__}: {str(e)}")
+
+    content_type = response.headers.get("content-type", "")
+    if content_type and "html" not in content_type and "xml" not in content_type:
+        raise HttpFetchError(f"Unexpected content type: {content_type}", response.status_code)
+
+    html = response.text
+    kind = classify_challenge(response.status_code, response.headers, str(response.url), html)
+    if kind and kind not in BROWSER_PASSABLE:
+        raise challenge_detected(kind, url)
+    if not kind and (response.status_code == 429 or response.status_code >= 500):
+        # Overload or outage: retried with backoff, a browser would not get further
+        raise HttpFetchError(f"HTTP {response.status_code} for {url}", response.status_code)
+    reason = "challenge" if kind else escalation_reason(html)
+    if reason is None and response.status_code >= 400:
+        raise HttpFetchError(f"HTTP {response.status_code} for {url}", response.status_code)
+
+    logger.info(
+        f"[HTTP] {url} -> {response.status_code} ({response.http_version}), "
+        f"{len(html)} chars, escalate: {reason or 'no'}"
+    )
+    return html, reason
@@ -0,0 +1,161 @@
+from urllib.parse import urlparse
+from app.config import BLOCK_PROFILE
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Request interception profiles applied to every browser page.
+#   resource_types: Playwright resource types to abort
+#   block_trackers: abort requests to known ad/analytics domains
+#   first_party_xhr_only: abort fetch/XHR to other sites
+BLOCK_PROFILES = {
+    "none": {
+        "resource_types": set(),
+        "block_trackers": False,
+        "first_party_xhr_only": False,
+    },
+    "media": {
+        "resource_types": {"image", "media", "font"},
+        "block_trackers": False,
+        "first_party_xhr_only": False,
+    },
+    "lean": {
+        "resource_types": {"image", "media", "font"},
+        "block_trackers": True,
+        "first_party_xhr_only": False,
+    },
+    "strict": {
+        "resource_types": {"image", "media", "font", "stylesheet", "manifest", "other"},
+        "block_trackers": True,
+        "first_party_xhr_only": True,
+    },
+}
+
+TRACKER_DOMAINS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "googlesyndication.com",
+    "googleadservices.com",
+    "doubleclick.net",
+    "adservice.google.com",
+    "facebook.net",
+    "connect.facebook.com",
+    "hotjar.com",
+    "clarity.ms",
+    "segment.com",
+    "segment.io",
+    "mixpanel.com",
+    "amplitude.com",
+    "fullstory.com",
+    "newrelic.com",
+    "nr-data.net",
+    "scorecardresearch.com",
+    "quantserve.com",
+    "taboola.com",
+    "outbrain.com",
+    "criteo.com",
+    "criteo.net",
+    "amazon-adsystem.com",
+    "adnxs.com",
+    "adsrvr.org",
+    "pubmatic.com",
+    "rubiconproject.com",
+    "tiktok.com",
+    "snapchat.com",
+    "bing.com",
+    "linkedin.com",
+    "twitter.com",
+    "intercom.io",
+    "optimizely.com",
+)
+
+
+def _site(host: str) -> str:
+    """Approximate registrable domain: last two labels of the host"""
+    parts = host.lower().rstrip(".").split(".")
+    return ".".join(parts[-2:]) if len(parts) >= 2 else host.lower()
+
+
+def _is_tracker(host: str) -> bool:
+    host = host.lower()
+    return any(host == d or host.endswith("." + d) for d in TRACKER_DOMAINS)
+
+
+class TrafficStats:
+    """Request counters for one page load"""
+
+    def __init__(self, profile: str = BLOCK_PROFILE):
+        self.profile = profile
+        self.requests = 0
+        self.blocked = 0
+        self.blocked_by_reason: dict[str, int] = {}
+        self.bytes_loaded = 0
+
+    def block(self, reason: str):
+        self.blocked += 1
+        self.blocked_by_reason[reason] = self.blocked_by_reason.get(reason, 0) + 1
+
+    def as_dict(self) -> dict:
+        return {
+            "profile": self.profile,
+            "requests": self.requests,
+            "blocked": self.blocked,
+            "blockedByReason": self.blocked_by_reason,
+            "bytesLoaded": self.bytes_loaded,
+        }
+
+
+def block_reason(rules: dict, resource_type: str, url: str, first_party: str | None) -> str | None:
+    """Why a request should be aborted under a profile, or None to let it through"""
+    if resource_type in rules["resource_types"]:
+        return resource_type
+
+    host = urlparse(url).hostname or ""
+    if not host:
+        return None
+    if rules["block_trackers"] and _is_tracker(host) and _site(host) != first_party:
+        return "tracker"
+    if (
+        rules["first_party_xhr_only"]
+        and resource_type in ("xhr", "fetch")
+        and first_party
+        and _site(host) != first_party
+    ):
+        return "third_party_xhr"
+    return None
+
+
+async def apply_block_profile(page, profile: str, target_url: str, stats: TrafficStats):
+    """Route every request of a Playwright page through a block profile"""
+    rules = BLOCK_PROFILES.get(profile)
+    if rules is None:
+        logger.warning(f"Unknown block profile '{profile}', using 'none'")
+        rules = BLOCK_PROFILES["none"]
+    first_party = _site(urlparse(target_url).hostname or "") if target_url else None
+
+    async def handle(route):
+        request = route.request
+        # Never block the page itself
+        reason = None if request.is_navigation_request() else block_reason(
+            rules, request.resource_type, request.url, first_party
+        )
+        if reason:
+            stats.block(reason)
+            await route.abort()
+        else:
+            await route.continue_()
+
+    def on_request(request):
+        stats.requests += 1
+
+    def on_response(response):
+        try:
+            stats.bytes_loaded += int(response.headers.get("content-length", 0))
+        except (TypeError, ValueError):
+            pass
+
+    if rules["resource_types"] or rules["block_trackers"] or rules["first_party_xhr_only"]:
+        await page.route("**/*", handle)
+    page.on("request", on_request)
+    page.on("response", on_response)
@@ -0,0 +1,274 @@
+import asyncio
+import os
+import socket
+from datetime import datetime, timedelta
+from app.database import get_db
+from app.config import JOB_LEASE_SECONDS, JOB_POLL_INTERVAL, MAX_JOB_ATTEMPTS, JOB_RETRY_DELAY
+from app.services.scheduler import CrawlScheduler, CrawlTask, QueueFullError, scheduler
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Identifies this process as a lease owner
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class LeaseLostError(Exception):
+    """Raised when this worker no longer holds a job's lease (it expired and the job was re-queued)"""
+
+
+def _lease_expiry() -> datetime:
+    return datetime.utcnow() + timedelta(seconds=JOB_LEASE_SECONDS)
+
+
+async def claim_job(job_id: str) -> bool:
+    """
+    Atomically move a pending job to processing under this worker's lease.
+
+    Returns False if another worker already claimed it.
+    """
+    db = get_db()
+    count = await db.crawljob.update_many(
+        where={"id": job_id, "status": "pending"},
+        data={
+            "status": "processing",
+            "leaseOwner": WORKER_ID,
+            "leaseExpiresAt": _lease_expiry(),
+            "attempts": {"increment": 1},
+        }
+    )
+    return count == 1
+
+
+async def claim_pending(limit: int, website_load: dict[str, int] | None = None, per_website: int = 0) -> list:
+    """
+    Claim up to `limit` of the oldest pending jobs.
+
+    With `per_website`, no website is given more than that many jobs here
+    counting the ones it already has (`website_load`), so one website's
+    backlog cannot take every slot while other websites wait.
+    """
+    db = get_db()
+    if limit <= 0:
+        return []
+
+    load = dict(website_load or {})
+    # Re-queued jobs wait out their delay (unset on every other job)
+    where = {"status": "pending", "NOT": [{"retryAfter": {"gt": datetime.utcnow()}}]}
+    if per_website:
+        full = [website_id for website_id, jobs in load.items() if jobs >= per_website]
+        if full:
+            where["websiteId"] = {"not_in": full}
+
+    # Over-fetch a little since other workers race for the same jobs
+    candidates = await db.crawljob.find_many(
+        where=where,
+        order={"createdAt": "asc"},
+        take=limit * 2
+    )
+
+    claimed = []
+    for job in candidates:
+        if len(claimed) >= limit:
+            break
+        if per_website and load.get(job.websiteId, 0) >= per_website:
+            continue
+        if await claim_job(job.id):
+            claimed.append(job)
+            load[job.websiteId] = load.get(job.websiteId, 0) + 1
+    return claimed
+
+
+async def update_leased(job_id: str, data: dict) -> bool:
+    """
+    Update a job only while this worker holds its lease.
+
+    Returns False if the lease expired and the job went back to the queue
+    (another worker may be running it now), in which case nothing is written.
+    """
+    db = get_db()
+    count = await db.crawljob.update_many(
+        where={"id": job_id, "leaseOwner": WORKER_ID, "status": "processing"},
+        data=data
+    )
+    return count == 1
+
+
+async def renew_lease(job_id: str) -> bool:
+    """Extend the lease on one job; False if this worker lost it"""
+    return await update_leased(job_id, {"leaseExpiresAt": _lease_expiry()})
+
+
+async def renew_leases() -> int:
+    """Heartbeat: extend the lease on every job this worker holds"""
+    db = get_db()
+    return await db.crawljob.update_many(
+        where={"leaseOwner": WORKER_ID, "status": "processing"},
+        data={"leaseExpiresAt": _lease_expiry()}
+    )
+
+
+async def requeue_expired() -> int:
+    """Return jobs with expired leases to pending, failing ones out of attempts"""
+    db = get_db()
+    now = datetime.utcnow()
+
+    failed = await db.crawljob.update_many(
+        where={
+            "status": "processing",
+            "leaseExpiresAt": {"lt": now},
+            "attempts": {"gte": MAX_JOB_ATTEMPTS},
+        },
+        data={
+            "status": "failed",
+            "error": f"Lease expired after {MAX_JOB_ATTEMPTS} attempts",
+            "leaseOwner": None,
+            "leaseExpiresAt": None,
+            "completedAt": now,
+        }
+    )
+    requeued = await db.crawljob.update_many(
+        where={"status": "processing", "leaseExpiresAt": {"lt": now}},
+        data={"status": "pending", "leaseOwner": None, "leaseExpiresAt": None}
+    )
+    if failed or requeued:
+        logger.warning(f"Expired leases: {requeued} jobs re-queued, {failed} jobs failed")
+    return requeued
+
+
+async def release_job(job_id: str):
+    """Hand a single claimed job back to the queue"""
+    db = get_db()
+    await db.crawljob.update_many(
+        where={"id": job_id, "leaseOwner": WORKER_ID, "status": "processing"},
+        # The job never ran: give back the attempt its claim counted
+        data={"status": "pending", "leaseOwner": None, "leaseExpiresAt": None, "attempts": {"decrement": 1}}
+    )
+
+
+async def requeue_job(job_id: str) -> bool:
+    """
+    Put a claimed job back to pending to be retried after JOB_RETRY_DELAY
+    seconds, doubled for every attempt it has used.
+
+    Returns False once the job has used MAX_JOB_ATTEMPTS (it should fail).
+    """
+    db = get_db()
+    job = await db.crawljob.find_unique(where={"id": job_id})
+    if job is None or job.attempts >= MAX_JOB_ATTEMPTS:
+        return False
+    delay = JOB_RETRY_DELAY * 2 ** max(0, job.attempts - 1)
+    count = await db.crawljob.update_many(
+        where={
+            "id": job_id,
+            "leaseOwner": WORKER_ID,
+            "status": "processing",
+            "attempts": {"lt": MAX_JOB_ATTEMPTS},
+        },
+        data={
+            "status": "pending",
+            "leaseOwner": None,
+            "leaseExpiresAt": None,
+            "retryAfter": datetime.utcnow() + timedelta(seconds=delay),
+        }
+    )
+    return count == 1
+
+
+async def release_leases() -> int:
+    """Hand jobs still held by this worker back to the queue (shutdown)"""
+    db = get_db()
+    return await db.crawljob.update_many(
+        where={"leaseOwner": WORKER_ID, "status": "processing"},
+        # Interrupted jobs are retried without losing an attempt
+        data={"status": "pending", "leaseOwner": None, "leaseExpiresAt": None, "attempts": {"decrement": 1}}
+    )
+
+
+class JobFeeder:
+    """
+    Feeds a local scheduler from the shared crawl_jobs collection.
+
+    Claims only as many pending jobs as the scheduler has idle workers, so
+    work spreads across every process sharing the database. Also renews
+    this worker's leases and re-queues jobs whose owner died.
+    """
+
+    def __init__(self, job_scheduler: CrawlScheduler, poll_interval: float = JOB_POLL_INTERVAL):
+        self.scheduler = job_scheduler
+        self.poll_interval = poll_interval
+        self._claim_task: asyncio.Task | None = None
+        self._heartbeat_task: asyncio.Task | None = None
+        self.stats = {"claimed": 0, "requeued": 0}
+
+    def start(self):
+        if self._claim_task:
+            return
+        self._claim_task = asyncio.create_task(self._claim_loop())
+        self._heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+        logger.info(f"Job feeder started as {WORKER_ID}")
+
+    async def stop_claiming(self):
+        """Stop taking new jobs; leases keep being renewed while jobs drain"""
+        await self._cancel(self._claim_task)
+        self._claim_task = None
+
+    async def stop(self):
+        """Stop claiming and heartbeats"""
+        await self.stop_claiming()
+        await self._cancel(self._heartbeat_task)
+        self._heartbeat_task = None
+
+    @staticmethod
+    async def _cancel(task: asyncio.Task | None):
+        if task is None:
+            return
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    def _free_slots(self) -> int:
+        # Parked jobs wait on their website, not on a worker
+        busy = self.scheduler.running + self.scheduler.pending - self.scheduler.parked
+        return min(self.scheduler.concurrency - busy, self.scheduler.capacity())
+
+    async def _claim_loop(self):
+        while True:
+            submitted = 0
+            try:
+                self.stats["requeued"] += await requeue_expired()
+                claimed = await claim_pending(
+                    self._free_slots(),
+                    self.scheduler.website_load(),
+                    self.scheduler.per_website,
+                )
+                for job in claimed:
+                    try:
+                        self.scheduler.submit(
+                            CrawlTask(job.id, job.websiteId, job.url, job.useJavascript, claimed=True)
+                        )
+                        self.stats["claimed"] += 1
+                        submitted += 1
+                    except QueueFullError:
+                        await release_job(job.id)
+            except Exception as e:
+                logger.error(f"Job feeder error: {str(e)}")
+            # Jobs handed back to a full scheduler are not progress: wait too
+            if not submitted:
+                await asyncio.sleep(self.poll_interval)
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(max(1, JOB_LEASE_SECONDS / 3))
+            try:
+                await renew_leases()
+            except Exception as e:
+                logger.error(f"Lease heartbeat failed: {str(e)}")
+
+    def snapshot(self) -> dict:
+        return {"worker_id": WORKER_ID, **self.stats}
+
+
+# Global feeder for the process-wide scheduler
+feeder = JobFeeder(scheduler)
+
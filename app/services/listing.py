@@ -0,0 +1,126 @@
+import asyncio
+import re
+from datetime import datetime
+from app.config import MAP_REQUIRED_FIELDS
+from app.services.ai_mapper import map_events
+from app.services.llm_client import LLMRateLimitError
+from app.services.structured_data import get_path, leaf_paths
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+_SPACES = re.compile(r"\s+")
+
+
+def _norm(value) -> str:
+    """Comparable form of a key value (dates to the minute, text casefolded)"""
+    if isinstance(value, str):
+        try:
+            moment = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+            return moment.replace(tzinfo=None).isoformat(timespec="minutes")
+        except ValueError:
+            pass
+    return _SPACES.sub(" ", str(value)).strip().casefold()
+
+
+def key_fields(event_structure: dict) -> list[str]:
+    """Fields that identify an event: the required fields, else the first field"""
+    paths = [path for path, _ in leaf_paths(event_structure)]
+    fields = [path for path in MAP_REQUIRED_FIELDS if path in paths]
+    return fields or paths[:1]
+
+
+def _set_path(data: dict, path: str, value):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        data = data.setdefault(part, {})
+    data[parts[-1]] = value
+
+
+def _absorb(target: dict, other: dict, paths: list[str], fill_only: bool = False):
+    """Take each field from `other` where it is filled with higher confidence (or only the gaps)"""
+    confidences = target["field_confidences"]
+    other_confidences = other["field_confidences"]
+    for path in paths:
+        value = get_path(other["event_data"], path)
+        if value is None:
+            continue
+        if get_path(target["event_data"], path) is None or (
+            not fill_only and other_confidences.get(path, 0) > confidences.get(path, 0)
+        ):
+            _set_path(target["event_data"], path, value)
+            confidences[path] = other_confidences.get(path, 0)
+    if other.get("tier") == "pro":
+        target["tier"] = "pro"
+
+
+def dedupe_events(results: list[dict], event_structure: dict) -> list[dict]:
+    """
+    Merge the events found in overlapping chunks.
+
+    Events with the same key fields (title and start date by default) are
+    one event; per field the most confident value wins. Fragments missing
+    a key field are folded into the page's only complete event (a long
+    detail page), or into each other if no event is complete, and dropped
+    otherwise.
+    """
+    keys = key_fields(event_structure)
+    paths = [path for path, _ in leaf_paths(event_structure)]
+    events: dict[tuple, dict] = {}
+    fragments = []
+
+    for result in results:
+        values = [get_path(result["event_data"], path) for path in keys]
+        if any(value is None for value in values):
+            fragments.append(result)
+            continue
+        key = tuple(_norm(value) for value in values)
+        if key in events:
+            _absorb(events[key], result, paths)
+        else:
+            events[key] = result
+
+    merged = list(events.values())
+    if fragments and len(merged) <= 1:
+        base = merged[0] if merged else fragments.pop(0)
+        for fragment in fragments:
+            _absorb(base, fragment, paths, fill_only=True)
+        merged = [base]
+    elif fragments:
+        logger.info(f"Dropped {len(fragments)} event fragments without {', '.join(keys)}")
+    return merged
+
+
+async def map_listing(chunks: list[str], event_structure: dict, website_notes: str = "") -> list[dict]:
+    """
+    Map the chunks of a long or listing page in parallel and merge the events.
+
+    A chunk that fails is skipped as long as another chunk succeeded.
+
+    Returns:
+        De-duplicated results in the map_to_structure format, each with its tier
+    """
+    answers = await asyncio.gather(
+        *(map_events(chunk, event_structure, website_notes) for chunk in chunks),
+        return_exceptions=True
+    )
+    results, errors = [], []
+    for answer in answers:
+        if isinstance(answer, BaseException):
+            errors.append(answer)
+        else:
+            results.extend(answer)
+
+    if errors:
+        # Out of quota: the job is re-queued rather than completed with gaps
+        for error in errors:
+            if isinstance(error, LLMRateLimitError):
+                raise error
+        if len(errors) == len(chunks):
+            raise errors[0]
+        logger.warning(f"{len(errors)} of {len(chunks)} page chunks failed: {str(errors[0])}")
+
+    events = dedupe_events(results, event_structure)
+    logger.info(f"[LISTING] {len(chunks)} chunks, {len(results)} answers, {len(events)} events")
+    return events
@@ -0,0 +1,536 @@
+import asyncio
+import json
+import random
+import re
+import time
+from collections import deque
+import google.generativeai as genai
+import openai
+from google.api_core import exceptions as google_exceptions
+from app.config import (
+    LLM_PROVIDERS,
+    GEMINI_API_KEY,
+    MAP_FAST_MODEL,
+    MAP_PRO_MODEL,
+    OPENAI_API_KEY,
+    OPENAI_BASE_URL,
+    OPENAI_FAST_MODEL,
+    OPENAI_PRO_MODEL,
+    LLM_LOCAL_URL,
+    LLM_LOCAL_MODEL,
+    LLM_RPM,
+    LLM_TPM,
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_RETRIES,
+    LLM_BACKOFF_BASE,
+    LLM_BACKOFF_MAX,
+    LLM_TIMEOUT,
+    LLM_HEDGE,
+    LLM_HEDGE_PERCENTILE,
+    LLM_HEDGE_DELAY_MS,
+    LLM_PROVIDER_FAILURES,
+    LLM_PROVIDER_COOLDOWN,
+)
+from app.services.content import estimate_tokens
+from app.services.retry import CircuitBreaker, CircuitOpenError
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Output tokens reserved per call until the real usage is known
+_OUTPUT_TOKEN_RESERVE = 1000
+_WINDOW_SECONDS = 60.0
+# Latency samples kept per provider for routing and the hedge delay
+_LATENCY_SAMPLES = 100
+# Samples needed before the hedge delay follows the observed percentile
+_MIN_HEDGE_SAMPLES = 20
+# Weight of the newest call in the moving averages
+_EWMA_WEIGHT = 0.2
+
+_RETRY_DELAY = re.compile(r"retry(?:_delay)?\D{0,20}?(\d+(?:\.\d+)?)\s*s", re.I)
+
+
+class LLMRateLimitError(Exception):
+    """Raised when the model quota is still exhausted after every retry"""
+
+    status_code = 429
+
+
+class RateLimiter:
+    """
+    Sliding one-minute window over requests and tokens.
+
+    Callers reserve an estimate up front and settle it with the real usage
+    once the response arrives. A rate-limit answer from the API pauses
+    every caller (cooldown) with exponential backoff.
+    """
+
+    def __init__(self, rpm: int = LLM_RPM, tpm: int = LLM_TPM):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._window: deque[list] = deque()  # [timestamp, tokens]
+        self._tokens = 0
+        self._cooldown_until = 0.0
+        self._strikes = 0
+        self._lock = asyncio.Lock()
+        self.waited_seconds = 0.0
+
+    def _prune(self, now: float):
+        while self._window and now - self._window[0][0] >= _WINDOW_SECONDS:
+            self._tokens -= self._window.popleft()[1]
+
+    def _wait_time(self, now: float, tokens: int) -> float:
+        wait = max(0.0, self._cooldown_until - now)
+        if not self._window:
+            return wait
+        over_rpm = self.rpm > 0 and len(self._window) >= self.rpm
+        over_tpm = self.tpm > 0 and self._tokens + tokens > self.tpm
+        if over_rpm or over_tpm:
+            wait = max(wait, self._window[0][0] + _WINDOW_SECONDS - now)
+        return wait
+
+    async def acquire(self, tokens: int) -> list:
+        """Wait for room in the window; returns the reservation"""
+        started = time.monotonic()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._prune(now)
+                wait = self._wait_time(now, tokens)
+                if wait <= 0:
+                    entry = [now, tokens]
+                    self._window.append(entry)
+                    self._tokens += tokens
+                    break
+                await asyncio.sleep(wait)
+        self.waited_seconds += time.monotonic() - started
+        return entry
+
+    def settle(self, entry: list, tokens: int):
+        """Replace a reservation's estimate with the tokens actually used"""
+        if any(reserved is entry for reserved in self._window):
+            self._tokens += tokens - entry[1]
+        entry[1] = tokens
+
+    def rate_limited(self, retry_after: float | None = None) -> float:
+        """Back off after a 429; returns the pause in seconds"""
+        self._strikes += 1
+        delay = min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** (self._strikes - 1))
+        delay = max(delay, retry_after or 0) * random.uniform(1.0, 1.25)
+        self._cooldown_until = max(self._cooldown_until, time.monotonic() + delay)
+        return delay
+
+    def succeeded(self):
+        self._strikes = 0
+
+    def snapshot(self) -> dict:
+        self._prune(time.monotonic())
+        return {
+            "rpm_limit": self.rpm,
+            "tpm_limit": self.tpm,
+            "requests_last_minute": len(self._window),
+            "tokens_last_minute": self._tokens,
+            "cooling_down": max(0, round(self._cooldown_until - time.monotonic(), 1)),
+            "waited_seconds": round(self.waited_seconds, 3),
+        }
+
+
+class LLMProvider:
+    """
+    One LLM backend: a concurrency cap, RPM/TPM limits, retries for
+    retryable errors only, and per-model token/latency stats.
+
+    Subclasses implement _call() and name the errors that are worth
+    retrying (_retryable) and that mean the quota is exhausted (_rate_limited).
+    """
+
+    name = "provider"
+    _rate_limited: tuple = ()
+    _retryable: tuple = (asyncio.TimeoutError,)
+
+    def __init__(
+        self,
+        models: dict[str, str],
+        rpm: int = LLM_RPM,
+        tpm: int = LLM_TPM,
+        concurrency: int = LLM_MAX_CONCURRENCY,
+        max_retries: int = LLM_MAX_RETRIES,
+    ):
+        self.models = models
+        self.max_retries = max(0, max_retries)
+        self.limiter = RateLimiter(rpm, tpm)
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+        self._stats: dict[str, dict] = {}
+
+    def model_for(self, tier: str) -> str:
+        return self.models.get(tier) or self.models["pro"]
+
+    async def _call(self, model_name: str, prompt: str, generation_config: dict) -> tuple[str, int, int]:
+        """One request; returns (text, input tokens, output tokens)"""
+        raise NotImplementedError
+
+    def _model_stats(self, name: str) -> dict:
+        return self._stats.setdefault(name, {
+            "calls": 0, "errors": 0, "retries": 0, "rate_limited": 0,
+            "input_tokens": 0, "output_tokens": 0, "seconds": 0.0,
+        })
+
+    async def generate(
+        self,
+        tier: str,
+        prompt: str,
+        generation_config: dict | None = None,
+        max_retries: int | None = None,
+    ) -> str:
+        """
+        Run a prompt on the tier's model and return the response text.
+
+        Raises:
+            LLMRateLimitError: quota still exhausted after the last retry
+        """
+        model_name = self.model_for(tier)
+        stats = self._model_stats(model_name)
+        estimate = estimate_tokens(prompt) + _OUTPUT_TOKEN_RESERVE
+        retries = self.max_retries if max_retries is None else max_retries
+
+        for attempt in range(retries + 1):
+            entry = await self.limiter.acquire(estimate)
+            started = time.monotonic()
+            try:
+                async with self._semaphore:
+                    text, input_tokens, output_tokens = await asyncio.wait_for(
+                        self._call(model_name, prompt, generation_config or {}),
+                        timeout=LLM_TIMEOUT + 5
+                    )
+            except self._retryable as e:
+                stats["errors"] += 1
+                rate_limited = isinstance(e, self._rate_limited)
+                if rate_limited:
+                    stats["rate_limited"] += 1
+                    match = _RETRY_DELAY.search(str(e))
+                    delay = self.limiter.rate_limited(float(match.group(1)) if match else None)
+                else:
+                    delay = min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+                if attempt == retries:
+                    if rate_limited:
+                        raise LLMRateLimitError(f"{self.name} quota exhausted ({model_name}): {str(e)}")
+                    raise
+                stats["retries"] += 1
+                logger.warning(
+                    f"[LLM RETRY {attempt + 1}/{retries}] {self.name}/{model_name}: "
+                    f"{type(e).__name__}, retrying in {delay:.1f}s"
+                )
+                if not rate_limited:
+                    await asyncio.sleep(delay)
+                continue
+            except Exception:
+                stats["errors"] += 1
+                raise
+            finally:
+                stats["calls"] += 1
+                stats["seconds"] += time.monotonic() - started
+
+            self.limiter.succeeded()
+            input_tokens = input_tokens or estimate_tokens(prompt)
+            self.limiter.settle(entry, input_tokens + output_tokens)
+            stats["input_tokens"] += input_tokens
+            stats["output_tokens"] += output_tokens
+            return text
+
+    def snapshot(self) -> dict:
+        models = {}
+        for name, stats in self._stats.items():
+            models[name] = {
+                **{key: value for key, value in stats.items() if key != "seconds"},
+                "avg_seconds": round(stats["seconds"] / stats["calls"], 3) if stats["calls"] else 0.0,
+            }
+        return {"limiter": self.limiter.snapshot(), "models": models}
+
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini; generation_config is passed through as is"""
+
+    name = "gemini"
+    _rate_limited = (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)
+    _retryable = _rate_limited + (
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.InternalServerError,
+        google_exceptions.DeadlineExceeded,
+        google_exceptions.GatewayTimeout,
+        asyncio.TimeoutError,
+    )
+
+    def __init__(self, **kwargs):
+        super().__init__({"fast": MAP_FAST_MODEL, "pro": MAP_PRO_MODEL}, **kwargs)
+        genai.configure(api_key=GEMINI_API_KEY)
+        self._models: dict[str, genai.GenerativeModel] = {}
+
+    def _model(self, name: str) -> genai.GenerativeModel:
+        model = self._models.get(name)
+        if model is None:
+            model = self._models[name] = genai.GenerativeModel(name)
+        return model
+
+    async def _call(self, model_name: str, prompt: str, generation_config: dict) -> tuple[str, int, int]:
+        response = await self._model(model_name).generate_content_async(
+            prompt,
+            generation_config=generation_config,
+            request_options={"timeout": LLM_TIMEOUT},
+        )
+        usage = getattr(response, "usage_metadata", None)
+        return (
+            response.text,
+            getattr(usage, "prompt_token_count", 0) or 0,
+            getattr(usage, "candidates_token_count", 0) or 0,
+        )
+
+
+def _json_schema(schema: dict) -> dict:
+    """Gemini response schema (OpenAPI subset) -> JSON Schema"""
+    kind = schema.get("type", "STRING").lower()
+    converted = {"type": [kind, "null"] if schema.get("nullable") else kind}
+    if "properties" in schema:
+        converted["properties"] = {name: _json_schema(child) for name, child in schema["properties"].items()}
+        converted["required"] = schema.get("required", [])
+        converted["additionalProperties"] = False
+    if "items" in schema:
+        converted["items"] = _json_schema(schema["items"])
+    if "description" in schema:
+        converted["description"] = schema["description"]
+    return converted
+
+
+class OpenAIProvider(LLMProvider):
+    """
+    OpenAI chat completions (or any compatible server via base_url).
+
+    The Gemini response schema is converted to a JSON Schema response
+    format; array answers are wrapped in an object, as the API requires.
+    """
+
+    name = "openai"
+    _rate_limited = (openai.RateLimitError,)
+    _retryable = _rate_limited + (
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+        openai.InternalServerError,
+        asyncio.TimeoutError,
+    )
+
+    def __init__(self, models: dict[str, str] | None = None, api_key: str | None = None, base_url: str | None = None, **kwargs):
+        super().__init__(models or {"fast": OPENAI_FAST_MODEL, "pro": OPENAI_PRO_MODEL}, **kwargs)
+        # Retries are ours (see LLMProvider.generate)
+        self._client = openai.AsyncOpenAI(
+            api_key=api_key or OPENAI_API_KEY,
+            base_url=base_url or OPENAI_BASE_URL,
+            max_retries=0,
+        )
+
+    async def _call(self, model_name: str, prompt: str, generation_config: dict) -> tuple[str, int, int]:
+        options = {}
+        if "temperature" in generation_config:
+            options["temperature"] = generation_config["temperature"]
+        wrapped = False
+        schema = generation_config.get("response_schema")
+        if schema:
+            schema = _json_schema(schema)
+            if schema["type"] == "array":
+                schema = {"type": "object", "properties": {"items": schema}, "required": ["items"], "additionalProperties": False}
+                wrapped = True
+            options["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {"name": "mapping_result", "schema": schema},
+            }
+        elif generation_config.get("response_mime_type") == "application/json":
+            options["response_format"] = {"type": "json_object"}
+
+        response = await self._client.chat.completions.create(
+            model=model_name,
+            messages=[{"role": "user", "content": prompt}],
+            timeout=LLM_TIMEOUT,
+            **options
+        )
+        text = response.choices[0].message.content or ""
+        if wrapped:
+            text = json.dumps(json.loads(text).get("items", []))
+        usage = response.usage
+        return text, getattr(usage, "prompt_tokens", 0) or 0, getattr(usage, "completion_tokens", 0) or 0
+
+
+class LocalProvider(OpenAIProvider):
+    """OpenAI-compatible local server (llama.cpp, vLLM, Ollama or the stand-in)"""
+
+    name = "local"
+
+    def __init__(self, **kwargs):
+        super().__init__(
+            {"fast": LLM_LOCAL_MODEL, "pro": LLM_LOCAL_MODEL},
+            api_key="local",
+            base_url=LLM_LOCAL_URL,
+            rpm=0,
+            tpm=0,
+            **kwargs
+        )
+
+
+_PROVIDERS = {"gemini": GeminiProvider, "openai": OpenAIProvider, "local": LocalProvider}
+
+
+class _Health:
+    """Observed latency and error rate of one provider"""
+
+    def __init__(self, name: str):
+        self.latencies: deque[float] = deque(maxlen=_LATENCY_SAMPLES)
+        self.latency = 0.0
+        self.error_rate = 0.0
+        self.breaker = CircuitBreaker(f"llm:{name}", LLM_PROVIDER_FAILURES, LLM_PROVIDER_COOLDOWN)
+
+    def record(self, seconds: float | None):
+        """A finished call: its latency, or None if it failed"""
+        failed = seconds is None
+        self.error_rate += _EWMA_WEIGHT * (float(failed) - self.error_rate)
+        if failed:
+            self.breaker.record_failure()
+            return
+        self.breaker.record_success()
+        self.latencies.append(seconds)
+        self.latency = seconds if len(self.latencies) == 1 else self.latency + _EWMA_WEIGHT * (seconds - self.latency)
+
+    def available(self) -> bool:
+        breaker = self.breaker
+        return breaker.state != "open" or time.monotonic() - breaker.opened_at >= breaker.open_seconds
+
+    def score(self) -> float:
+        """Lower is better; providers never measured rank last (in configured order)"""
+        if not self.latencies:
+            return float("inf")
+        return self.latency * (1 + 4 * self.error_rate)
+
+    def percentile(self, percent: float) -> float | None:
+        if len(self.latencies) < _MIN_HEDGE_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+class LLMRouter:
+    """
+    Routes each call to the healthiest provider.
+
+    Providers are ranked by observed latency weighted by error rate; one
+    that keeps failing is skipped for LLM_PROVIDER_COOLDOWN seconds. A
+    failed call fails over to the next provider. With LLM_HEDGE a second
+    request goes out once the first has run longer than the provider's
+    p95 latency, and the first answer wins.
+    """
+
+    def __init__(self, names: list[str] = LLM_PROVIDERS, hedge: bool = LLM_HEDGE):
+        unknown = [name for name in names if name not in _PROVIDERS]
+        if unknown:
+            raise ValueError(f"Unknown LLM provider(s): {', '.join(unknown)}")
+        self.providers = [_PROVIDERS[name]() for name in dict.fromkeys(names)]
+        self.hedge = hedge
+        self._health = {provider.name: _Health(provider.name) for provider in self.providers}
+        self._stats = {"calls": 0, "failovers": 0, "hedges": 0, "hedge_wins": 0}
+
+    def _ranked(self) -> list[LLMProvider]:
+        ranked = sorted(
+            enumerate(self.providers),
+            key=lambda item: (self._health[item[1].name].score(), item[0])
+        )
+        available = [provider for _, provider in ranked if self._health[provider.name].available()]
+        # Every provider cooling down: try them anyway rather than fail the job
+        return available or [provider for _, provider in ranked]
+
+    def _hedge_delay(self, provider: LLMProvider) -> float:
+        observed = self._health[provider.name].percentile(LLM_HEDGE_PERCENTILE)
+        return observed if observed is not None else LLM_HEDGE_DELAY_MS / 1000
+
+    async def _attempt(self, provider: LLMProvider, tier: str, prompt: str, generation_config, max_retries):
+        health = self._health[provider.name]
+        try:
+            health.breaker.before_call()
+        except CircuitOpenError:
+            # Half-open probe already running; the router picked it anyway
+            pass
+        started = time.monotonic()
+        try:
+            text = await provider.generate(tier, prompt, generation_config, max_retries)
+        except Exception:
+            health.record(None)
+            raise
+        health.record(time.monotonic() - started)
+        return text
+
+    async def generate(self, tier: str, prompt: str, generation_config: dict | None = None) -> str:
+        """
+        Run a prompt on the best provider's model for the tier ("fast" or "pro").
+
+        Raises:
+            LLMRateLimitError: every provider tried was out of quota
+        """
+        self._stats["calls"] += 1
+        queue = self._ranked()
+        # With somewhere to fail over to, don't sit out long retries on one provider
+        max_retries = 0 if len(queue) > 1 else None
+        pending: dict[asyncio.Task, LLMProvider] = {}
+        errors: list[Exception] = []
+        hedge_task = None
+
+        def launch(provider: LLMProvider) -> asyncio.Task:
+            task = asyncio.create_task(self._attempt(provider, tier, prompt, generation_config, max_retries))
+            pending[task] = provider
+            return task
+
+        primary = queue.pop(0)
+        launch(primary)
+        try:
+            while pending:
+                timeout = self._hedge_delay(primary) if self.hedge and hedge_task is None else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Tail latency: race a second request (next provider, else the same one)
+                    self._stats["hedges"] += 1
+                    provider = queue.pop(0) if queue else primary
+                    logger.info(f"[LLM HEDGE] {primary.name} slower than p{LLM_HEDGE_PERCENTILE:g}, racing {provider.name}")
+                    hedge_task = launch(provider)
+                    continue
+                for task in done:
+                    provider = pending.pop(task)
+                    if task.exception() is None:
+                        if task is hedge_task:
+                            self._stats["hedge_wins"] += 1
+                        return task.result()
+                    errors.append(task.exception())
+                    logger.warning(f"[LLM] {provider.name} failed: {str(task.exception())}")
+                if not pending and queue:
+                    self._stats["failovers"] += 1
+                    primary = queue.pop(0)
+                    launch(primary)
+        finally:
+            for task in pending:
+                task.cancel()
+
+        # Quota errors re-queue the job; anything else fails it
+        for error in errors:
+            if isinstance(error, LLMRateLimitError):
+                raise error
+        raise errors[-1]
+
+    def snapshot(self) -> dict:
+        providers = {}
+        for provider in self.providers:
+            health = self._health[provider.name]
+            providers[provider.name] = {
+                **provider.snapshot(),
+                "avg_latency": round(health.latency, 3),
+                "error_rate": round(health.error_rate, 3),
+                "circuit": health.breaker.state,
+                "hedge_after": round(self._hedge_delay(provider), 3),
+            }
+        return {"hedge": self.hedge, **self._stats, "providers": providers}
+
+
+# Global router shared by every AI call
+llm = LLMRouter()
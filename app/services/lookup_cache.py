@@ -0,0 +1,161 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from app.database import get_db, as_document
+from app.config import LOOKUP_CACHE_CHECK_SECONDS, LOOKUP_CACHE_TTL
+from app.services.response_schema import describe_fields, response_schema
+from app.services.structured_data import leaf_paths
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Cache kinds; each has a generation counter in cache_generations
+STRUCTURE = "structure"
+WEBSITES = "websites"
+
+
+@dataclass(frozen=True)
+class ActiveStructure:
+    """The active EventStructure, parsed and compiled once per version (read-only)"""
+    id: str
+    version: int
+    structure: dict
+    paths: list
+    loaded_at: float
+
+
+_structure: ActiveStructure | None = None
+_websites: dict[str, tuple[object, float]] = {}
+_generations: dict[str, int] = {}
+_checked_at = 0.0
+_synced = False
+# Bumped on every invalidation so a load that raced one is not kept
+_epochs = {STRUCTURE: 0, WEBSITES: 0}
+_locks = {STRUCTURE: asyncio.Lock(), WEBSITES: asyncio.Lock()}
+
+# Counters for this process (see /api/crawl/stats)
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+
+def _clear(kind: str):
+    global _structure
+    if kind == STRUCTURE:
+        _structure = None
+    elif kind == WEBSITES:
+        _websites.clear()
+    if kind in _epochs:
+        _epochs[kind] += 1
+    _stats["invalidations"] += 1
+
+
+async def _sync():
+    """Drop entries another process invalidated (checked every LOOKUP_CACHE_CHECK_SECONDS)"""
+    global _checked_at, _synced
+    now = time.monotonic()
+    if now - _checked_at < LOOKUP_CACHE_CHECK_SECONDS:
+        return
+    _checked_at = now
+    db = get_db()
+    try:
+        rows = await db.cachegeneration.find_many()
+    except Exception as e:
+        # Fall back on the TTL until the check works again
+        logger.warning(f"Lookup cache generation check failed: {str(e)}")
+        return
+    for row in rows:
+        # The first check only records the generations (nothing is cached yet)
+        if _synced and _generations.get(row.name) != row.generation:
+            logger.info(f"[LOOKUP CACHE] {row.name} changed elsewhere, reloading")
+            _clear(row.name)
+        _generations[row.name] = row.generation
+    _synced = True
+
+
+def _fresh(loaded_at: float) -> bool:
+    return time.monotonic() - loaded_at < LOOKUP_CACHE_TTL
+
+
+async def get_active_structure() -> ActiveStructure | None:
+    """The active event structure (None if there is none)"""
+    await _sync()
+    if _structure and _fresh(_structure.loaded_at):
+        _stats["hits"] += 1
+        return _structure
+
+    async with _locks[STRUCTURE]:
+        # Another job may have loaded it while this one waited
+        if _structure and _fresh(_structure.loaded_at):
+            _stats["hits"] += 1
+            return _structure
+        _stats["misses"] += 1
+        epoch = _epochs[STRUCTURE]
+        db = get_db()
+        record = await db.eventstructure.find_first(where={"isActive": True})
+        if not record:
+            return None
+        return _compile_structure(record, keep=epoch == _epochs[STRUCTURE])
+
+
+def _compile_structure(record, keep: bool) -> ActiveStructure:
+    global _structure
+    structure = as_document(record.structure)
+    # Warm the compiled response schema and prompt field list for this
+    # version (both lru-cached in app.services.response_schema)
+    response_schema(structure)
+    describe_fields(structure)
+    active = ActiveStructure(
+        id=record.id,
+        version=record.version,
+        structure=structure,
+        paths=leaf_paths(structure),
+        loaded_at=time.monotonic(),
+    )
+    if keep:
+        _structure = active
+    return active
+
+
+async def get_website(website_id: str):
+    """A TargetWebsite record (None if it does not exist; misses are not cached)"""
+    await _sync()
+    cached = _websites.get(website_id)
+    if cached and _fresh(cached[1]):
+        _stats["hits"] += 1
+        return cached[0]
+
+    _stats["misses"] += 1
+    epoch = _epochs[WEBSITES]
+    db = get_db()
+    website = await db.targetwebsite.find_unique(where={"id": website_id})
+    if website and epoch == _epochs[WEBSITES]:
+        _websites[website_id] = (website, time.monotonic())
+    return website
+
+
+async def invalidate(kind: str):
+    """Drop cached lookups here and tell every other process to drop theirs"""
+    _clear(kind)
+    db = get_db()
+    try:
+        row = await db.cachegeneration.upsert(
+            where={"name": kind},
+            data={
+                "create": {"name": kind, "generation": 1},
+                "update": {"generation": {"increment": 1}},
+            }
+        )
+        _generations[kind] = row.generation
+    except Exception as e:
+        # Other processes pick the change up after LOOKUP_CACHE_TTL
+        logger.warning(f"Could not publish {kind} cache invalidation: {str(e)}")
+
+
+def lookup_stats() -> dict:
+    lookups = _stats["hits"] + _stats["misses"]
+    return {
+        **_stats,
+        "hit_rate": round(_stats["hits"] / lookups * 100, 2) if lookups else 0.0,
+        "structure_version": _structure.version if _structure else None,
+        "websites": len(_websites),
+    }
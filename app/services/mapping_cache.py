@@ -0,0 +1,115 @@
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
+from app.database import get_db
+from app.config import MAP_CACHE_TTL_HOURS, MAP_CACHE_MAX_ENTRIES
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Expired and surplus entries are pruned after this many stores
+_PRUNE_EVERY = 200
+
+# Counters for this process (see /api/crawl/stats)
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evicted": 0}
+
+
+def cache_key(content: str, structure_version: int, notes: str | None) -> str:
+    """Hash of everything a mapping result depends on"""
+    digest = hashlib.sha256()
+    for part in (content, str(structure_version), notes or ""):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+async def get_cached(key: str) -> dict | None:
+    """
+    Look up a mapping result.
+
+    Returns:
+        {"result": {...}, "extraction": "...", "modelTier": "..."} or None on a miss
+    """
+    db = get_db()
+    try:
+        entry = await db.mappingcache.find_unique(where={"key": key})
+        # Prisma returns timezone-aware datetimes
+        if entry is None or entry.expiresAt < datetime.now(timezone.utc):
+            _stats["misses"] += 1
+            return None
+        await db.mappingcache.update(
+            where={"key": key},
+            data={"hits": {"increment": 1}, "lastUsedAt": datetime.utcnow()}
+        )
+    except Exception as e:
+        # The cache is an optimisation; a failing lookup is a miss
+        logger.warning(f"Mapping cache lookup failed: {str(e)}")
+        _stats["misses"] += 1
+        return None
+
+    _stats["hits"] += 1
+    return {"result": json.loads(entry.result), "extraction": entry.extraction, "modelTier": entry.modelTier}
+
+
+async def store_cached(
+    key: str,
+    structure_version: int,
+    result: dict,
+    extraction: str | None,
+    model_tier: str | None = None,
+):
+    """Store a mapping result for MAP_CACHE_TTL_HOURS"""
+    db = get_db()
+    now = datetime.utcnow()
+    data = {
+        "structureVersion": structure_version,
+        "result": json.dumps(result),
+        "extraction": extraction,
+        "modelTier": model_tier,
+        "lastUsedAt": now,
+        "expiresAt": now + timedelta(hours=MAP_CACHE_TTL_HOURS),
+    }
+    try:
+        await db.mappingcache.upsert(
+            where={"key": key},
+            data={
+                "create": {"key": key, **data},
+                "update": data,
+            }
+        )
+    except Exception as e:
+        logger.warning(f"Could not store mapping result: {str(e)}")
+        return
+
+    _stats["stores"] += 1
+    if _stats["stores"] % _PRUNE_EVERY == 0:
+        await prune_cache()
+
+
+async def prune_cache():
+    """Drop expired entries, then the least recently used beyond MAP_CACHE_MAX_ENTRIES"""
+    db = get_db()
+    try:
+        evicted = await db.mappingcache.delete_many(where={"expiresAt": {"lt": datetime.utcnow()}})
+        surplus = await db.mappingcache.count() - MAP_CACHE_MAX_ENTRIES
+        if surplus > 0:
+            oldest = await db.mappingcache.find_many(order={"lastUsedAt": "asc"}, take=surplus)
+            evicted += await db.mappingcache.delete_many(
+                where={"id": {"in": [entry.id for entry in oldest]}}
+            )
+    except Exception as e:
+        logger.warning(f"Mapping cache pruning failed: {str(e)}")
+        return
+
+    _stats["evicted"] += evicted
+    if evicted:
+        logger.info(f"[CACHE] Evicted {evicted} mapping results")
+
+
+def cache_stats() -> dict:
+    lookups = _stats["hits"] + _stats["misses"]
+    return {
+        **_stats,
+        "hit_rate": round(_stats["hits"] / lookups * 100, 2) if lookups else 0.0,
+    }
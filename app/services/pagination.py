@@ -0,0 +1,69 @@
+import base64
+import json
+from datetime import datetime
+from bson import ObjectId
+
+# Listings are newest first: createdAt desc, id desc (id breaks ties). The
+# cursor is the sort key of the last row served, so the next page is an index
+# range scan from there however deep it is (no skip).
+ORDER = [{"createdAt": "desc"}, {"id": "desc"}]
+
+# Response header carrying the cursor of the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(created_at: datetime, record_id: str) -> str:
+    raw = json.dumps([created_at.isoformat(), record_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    """
+    Raises:
+        ValueError: The cursor was not produced by encode_cursor()
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, record_id = json.loads(raw)
+        moment = datetime.fromisoformat(created_at)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not ObjectId.is_valid(record_id):
+        raise ValueError("Invalid cursor")
+    return moment, record_id
+
+
+def after_cursor(cursor: str) -> dict:
+    """Prisma where clause for the rows after the cursor"""
+    created_at, record_id = decode_cursor(cursor)
+    return {
+        "OR": [
+            {"createdAt": {"lt": created_at}},
+            {"createdAt": created_at, "id": {"lt": record_id}},
+        ]
+    }
+
+
+def after_cursor_mongo(cursor: str) -> dict:
+    """MongoDB filter for the rows after the cursor"""
+    created_at, record_id = decode_cursor(cursor)
+    return {
+        "$or": [
+            {"createdAt": {"$lt": created_at}},
+            {"createdAt": created_at, "_id": {"$lt": ObjectId(record_id)}},
+        ]
+    }
+
+
+def paginate(rows: list, limit: int) -> tuple[list, str | None]:
+    """
+    Split rows fetched with take=limit + 1 into the page and the cursor of
+    the next page (None on the last page).
+    """
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    last = page[-1]
+    if isinstance(last, dict):
+        return page, encode_cursor(last["createdAt"], last["id"])
+    return page, encode_cursor(last.createdAt, last.id)
@@ -0,0 +1,537 @@
+import asyncio
+import json
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Awaitable, Callable
+from prisma.fields import Json
+from app.database import get_db
+from app.config import (
+    PIPELINE_CLEAN_WORKERS,
+    PIPELINE_MAP_WORKERS,
+    PIPELINE_PERSIST_WORKERS,
+    PIPELINE_QUEUE_SIZE,
+    SCHEDULER_DRAIN_TIMEOUT,
+    USE_STRUCTURED_DATA,
+    USE_SITE_TEMPLATES,
+    USE_MAP_CACHE,
+    MAP_CHUNKING,
+    PROFILE_HTTP_REPROBE_EVERY,
+)
+from app.services.crawler import fetch_page
+from app.services.ai_mapper import map_batcher
+from app.services.content import reduce_page, chunk_page
+from app.services.listing import map_listing
+from app.services.structured_data import extract_structured, sub_structure, merge_results
+from app.services.mapping_cache import cache_key, get_cached, store_cached
+from app.services.lookup_cache import get_active_structure, get_website
+from app.services.blob_store import put_html
+from app.services.site_templates import (
+    get_template,
+    due_for_audit,
+    apply_template,
+    template_fields,
+    forget_fields,
+    learn_fields,
+    record_template,
+)
+from app.services.confidence import calculate_overall
+from app.services.leases import claim_job, requeue_job, renew_lease, update_leased, LeaseLostError
+from app.services.llm_client import LLMRateLimitError
+from app.services.readiness import parse_readiness
+from app.services.challenge import classify_challenge, challenge_detected
+from app.services.retry import classify_error
+from app.services.crawl_profiles import get_profile, crawl_overrides, record_outcome
+from app.services.scheduler import CrawlTask, scheduler
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class JobNotClaimed(Exception):
+    """Raised when another worker already owns the job"""
+
+
+@dataclass
+class CrawlContext:
+    """State carried through the pipeline stages for one job"""
+    task: CrawlTask
+    website: object = None
+    event_structure: dict | None = None  # shared by every job of this version: read-only
+    structure_version: int | None = None
+    structure_paths: list = field(default_factory=list)
+    raw_html: str = ""
+    fetch_tier: str | None = None
+    ready_reason: str | None = None
+    ready_ms: int | None = None
+    traffic: dict = field(default_factory=dict)
+    attempts: list = field(default_factory=list)
+    page: dict = field(default_factory=dict)
+    content: str = ""
+    content_stats: dict | None = None
+    chunks: list = field(default_factory=list)
+    content_hash: str | None = None
+    cache_hit: bool = False
+    ai_result: dict | None = None
+    events: list = field(default_factory=list)
+    extraction: str | None = None
+    model_tier: str | None = None
+    timings: dict = field(default_factory=dict)
+
+
+# ---------------------------------------------------------------------------
+# Stages
+# ---------------------------------------------------------------------------
+
+async def fetch_stage(ctx: CrawlContext):
+    """Claim the job, load its website and structure, and crawl the page"""
+    task = ctx.task
+
+    # Take the job lease (pending -> processing) unless a feeder already did
+    if not task.claimed and not await claim_job(task.job_id):
+        raise JobNotClaimed(task.job_id)
+
+    # Get website info (cached per process)
+    ctx.website = await get_website(task.website_id)
+    if not ctx.website:
+        raise Exception("Website not found")
+
+    # Get active structure (parsed once per version)
+    structure = await get_active_structure()
+    if not structure:
+        raise Exception("No active event structure found")
+    ctx.event_structure = structure.structure
+    ctx.structure_version = structure.version
+    ctx.structure_paths = structure.paths
+
+    # Crawl the page with the settings learned for this website
+    profile = await get_profile(task.website_id)
+    tier = profile.fetchTier if profile else None
+    if tier == "browser" and PROFILE_HTTP_REPROBE_EVERY and profile.samples % PROFILE_HTTP_REPROBE_EVERY == 0:
+        # Sites change: check now and then whether plain HTTP works again
+        tier = None
+    try:
+        ctx.raw_html, ctx.fetch_tier = await fetch_page(
+            task.url,
+            task.use_javascript,
+            tier,
+            crawl_overrides(profile),
+            traffic=ctx.traffic,
+            history=ctx.attempts,
+            page=ctx.page
+        )
+    except Exception:
+        await record_outcome(task.website_id, profile, success=False)
+        raise
+
+    # How long the browser waited for the page to become ready
+    ctx.ready_reason, ctx.ready_ms, selector = parse_readiness(ctx.raw_html)
+    await record_outcome(
+        task.website_id,
+        profile,
+        success=True,
+        # A forced browser crawl, or a browser fallback after an HTTP error,
+        # says nothing about whether the site needs one
+        tier=None if task.use_javascript or ctx.page.get("escalation") == "http_error" else ctx.fetch_tier,
+        ready_reason=ctx.ready_reason,
+        ready_ms=ctx.ready_ms,
+        selector=selector
+    )
+
+
+async def clean_stage(ctx: CrawlContext):
+    """Validate the crawled page, reduce it for the prompt and snapshot the raw HTML"""
+    db = get_db()
+    raw_html = ctx.raw_html
+
+    # Validate we got the right content (one pass over the start of the page)
+    kind = classify_challenge(url=ctx.task.url, html=raw_html)
+    if kind:
+        raise challenge_detected(kind, ctx.task.url)
+
+    # Main content and structured data within the prompt token budget
+    ctx.content, ctx.content_stats = reduce_page(raw_html, ctx.page.get("markdown"))
+
+    # Pages over the budget or listing several events are mapped in chunks
+    if MAP_CHUNKING and (ctx.content_stats["truncated"] or ctx.content_stats["jsonLdEvents"] > 1):
+        chunks, chunk_stats = chunk_page(raw_html, ctx.page.get("markdown"))
+        if len(chunks) > 1 or ctx.content_stats["jsonLdEvents"] > 1:
+            ctx.chunks = chunks
+            ctx.content_stats.update(chunk_stats)
+
+    # Full page snapshot goes to the blob store; the job keeps a reference
+    snapshot = await put_html(raw_html)
+    leased = await update_leased(
+        ctx.task.job_id,
+        {
+            "htmlHash": snapshot["hash"] if snapshot else None,
+            "htmlSize": snapshot["size"] if snapshot else None,
+            "htmlStoredSize": snapshot["storedSize"] if snapshot else None,
+            "fetchTier": ctx.fetch_tier,
+            "readyReason": ctx.ready_reason,
+            "readyWaitMs": ctx.ready_ms,
+            "trafficStats": json.dumps(ctx.traffic) if ctx.traffic else None,
+            # Attempts that failed before the one that worked
+            "attemptHistory": json.dumps(ctx.attempts) if ctx.attempts else None,
+            "contentStats": json.dumps(ctx.content_stats)
+        }
+    )
+    if not leased:
+        raise LeaseLostError(ctx.task.job_id)
+
+
+async def map_stage(ctx: CrawlContext):
+    """
+    Map the page onto the active structure: embedded structured data
+    first, then the website's selector template, then AI for what is left.
+    Chunked pages (long or listing pages) are mapped chunk by chunk into
+    several events instead.
+    """
+    task = ctx.task
+
+    # Unchanged content mapped before onto the same structure with the same notes
+    if USE_MAP_CACHE:
+        content = "\0".join(ctx.chunks) if ctx.chunks else ctx.content
+        ctx.content_hash = cache_key(content, ctx.structure_version, ctx.website.notes)
+        cached = await get_cached(ctx.content_hash)
+        if cached:
+            if "events" in cached["result"]:
+                ctx.events = cached["result"]["events"]
+            else:
+                ctx.ai_result = cached["result"]
+            ctx.extraction, ctx.model_tier = "cache", cached["modelTier"]
+            ctx.cache_hit = True
+            return
+
+    if ctx.chunks:
+        events = await map_listing(ctx.chunks, ctx.event_structure, ctx.website.notes or "")
+        if events:
+            tiers = {event.pop("tier", None) for event in events}
+            ctx.model_tier = "pro" if "pro" in tiers else "fast"
+            ctx.events, ctx.extraction = events, "listing"
+            if USE_MAP_CACHE:
+                await store_cached(
+                    ctx.content_hash, ctx.structure_version, {"events": events}, ctx.extraction, ctx.model_tier
+                )
+            return
+        # No event found in any chunk: map the page as a single event
+        logger.info(f"No events in {len(ctx.chunks)} chunks of {task.url}, mapping as one page")
+
+    result = None
+    missing = [path for path, _ in ctx.structure_paths]
+    methods = []
+
+    if USE_STRUCTURED_DATA:
+        structured, missing = extract_structured(ctx.raw_html, ctx.event_structure, task.url)
+        if structured["field_confidences"]:
+            result = structured
+            methods.append("structured")
+
+    template, failed, consulted = None, [], False
+    if USE_SITE_TEMPLATES and missing:
+        template = await get_template(task.website_id, ctx.structure_version)
+        # Audit pages skip the template so the AI re-checks its selectors
+        if template and not due_for_audit(template):
+            templated, still_missing, failed = apply_template(
+                ctx.raw_html, template, ctx.event_structure, missing, task.url
+            )
+            if templated["field_confidences"]:
+                filled = [path for path in missing if path not in still_missing]
+                result = merge_results(result, templated, filled) if result else templated
+                methods.append("template")
+            missing = still_missing
+        consulted = template is not None
+
+    ai_result = None
+    if missing:
+        # Ask the AI for the missing fields only
+        ai_result = await map_batcher.map(
+            ctx.content,
+            sub_structure(ctx.event_structure, missing) if result else ctx.event_structure,
+            ctx.website.notes or "",
+            group=task.website_id
+        )
+        ctx.model_tier = ai_result.pop("tier", None)
+        result = merge_results(result, ai_result, missing) if result else ai_result
+        methods.append("ai")
+
+    if USE_SITE_TEMPLATES and (ai_result or consulted):
+        fields = template_fields(template)
+        forget_fields(fields, failed)
+        if ai_result:
+            learn_fields(fields, ctx.raw_html, ctx.event_structure, ai_result, missing, task.url)
+        await record_template(
+            task.website_id,
+            ctx.structure_version,
+            fields,
+            hit=consulted,
+            failed=bool(failed)
+        )
+
+    ctx.ai_result = result
+    ctx.extraction = "+".join(methods)
+    if USE_MAP_CACHE:
+        await store_cached(ctx.content_hash, ctx.structure_version, result, ctx.extraction, ctx.model_tier)
+
+
+async def persist_stage(ctx: CrawlContext):
+    """Save the page's events (unless this page is unchanged) and complete the job"""
+    db = get_db()
+    task = ctx.task
+    results = ctx.events or [ctx.ai_result]
+
+    # An unchanged re-crawl already has its events
+    existing = None
+    if ctx.cache_hit:
+        existing = await db.event.find_first(
+            where={
+                "websiteId": task.website_id,
+                "sourceUrl": task.url,
+                "contentHash": ctx.content_hash
+            }
+        )
+
+    # A stalled worker whose job was re-queued must not add events; holding
+    # a fresh lease here leaves a full lease period for the writes below
+    if not await renew_lease(task.job_id):
+        raise LeaseLostError(task.job_id)
+
+    # Save events (one per event found on the page)
+    if existing is None:
+        await db.event.create_many(
+            data=[
+                {
+                    "crawlJobId": task.job_id,
+                    "websiteId": task.website_id,
+                    "eventData": Json(result["event_data"]),
+                    "overallConfidence": calculate_overall(result["field_confidences"]),
+                    "fieldConfidences": Json(result["field_confidences"]),
+                    "aiNotes": result["notes"],
+                    "extractionMethod": ctx.extraction,
+                    "modelTier": ctx.model_tier,
+                    "contentHash": ctx.content_hash,
+                    "sourceUrl": task.url
+                }
+                for result in results
+            ]
+        )
+
+    # Mark job as completed
+    completed = await update_leased(
+        task.job_id,
+        {
+            "status": "completed",
+            "mappingCache": ("hit" if ctx.cache_hit else "miss") if ctx.content_hash else None,
+            "unchanged": existing is not None,
+            "eventCount": 0 if existing is not None else len(results),
+            "completedAt": datetime.utcnow(),
+            "leaseOwner": None,
+            "leaseExpiresAt": None
+        }
+    )
+    if not completed:
+        raise LeaseLostError(task.job_id)
+
+
+async def fail_job(job_id: str, error: Exception, history: list | None = None):
+    """Mark job as failed with its error class and attempt history, and release its lease"""
+    failed = await update_leased(
+        job_id,
+        {
+            "status": "failed",
+            "error": str(error),
+            "errorClass": classify_error(error)[0],
+            "attemptHistory": json.dumps(history) if history else None,
+            "completedAt": datetime.utcnow(),
+            "leaseOwner": None,
+            "leaseExpiresAt": None
+        }
+    )
+    if not failed:
+        logger.warning(f"Job {job_id} lease was lost, its failure is not recorded")
+
+
+async def _requeue(job_id: str) -> bool:
+    """Re-queue a job; False if it is out of attempts or the update failed"""
+    try:
+        return await requeue_job(job_id)
+    except Exception as e:
+        logger.error(f"Could not re-queue job {job_id}: {str(e)}")
+        return False
+
+
+# ---------------------------------------------------------------------------
+# Stage runner
+# ---------------------------------------------------------------------------
+
+class Stage:
+    """
+    One pipeline stage: a handler, a bounded input queue and its own workers.
+
+    A stage created with queue_size=0 has no queue or workers of its own and
+    is driven by the caller through run() (the fetch stage, fed by the
+    scheduler).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        handler: Callable[[CrawlContext], Awaitable[None]],
+        workers: int = 1,
+        queue_size: int = 0,
+    ):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self.next: "Stage | None" = None
+        self.busy = 0
+        self._queue: asyncio.Queue | None = None
+        self._tasks: list[asyncio.Task] = []
+        self.stats = {"processed": 0, "failed": 0, "requeued": 0, "discarded": 0, "seconds": 0.0}
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def start(self):
+        if self._tasks or not self.queue_size:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def put(self, ctx: CrawlContext):
+        """Enqueue a job, waiting while the stage is full (backpressure)"""
+        await self._queue.put(ctx)
+
+    async def run(self, ctx: CrawlContext) -> bool:
+        """Run the handler on one job; failures are recorded on the job"""
+        started = time.monotonic()
+        try:
+            await self.handler(ctx)
+            return True
+        except JobNotClaimed:
+            return False
+        except LeaseLostError:
+            # The job was re-queued while this worker stalled; its new owner reports it
+            self.stats["discarded"] += 1
+            logger.warning(f"[{self.name}] Job {ctx.task.job_id} lease expired, result discarded")
+            return False
+        except LLMRateLimitError as e:
+            # Out of AI quota: try the job again later instead of failing it
+            if await _requeue(ctx.task.job_id):
+                self.stats["requeued"] += 1
+                logger.warning(f"[{self.name}] Job {ctx.task.job_id} re-queued: {str(e)}")
+                return False
+            await self._fail(ctx, e)
+            return False
+        except Exception as e:
+            await self._fail(ctx, e)
+            return False
+        finally:
+            elapsed = time.monotonic() - started
+            ctx.timings[self.name] = round(elapsed, 3)
+            self.stats["processed"] += 1
+            self.stats["seconds"] += elapsed
+
+    async def _fail(self, ctx: CrawlContext, e: Exception):
+        self.stats["failed"] += 1
+        logger.error(f"[{self.name}] Job {ctx.task.job_id} failed: {str(e)}")
+        try:
+            await fail_job(ctx.task.job_id, e, ctx.attempts)
+        except Exception as db_error:
+            logger.error(f"[{self.name}] Could not mark job {ctx.task.job_id} failed: {str(db_error)}")
+
+    async def forward(self, ctx: CrawlContext):
+        """Hand a finished job to the next stage"""
+        if self.next is not None:
+            await self.next.put(ctx)
+
+    async def _worker(self):
+        while True:
+            ctx = await self._queue.get()
+            self.busy += 1
+            try:
+                if await self.run(ctx):
+                    await self.forward(ctx)
+            finally:
+                self.busy -= 1
+                self._queue.task_done()
+
+    async def drain(self, timeout: float):
+        """Wait for queued jobs to pass through, then stop workers"""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"[{self.name}] Drain timed out with {self.depth} jobs queued")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def snapshot(self) -> dict:
+        processed = self.stats["processed"]
+        return {
+            "workers": self.workers,
+            "queue_depth": self.depth,
+            "queue_size": self.queue_size,
+            "busy": self.busy,
+            "processed": processed,
+            "failed": self.stats["failed"],
+            "requeued": self.stats["requeued"],
+            "discarded": self.stats["discarded"],
+            "avg_seconds": round(self.stats["seconds"] / processed, 3) if processed else 0.0,
+        }
+
+
+class CrawlPipeline:
+    """
+    fetch -> clean -> map -> persist, joined by bounded queues.
+
+    The fetch stage runs on the scheduler's workers (browser slots); the
+    other stages have their own worker pools, so slow AI mapping never
+    holds a browser slot.
+    """
+
+    def __init__(self):
+        self.fetch = Stage("fetch", fetch_stage)
+        self.clean = Stage("clean", clean_stage, PIPELINE_CLEAN_WORKERS, PIPELINE_QUEUE_SIZE)
+        self.map = Stage("map", map_stage, PIPELINE_MAP_WORKERS, PIPELINE_QUEUE_SIZE)
+        self.persist = Stage("persist", persist_stage, PIPELINE_PERSIST_WORKERS, PIPELINE_QUEUE_SIZE)
+        self.fetch.next = self.clean
+        self.clean.next = self.map
+        self.map.next = self.persist
+        self.stages = [self.fetch, self.clean, self.map, self.persist]
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+
+    async def handle(self, task: CrawlTask):
+        """Scheduler handler: fetch, then queue for the downstream stages"""
+        ctx = CrawlContext(task)
+        if await self.fetch.run(ctx):
+            await self.fetch.forward(ctx)
+
+    async def stop(self, timeout: float = SCHEDULER_DRAIN_TIMEOUT):
+        """Drain downstream stages in order (stop the scheduler first)"""
+        for stage in self.stages:
+            await stage.drain(timeout)
+
+    def snapshot(self) -> dict:
+        stats = {stage.name: stage.snapshot() for stage in self.stages}
+        # Fetch is fed and staffed by the scheduler
+        stats["fetch"].update({
+            "workers": scheduler.concurrency,
+            "queue_depth": scheduler.pending,
+            "queue_size": scheduler.queue_size,
+            "busy": scheduler.running,
+        })
+        return stats
+
+
+# Global pipeline instance, started and drained with the workers
+pipeline = CrawlPipeline()
@@ -0,0 +1,100 @@
+import json
+import re
+from urllib.parse import unquote
+from app.config import READY_QUIET_MS, READY_MAX_WAIT_MS
+from app.services.challenge import CHALLENGE_DOM_CHECK
+
+# Selectors that indicate event content has rendered, most specific first
+CONTENT_SELECTORS = [".event", "[class*='event']", "article", "[role='main']", "main"]
+CONTENT_SELECTOR = ", ".join(CONTENT_SELECTORS)
+
+# Installed before any page script runs: tracks DOM mutations and
+# in-flight fetch/XHR requests on window.__crawlProbe
+PROBE_SCRIPT = """
+(() => {
+  if (window.__crawlProbe) return;
+  const probe = window.__crawlProbe = { lastMutation: performance.now(), inflight: 0 };
+  new MutationObserver(() => { probe.lastMutation = performance.now(); })
+    .observe(document, { childList: true, subtree: true, characterData: true });
+
+  const done = () => { probe.inflight = Math.max(0, probe.inflight - 1); };
+  if (window.fetch) {
+    const originalFetch = window.fetch;
+    window.fetch = function (...args) {
+      probe.inflight++;
+      return originalFetch.apply(this, args).finally(done);
+    };
+  }
+  const originalSend = XMLHttpRequest.prototype.send;
+  XMLHttpRequest.prototype.send = function (...args) {
+    probe.inflight++;
+    this.addEventListener("loadend", done, { once: true });
+    return originalSend.apply(this, args);
+  };
+})();
+"""
+
+# Markers written onto <html> when the wait ends:
+# data-crawl-ready="reason:ms" and data-crawl-selector="<url-encoded selector>"
+_READY_ATTR = re.compile(r'data-crawl-ready="([a-z_]+):(\d+)"')
+_SELECTOR_ATTR = re.compile(r'data-crawl-selector="([^"]*)"')
+
+
+def build_wait_condition(
+    selectors: list[str] = CONTENT_SELECTORS,
+    quiet_ms: int = READY_QUIET_MS,
+    max_wait_ms: int = READY_MAX_WAIT_MS,
+) -> str:
+    """
+    Crawl4AI `wait_for` JS condition that passes as soon as the page is ready.
+
+    Ready means no in-flight requests and no DOM mutations for `quiet_ms`
+    with one of the content selectors present, or four times as long
+    without one. It always passes after `max_wait_ms`, so a busy page never
+    times out. A challenge page ends the wait at once. The first selector
+    that matched is recorded too.
+    """
+    return f"""js:() => {{
+  const now = performance.now();
+  const probe = window.__crawlProbe;
+  const matched = {json.dumps(selectors)}.find((s) => document.querySelector(s));
+  let reason = null;
+  if ({CHALLENGE_DOM_CHECK}) {{
+    reason = "challenge";
+  }} else if (now >= {max_wait_ms}) {{
+    reason = "timeout";
+  }} else if (probe && probe.inflight === 0) {{
+    const quiet = now - probe.lastMutation;
+    if (quiet >= {quiet_ms} && matched) {{
+      reason = "stable";
+    }} else if (quiet >= {quiet_ms * 4}) {{
+      reason = "stable_no_selector";
+    }}
+  }}
+  if (!reason) return false;
+  const root = document.documentElement;
+  root.setAttribute("data-crawl-ready", reason + ":" + Math.round(now));
+  if (matched) root.setAttribute("data-crawl-selector", encodeURIComponent(matched));
+  return true;
+}}"""
+
+
+async def install_probe(page, context=None, **kwargs):
+    """Crawl4AI on_page_context_created hook: add the probe to every new page"""
+    await page.add_init_script(PROBE_SCRIPT)
+    return page
+
+
+def parse_readiness(html: str) -> tuple[str | None, int | None, str | None]:
+    """
+    Read the ready markers back out of crawled HTML.
+
+    Returns:
+        (reason, waited_ms, matched_selector) - all None if the page was not probed
+    """
+    head = html[:5000]
+    match = _READY_ATTR.search(head)
+    if not match:
+        return None, None, None
+    selector = _SELECTOR_ATTR.search(head)
+    return match.group(1), int(match.group(2)), unquote(selector.group(1)) if selector else None
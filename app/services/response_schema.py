@@ -0,0 +1,205 @@
+import json
+from datetime import datetime
+from functools import lru_cache
+from app.services.structured_data import empty_event, get_path, leaf_paths
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Structure field types -> Gemini schema types
+_TYPES = {
+    "string": "STRING",
+    "text": "STRING",
+    "url": "STRING",
+    "datetime": "STRING",
+    "date": "STRING",
+    "time": "STRING",
+    "number": "NUMBER",
+    "float": "NUMBER",
+    "int": "INTEGER",
+    "integer": "INTEGER",
+    "boolean": "BOOLEAN",
+    "bool": "BOOLEAN",
+    "array": "ARRAY",
+    "list": "ARRAY",
+}
+_DATE_TYPES = {"datetime", "date", "time"}
+# Confidence kept for a value that does not match its type
+_MISMATCH_CONFIDENCE = 40
+
+
+def _kind(field_type) -> str:
+    if isinstance(field_type, list):
+        return "array"
+    return field_type.lower() if isinstance(field_type, str) else "string"
+
+
+def _field_schema(field_type) -> dict:
+    """Schema for one structure field (objects recurse)"""
+    if isinstance(field_type, dict) and field_type:
+        return {
+            "type": "OBJECT",
+            "properties": {name: _field_schema(child) for name, child in field_type.items()},
+            "required": list(field_type),
+            "nullable": True,
+        }
+    kind = _kind(field_type)
+    schema = {"type": _TYPES.get(kind, "STRING"), "nullable": True}
+    if schema["type"] == "ARRAY":
+        item = field_type[0] if isinstance(field_type, list) and field_type else "string"
+        schema["items"] = _field_schema(item)
+    if kind in _DATE_TYPES:
+        schema["description"] = f"ISO 8601 {kind}"
+    return schema
+
+
+def _result_schema(event_structure: dict) -> dict:
+    paths = [path for path, _ in leaf_paths(event_structure)]
+    return {
+        "type": "OBJECT",
+        "properties": {
+            "event_data": {
+                "type": "OBJECT",
+                "properties": {name: _field_schema(t) for name, t in event_structure.items()},
+                "required": list(event_structure),
+            },
+            "field_confidences": {
+                "type": "OBJECT",
+                "properties": {path: {"type": "INTEGER"} for path in paths},
+                "required": paths,
+            },
+            "notes": {"type": "STRING"},
+        },
+        "required": ["event_data", "field_confidences", "notes"],
+    }
+
+
+@lru_cache(maxsize=256)
+def _compile(structure_json: str, mode: str) -> str:
+    structure = json.loads(structure_json)
+    schema = _result_schema(structure)
+    if mode == "batch":
+        schema["properties"]["page"] = {"type": "INTEGER"}
+        schema["required"] = ["page", *schema["required"]]
+    if mode in ("batch", "listing"):
+        schema = {"type": "ARRAY", "items": schema}
+    return json.dumps(schema)
+
+
+def response_schema(event_structure: dict, mode: str = "single") -> dict:
+    """
+    Response schema for constrained decoding of a mapping result.
+
+    Compiled once per structure (and sub-structure) and mode, and cached.
+    Modes: "single" (one result), "batch" (an array of results, each with
+    its page number) and "listing" (an array of results, one per event).
+    """
+    # A fresh copy each time: the SDK may modify what it is given
+    return json.loads(_compile(json.dumps(event_structure, sort_keys=True), mode))
+
+
+def describe_fields(event_structure: dict) -> str:
+    """Compact field list for the prompt (the schema carries the shape); cached per structure"""
+    return _describe(json.dumps(event_structure))
+
+
+@lru_cache(maxsize=256)
+def _describe(structure_json: str) -> str:
+    lines = []
+    for path, field_type in leaf_paths(json.loads(structure_json)):
+        kind = _kind(field_type)
+        if isinstance(field_type, list) and field_type:
+            kind = f"array of {_kind(field_type[0])}"
+        lines.append(f"- {path}: {kind}{' (ISO 8601)' if kind in _DATE_TYPES else ''}")
+    return "\n".join(lines)
+
+
+def _fits(value, field_type) -> bool:
+    kind = _kind(field_type)
+    expected = _TYPES.get(kind, "STRING")
+    if expected == "NUMBER":
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if expected == "INTEGER":
+        return isinstance(value, int) and not isinstance(value, bool)
+    if expected == "BOOLEAN":
+        return isinstance(value, bool)
+    if expected == "ARRAY":
+        return isinstance(value, list)
+    if not isinstance(value, str):
+        return False
+    if kind in _DATE_TYPES:
+        try:
+            datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return False
+    return True
+
+
+def _convert(value, field_type):
+    """Best-effort repair of a value of the wrong type (None if impossible)"""
+    expected = _TYPES.get(_kind(field_type), "STRING")
+    try:
+        if expected == "NUMBER":
+            return float(value)
+        if expected == "INTEGER":
+            return int(float(value))
+    except (TypeError, ValueError):
+        return None
+    if expected == "STRING" and isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    if expected == "ARRAY" and isinstance(value, str):
+        return [value]
+    return None
+
+
+def validate_result(result, event_structure: dict) -> dict:
+    """
+    Check a mapping result against the structure and repair what it can.
+
+    Missing fields become null, unknown fields are dropped, values of the
+    wrong type are converted or kept with a capped confidence, and every
+    field gets a confidence between 0 and 100.
+
+    Raises:
+        ValueError: the result is not a mapping result at all
+    """
+    if not isinstance(result, dict) or not isinstance(result.get("event_data"), dict):
+        raise ValueError("AI response missing required fields")
+
+    source = result["event_data"]
+    raw_confidences = result.get("field_confidences")
+    raw_confidences = raw_confidences if isinstance(raw_confidences, dict) else {}
+    event_data = empty_event(event_structure)
+    confidences = {}
+    issues = []
+
+    for path, field_type in leaf_paths(event_structure):
+        value = get_path(source, path)
+        try:
+            confidence = int(max(0, min(100, float(raw_confidences.get(path, 0)))))
+        except (TypeError, ValueError):
+            confidence = 0
+
+        if value is not None and not _fits(value, field_type):
+            converted = _convert(value, field_type)
+            if converted is not None:
+                value = converted
+            else:
+                issues.append(path)
+                confidence = min(confidence, _MISMATCH_CONFIDENCE)
+        if value is None:
+            confidence = min(confidence, _MISMATCH_CONFIDENCE)
+
+        node = event_data
+        parts = path.split(".")
+        for part in parts[:-1]:
+            node = node[part]
+        node[parts[-1]] = value
+        confidences[path] = confidence
+
+    notes = result.get("notes") if isinstance(result.get("notes"), str) else ""
+    if issues:
+        logger.info(f"Mapping result had values of the wrong type: {', '.join(issues)}")
+        notes = f"{notes}; type mismatch: {', '.join(issues)}" if notes else f"Type mismatch: {', '.join(issues)}"
+    return {"event_data": event_data, "field_confidences": confidences, "notes": notes}
@@ -0,0 +1,237 @@
+import asyncio
+import random
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, TypeVar
+import httpx
+from app.config import (
+    MAX_RETRIES,
+    RETRY_BASE_DELAY,
+    RETRY_MAX_DELAY,
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_OPEN_SECONDS,
+)
+from app.services.challenge import BotChallengeError, domain_of
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Error classes recorded on CrawlJob.errorClass
+TRANSIENT = "transient"
+PERMANENT = "permanent"
+BLOCKED = "blocked"
+CIRCUIT_OPEN = "circuit_open"
+
+# Failure reasons that say the whole site is unhealthy (count towards the breaker)
+_SITE_DOWN = {"timeout", "connection", "http_5xx", "dns"}
+
+# Browser/network error text -> (class, reason)
+_MESSAGE_PATTERNS = (
+    ("err_name_not_resolved", PERMANENT, "dns"),
+    ("name or service not known", PERMANENT, "dns"),
+    ("nodename nor servname", PERMANENT, "dns"),
+    ("getaddrinfo failed", PERMANENT, "dns"),
+    ("err_cert_", PERMANENT, "tls"),
+    ("certificate verify failed", PERMANENT, "tls"),
+    ("err_invalid_url", PERMANENT, "invalid_url"),
+    ("err_too_many_redirects", PERMANENT, "redirect_loop"),
+    ("timeout", TRANSIENT, "timeout"),
+    ("timed out", TRANSIENT, "timeout"),
+    ("err_connection_", TRANSIENT, "connection"),
+    ("err_empty_response", TRANSIENT, "connection"),
+    ("err_network_changed", TRANSIENT, "connection"),
+    ("connection reset", TRANSIENT, "connection"),
+    ("connection refused", TRANSIENT, "connection"),
+    ("target page, context or browser has been closed", TRANSIENT, "browser"),
+)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a domain whose circuit is open"""
+
+    def __init__(self, domain: str, retry_in: float):
+        self.domain = domain
+        super().__init__(
+            f"Circuit open for {domain}: too many failures, next probe in {int(retry_in)}s"
+        )
+
+
+def classify_error(error: Exception) -> tuple[str, str]:
+    """
+    Classify a fetch error.
+
+    Returns:
+        (error_class, reason) - error_class is transient, permanent,
+        blocked or circuit_open; only transient errors are retried
+    """
+    if isinstance(error, BotChallengeError):
+        return BLOCKED, error.kind
+    if isinstance(error, CircuitOpenError):
+        return CIRCUIT_OPEN, "circuit_open"
+
+    status = getattr(error, "status_code", None)
+    if status:
+        if status in (408, 425) or status >= 500:
+            return TRANSIENT, "http_5xx" if status >= 500 else "timeout"
+        if status == 429:
+            return TRANSIENT, "rate_limited"
+        if status in (404, 410):
+            return PERMANENT, "not_found"
+        if status >= 400:
+            return PERMANENT, "http_4xx"
+
+    if isinstance(error, httpx.TimeoutException):
+        return TRANSIENT, "timeout"
+
+    message = str(error).lower()
+    for pattern, error_class, reason in _MESSAGE_PATTERNS:
+        if pattern in message:
+            return error_class, reason
+
+    # Unknown errors keep the old behaviour: retry them
+    return TRANSIENT, "unknown"
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker for one domain.
+
+    closed: calls go through. open: calls fail fast for `open_seconds`.
+    half_open: a single probe call is let through; its outcome closes or
+    re-opens the circuit.
+    """
+
+    def __init__(self, domain: str, threshold: int = CIRCUIT_FAILURE_THRESHOLD, open_seconds: int = CIRCUIT_OPEN_SECONDS):
+        self.domain = domain
+        self.threshold = max(1, threshold)
+        self.open_seconds = open_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go through now"""
+        if self.state == "open":
+            waited = time.monotonic() - self.opened_at
+            if waited < self.open_seconds:
+                raise CircuitOpenError(self.domain, self.open_seconds - waited)
+            self.state = "half_open"
+            logger.info(f"[CIRCUIT] {self.domain} half-open, probing")
+        if self.state == "half_open":
+            if self.probing:
+                raise CircuitOpenError(self.domain, 0)
+            self.probing = True
+
+    def record_success(self):
+        if self.state != "closed":
+            logger.info(f"[CIRCUIT] {self.domain} closed")
+        self.state = "closed"
+        self.failures = 0
+        self.probing = False
+
+    def record_failure(self):
+        self.probing = False
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.threshold:
+            if self.state != "open":
+                logger.warning(f"[CIRCUIT] {self.domain} open after {self.failures} failures")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        """End a call that says nothing about the site's health (404, block)"""
+        self.probing = False
+
+    def snapshot(self) -> dict:
+        return {"state": self.state, "failures": self.failures}
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def breaker_for(url: str) -> CircuitBreaker:
+    domain = domain_of(url)
+    breaker = _breakers.get(domain)
+    if breaker is None:
+        breaker = _breakers[domain] = CircuitBreaker(domain)
+    return breaker
+
+
+def breakers() -> dict:
+    """Circuit state for every domain that is not healthy"""
+    return {
+        domain: breaker.snapshot()
+        for domain, breaker in _breakers.items()
+        if breaker.state != "closed" or breaker.failures
+    }
+
+
+def _backoff(attempt: int) -> float:
+    """Exponential backoff with jitter"""
+    delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+async def run_with_retries(
+    url: str,
+    attempt_fn: Callable[[], Awaitable[T]],
+    history: list | None = None,
+    max_attempts: int = MAX_RETRIES,
+) -> T:
+    """
+    Run one fetch attempt at a time under the URL's circuit breaker.
+
+    Only transient errors are retried. Every failed attempt is appended to
+    `history` as {"attempt", "errorClass", "reason", "error", "seconds", "at"}.
+    CircuitOpenError is raised only when the circuit is open before the first
+    attempt; if it opens between retries, the last real error is raised.
+    """
+    breaker = breaker_for(url)
+    max_attempts = max(1, max_attempts)
+    last_error: Exception | None = None
+
+    for attempt in range(1, max_attempts + 1):
+        try:
+            breaker.before_call()
+        except CircuitOpenError:
+            if last_error is None:
+                raise
+            logger.error(f"[CIRCUIT] {url} stopped retrying, circuit opened: {str(last_error)}")
+            raise last_error
+        started = time.monotonic()
+        try:
+            result = await attempt_fn()
+        except Exception as e:
+            last_error = e
+            error_class, reason = classify_error(e)
+            if reason in _SITE_DOWN:
+                breaker.record_failure()
+            else:
+                breaker.release()
+            if history is not None:
+                history.append({
+                    "attempt": attempt,
+                    "errorClass": error_class,
+                    "reason": reason,
+                    "error": str(e)[:500],
+                    "seconds": round(time.monotonic() - started, 3),
+                    "at": datetime.utcnow().isoformat(),
+                })
+            if error_class != TRANSIENT or attempt == max_attempts:
+                logger.error(f"[{error_class.upper()}] {url} failed on attempt {attempt}: {str(e)}")
+                raise
+            delay = _backoff(attempt)
+            logger.warning(
+                f"[RETRY {attempt}/{max_attempts}] {url} ({reason}), retrying in {delay:.1f}s: {str(e)}"
+            )
+            await asyncio.sleep(delay)
+            continue
+
+        breaker.record_success()
+        return result
+
+    raise Exception(f"Failed to fetch {url} after {max_attempts} attempts")
@@ -0,0 +1,190 @@
+import asyncio
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+from app.config import (
+    MAX_CONCURRENT_CRAWLS,
+    MAX_CONCURRENT_PER_WEBSITE,
+    CRAWL_QUEUE_SIZE,
+    SCHEDULER_DRAIN_TIMEOUT,
+)
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when the scheduler cannot accept more jobs"""
+
+
+@dataclass
+class CrawlTask:
+    job_id: str
+    website_id: str
+    url: str
+    use_javascript: bool = False
+    claimed: bool = False  # already leased by app.services.leases
+
+
+class CrawlScheduler:
+    """
+    In-process crawl job scheduler.
+
+    A fixed number of workers pull jobs from a bounded queue. At most
+    `per_website` jobs for the same website run at once; extra jobs for a
+    busy website are parked and picked up by the worker that finishes the
+    website's current job, so they never block other websites.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = MAX_CONCURRENT_CRAWLS,
+        per_website: int = MAX_CONCURRENT_PER_WEBSITE,
+        queue_size: int = CRAWL_QUEUE_SIZE,
+    ):
+        self.concurrency = max(1, concurrency)
+        self.per_website = max(1, per_website)
+        self.queue_size = max(1, queue_size)
+        self._handler: Callable[[CrawlTask], Awaitable[None]] | None = None
+        self._queue: asyncio.Queue | None = None
+        self._deferred: dict[str, deque] = {}
+        self._active: dict[str, int] = defaultdict(int)
+        self._load: dict[str, int] = defaultdict(int)  # unfinished jobs per website
+        self._pending = 0  # queued + deferred
+        self._workers: list[asyncio.Task] = []
+        self._accepting = False
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0}
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    @property
+    def running(self) -> int:
+        return sum(self._active.values())
+
+    @property
+    def parked(self) -> int:
+        """Jobs waiting for their website's running jobs to finish"""
+        return sum(len(q) for q in self._deferred.values())
+
+    def website_load(self) -> dict[str, int]:
+        """Unfinished (queued, parked or running) jobs per website"""
+        return dict(self._load)
+
+    def capacity(self) -> int:
+        """Number of jobs that can still be queued"""
+        if not self._accepting:
+            return 0
+        return max(0, self.queue_size - self._pending)
+
+    def start(self, handler: Callable[[CrawlTask], Awaitable[None]]):
+        """Start worker tasks"""
+        if self._accepting:
+            return
+        self._handler = handler
+        self._queue = asyncio.Queue()
+        self._workers = [
+            asyncio.create_task(self._worker(i)) for i in range(self.concurrency)
+        ]
+        self._accepting = True
+        logger.info(
+            f"Crawl scheduler started: {self.concurrency} workers, "
+            f"{self.per_website} per website, queue size {self.queue_size}"
+        )
+
+    def submit(self, task: CrawlTask):
+        """Queue a job, raising QueueFullError when the queue is full"""
+        if not self._accepting:
+            self.stats["rejected"] += 1
+            raise QueueFullError("Crawl scheduler is not accepting jobs")
+        if self._pending >= self.queue_size:
+            self.stats["rejected"] += 1
+            raise QueueFullError(f"Crawl queue is full ({self.queue_size} jobs)")
+        self._pending += 1
+        self._load[task.website_id] += 1
+        self.stats["submitted"] += 1
+        self._queue.put_nowait(task)
+
+    async def stop(self, timeout: float = SCHEDULER_DRAIN_TIMEOUT):
+        """Stop accepting jobs, let queued jobs finish, then stop workers"""
+        if not self._workers:
+            return
+        self._accepting = False
+        logger.info(f"Draining crawl scheduler ({self._pending} queued, {self.running} running)...")
+        try:
+            await asyncio.wait_for(self._drained(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"Scheduler drain timed out; {self._pending} queued jobs left pending, "
+                f"{self.running} running jobs cancelled"
+            )
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _drained(self):
+        while self._pending or self.running:
+            await asyncio.sleep(0.5)
+
+    async def _worker(self, index: int):
+        while True:
+            task = await self._queue.get()
+            website_id = task.website_id
+
+            # Park the job if its website is already at its limit
+            if self._active[website_id] >= self.per_website:
+                self._deferred.setdefault(website_id, deque()).append(task)
+                continue
+
+            while task is not None:
+                self._pending -= 1
+                self._active[website_id] += 1
+                try:
+                    await self._handler(task)
+                    self.stats["completed"] += 1
+                except Exception as e:
+                    self.stats["failed"] += 1
+                    logger.error(f"Scheduler worker {index}: job {task.job_id} raised: {str(e)}")
+                finally:
+                    self._active[website_id] -= 1
+                    if not self._active[website_id]:
+                        del self._active[website_id]
+                    self._load[website_id] -= 1
+                    if not self._load[website_id]:
+                        del self._load[website_id]
+
+                # Take over the next parked job for the same website
+                parked = self._deferred.get(website_id)
+                task = parked.popleft() if parked else None
+                if parked is not None and not parked:
+                    del self._deferred[website_id]
+
+    def snapshot(self) -> dict:
+        """Queue depth, running jobs and lifetime counters"""
+        return {
+            "accepting": self._accepting,
+            "concurrency": self.concurrency,
+            "per_website": self.per_website,
+            "queue_size": self.queue_size,
+            "pending": self._pending,
+            "parked": self.parked,
+            "running": self.running,
+            **self.stats,
+        }
+
+
+# Global scheduler instance, started and drained by the app lifespan
+scheduler = CrawlScheduler()
+
+
+def start_scheduler(handler: Callable[[CrawlTask], Awaitable[None]]):
+    """Start the global crawl scheduler"""
+    scheduler.start(handler)
+
+
+async def stop_scheduler():
+    """Drain and stop the global crawl scheduler"""
+    await scheduler.stop()
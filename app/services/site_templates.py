@@ -0,0 +1,310 @@
+import json
+import re
+from datetime import datetime
+import lxml.html
+from lxml import etree
+from app.database import get_db
+from app.config import (
+    TEMPLATE_MIN_CONFIDENCE,
+    TEMPLATE_CONFIRMATIONS,
+    TEMPLATE_AUDIT_EVERY,
+)
+from app.services.structured_data import coerce_value, empty_event, get_path, leaf_paths
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Attributes that hold values instead of text
+_VALUE_ATTRS = ("content", "datetime", "href", "src", "value")
+_SKIP_TAGS = {"script", "style", "noscript", "template", "head", "html", "body"}
+# Ids/classes that look generated (hashes, numbers) make poor selectors
+_UNSTABLE_NAME = re.compile(r"\d{3,}|[0-9a-f]{8,}|^(css|sc|jsx)-", re.I)
+_SPACES = re.compile(r"\s+")
+
+
+def _norm(value) -> str:
+    return _SPACES.sub(" ", str(value)).strip().casefold()
+
+
+def _parse_page(html: str, page_url: str | None):
+    try:
+        doc = lxml.html.fromstring(html)
+    except (etree.ParserError, ValueError) as e:
+        logger.warning(f"Could not parse page for template: {str(e)}")
+        return None
+    if page_url:
+        doc.make_links_absolute(page_url, resolve_base_href=True)
+    return doc
+
+
+def _read(element, attr: str | None) -> str | None:
+    """Text (or attribute value) of a selected element"""
+    if attr:
+        value = element.get(attr)
+    else:
+        value = element.text_content()
+    value = _SPACES.sub(" ", value or "").strip()
+    return value or None
+
+
+def _same(found: str, expected, field_type) -> bool:
+    if _norm(found) == _norm(expected):
+        return True
+    if isinstance(field_type, str) and field_type.lower() in ("datetime", "date"):
+        try:
+            left = datetime.fromisoformat(found.replace("Z", "+00:00"))
+            right = datetime.fromisoformat(str(expected).replace("Z", "+00:00"))
+        except ValueError:
+            return False
+        return left.replace(tzinfo=None) == right.replace(tzinfo=None)
+    return False
+
+
+def _locate(doc, expected, field_type) -> list[tuple[object, str | None]]:
+    """Elements (and attribute) holding exactly the expected value, innermost first"""
+    matches = []
+    for element in doc.xpath("//*[@content or @datetime or @href or @src or @value]"):
+        for attr in _VALUE_ATTRS:
+            value = element.get(attr)
+            if value and _same(value, expected, field_type):
+                matches.append((element, attr))
+    # Text search runs in XPath; only the candidates are compared in Python
+    needle = _SPACES.sub(" ", str(expected)).strip()
+    for element in doc.xpath("//body//*[contains(normalize-space(.), $needle)]", needle=needle):
+        if element.tag in _SKIP_TAGS:
+            continue
+        text = _read(element, None)
+        if text and _same(text, expected, field_type):
+            matches.append((element, None))
+
+    # Keep the innermost element when a parent has the same text
+    text_matches = {element for element, attr in matches if attr is None}
+    innermost = [
+        (element, attr) for element, attr in matches
+        if attr is not None or not any(child in text_matches for child in element.iterdescendants())
+    ]
+    # Prefer elements that carry their own meaning (itemprop, id, class)
+    return sorted(
+        innermost,
+        key=lambda match: (
+            not match[0].get("itemprop"),
+            not match[0].get("id"),
+            not match[0].get("class"),
+        )
+    )
+
+
+def _stable(name: str | None) -> bool:
+    return bool(name) and '"' not in name and not _UNSTABLE_NAME.search(name)
+
+
+def _own_selectors(element) -> list[str]:
+    """Selectors that identify an element by its own attributes"""
+    tag = element.tag
+    selectors = []
+    for attr in ("itemprop", "property", "name"):
+        if _stable(element.get(attr)):
+            selectors.append(f'//{tag}[@{attr}="{element.get(attr)}"]')
+    if _stable(element.get("id")):
+        selectors.append(f'//*[@id="{element.get("id")}"]')
+    for cls in (element.get("class") or "").split():
+        if _stable(cls):
+            selectors.append(f'//{tag}[contains(concat(" ", normalize-space(@class), " "), " {cls} ")]')
+    return selectors
+
+
+def _relative_path(ancestor, element) -> str:
+    """Positional path from an ancestor down to an element"""
+    steps = []
+    node = element
+    while node is not ancestor:
+        parent = node.getparent()
+        same_tag = [child for child in parent if child.tag == node.tag]
+        index = same_tag.index(node) + 1
+        steps.append(node.tag if len(same_tag) == 1 else f"{node.tag}[{index}]")
+        node = parent
+    return "/".join(reversed(steps))
+
+
+def induce_selector(doc, element) -> str:
+    """
+    Build an XPath that finds `element` on pages of the same template.
+
+    Tries the element's own itemprop/id/class, then the nearest ancestor
+    that has one plus a positional path, then the absolute path.
+    """
+    def first_hit(selector: str) -> bool:
+        try:
+            hits = doc.xpath(selector)
+        except etree.XPathError:
+            return False
+        return bool(hits) and hits[0] is element
+
+    for selector in _own_selectors(element):
+        if first_hit(selector):
+            return selector
+    for ancestor in element.iterancestors():
+        for anchor in _own_selectors(ancestor):
+            selector = f"({anchor})[1]/{_relative_path(ancestor, element)}"
+            if first_hit(selector):
+                return selector
+    return element.getroottree().getpath(element)
+
+
+def _select(doc, rule: dict) -> str | None:
+    try:
+        hits = doc.xpath(rule["selector"])
+    except etree.XPathError:
+        return None
+    return _read(hits[0], rule.get("attr")) if hits else None
+
+
+def template_fields(template) -> dict:
+    """Field rules of a template: path -> {selector, attr, confirmed, confidence}"""
+    return json.loads(template.fields) if template and template.fields else {}
+
+
+def forget_fields(fields: dict, paths: list[str]):
+    """Failed selectors must be re-confirmed before they are used again"""
+    for path in paths:
+        if path in fields:
+            fields[path]["confirmed"] = 0
+
+
+async def get_template(website_id: str, structure_version: int):
+    """Get a website's selector template for the active structure (None if none)"""
+    db = get_db()
+    template = await db.sitetemplate.find_unique(where={"websiteId": website_id})
+    if template and template.structureVersion != structure_version:
+        return None
+    return template
+
+
+def due_for_audit(template) -> bool:
+    """Every TEMPLATE_AUDIT_EVERY-th page is re-checked by the AI"""
+    return TEMPLATE_AUDIT_EVERY > 0 and template.hits > 0 and template.hits % TEMPLATE_AUDIT_EVERY == 0
+
+
+def apply_template(
+    html: str,
+    template,
+    event_structure: dict,
+    paths: list[str],
+    page_url: str | None = None,
+) -> tuple[dict, list[str], list[str]]:
+    """
+    Extract the given fields with a website's confirmed selectors.
+
+    Returns:
+        (result, missing, failed) - result follows the map_to_structure
+        contract; missing are paths still unfilled, failed are the paths
+        whose confirmed selector found nothing usable
+    """
+    result = {"event_data": empty_event(event_structure), "field_confidences": {}, "notes": ""}
+    fields = template_fields(template)
+    doc = _parse_page(html, page_url) if fields else None
+    types = dict(leaf_paths(event_structure))
+    missing, failed = [], []
+
+    for path in paths:
+        rule = fields.get(path)
+        if doc is None or not rule or rule["confirmed"] < TEMPLATE_CONFIRMATIONS:
+            missing.append(path)
+            continue
+        raw = _select(doc, rule)
+        value = coerce_value(raw, types.get(path))[0] if raw else None
+        if value is None or value == []:
+            missing.append(path)
+            failed.append(path)
+            continue
+        node = result["event_data"]
+        parts = path.split(".")
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = value
+        result["field_confidences"][path] = rule["confidence"]
+
+    if result["field_confidences"]:
+        result["notes"] = f"Extracted with the website's selector template ({len(result['field_confidences'])} fields)"
+    return result, missing, failed
+
+
+def learn_fields(
+    fields: dict,
+    html: str,
+    event_structure: dict,
+    ai_result: dict,
+    paths: list[str],
+    page_url: str | None = None,
+) -> dict:
+    """
+    Fold one AI extraction into a template's field rules.
+
+    A selector that reproduces the AI's high-confidence value is confirmed
+    once more; one that does not is re-induced from this page. Fields the
+    AI was unsure about are left alone.
+    """
+    doc = _parse_page(html, page_url)
+    if doc is None:
+        return fields
+    types = dict(leaf_paths(event_structure))
+    confidences = ai_result.get("field_confidences") or {}
+
+    for path in paths:
+        expected = get_path(ai_result.get("event_data") or {}, path)
+        confidence = confidences.get(path) or 0
+        if expected is None or isinstance(expected, (dict, list, bool)) or confidence < TEMPLATE_MIN_CONFIDENCE:
+            continue
+        field_type = types.get(path)
+        rule = fields.get(path)
+        found = _select(doc, rule) if rule else None
+        if found and _same(found, expected, field_type):
+            rule["confirmed"] += 1
+            rule["confidence"] = min(rule["confidence"], confidence)
+            continue
+
+        matches = _locate(doc, expected, field_type)
+        if not matches:
+            fields.pop(path, None)
+            continue
+        element, attr = matches[0]
+        fields[path] = {
+            "selector": induce_selector(doc, element),
+            "attr": attr,
+            "confirmed": 1,
+            "confidence": confidence,
+        }
+    return fields
+
+
+async def record_template(
+    website_id: str,
+    structure_version: int,
+    fields: dict,
+    hit: bool = False,
+    failed: bool = False,
+):
+    """Store learned rules and usage counters for a website's template"""
+    db = get_db()
+    data = {
+        "structureVersion": structure_version,
+        "fields": json.dumps(fields),
+        "activeFields": sum(1 for rule in fields.values() if rule["confirmed"] >= TEMPLATE_CONFIRMATIONS),
+    }
+    try:
+        await db.sitetemplate.upsert(
+            where={"websiteId": website_id},
+            data={
+                "create": {"websiteId": website_id, **data, "hits": int(hit), "failures": int(failed)},
+                # Counters are incremented in place: other workers update them concurrently
+                "update": {
+                    **data,
+                    "hits": {"increment": int(hit)},
+                    "failures": {"increment": int(failed)},
+                },
+            }
+        )
+    except Exception as e:
+        # Templates are an optimisation; never fail a job over them
+        logger.warning(f"Could not update selector template for {website_id}: {str(e)}")
@@ -0,0 +1,446 @@
+import json
+import re
+from datetime import datetime
+from html.parser import HTMLParser
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Confidence of a value by where it came from
+SOURCE_CONFIDENCE = {"json-ld": 95, "microdata": 90, "opengraph": 80, "page": 70}
+# Lost when a value had to be converted or assembled (e.g. price + currency)
+_DERIVED_PENALTY = 5
+
+# Canonical schema.org values -> structure field names that mean the same thing
+# (compared after lowercasing and dropping everything but letters and digits)
+FIELD_ALIASES = {
+    "name": ("title", "name", "eventname", "eventtitle", "headline"),
+    "description": ("description", "summary", "details", "eventdescription", "about"),
+    "startDate": ("startdate", "start", "starttime", "startdatetime", "startsat", "date", "datetime", "eventdate", "when"),
+    "endDate": ("enddate", "end", "endtime", "enddatetime", "endsat"),
+    "doorTime": ("doortime", "doors", "doorsopen"),
+    "venue": ("venue", "venuename", "location", "locationname", "place", "placename", "where"),
+    "address": ("address", "street", "streetaddress", "venueaddress", "locationaddress"),
+    "city": ("city", "locality", "town"),
+    "region": ("region", "state", "province", "county"),
+    "postalCode": ("postalcode", "zip", "zipcode", "postcode"),
+    "country": ("country", "countrycode"),
+    "price": ("price", "cost", "ticketprice", "fee", "admission", "pricerange"),
+    "currency": ("currency", "pricecurrency"),
+    "image": ("image", "imageurl", "img", "thumbnail", "photo", "picture", "poster"),
+    "url": ("url", "link", "eventurl", "eventlink", "sourceurl", "pageurl"),
+    "ticketUrl": ("ticketurl", "tickets", "ticketlink", "bookingurl", "registrationurl", "buyurl"),
+    "organizer": ("organizer", "organiser", "host", "organizername", "presenter"),
+    "performer": ("performer", "performers", "artist", "artists", "lineup", "speaker", "speakers"),
+    "status": ("status", "eventstatus"),
+    "attendanceMode": ("attendancemode", "eventattendancemode", "format"),
+}
+_ALIAS_TO_KEY = {alias: key for key, aliases in FIELD_ALIASES.items() for alias in aliases}
+# A "name" nested under one of these parents is that parent's name
+_NAMED_PARENTS = {"venue", "organizer", "performer"}
+
+_OG_KEYS = {
+    "og:title": "name",
+    "og:description": "description",
+    "og:image": "image",
+    "og:url": "url",
+    "event:start_time": "startDate",
+    "event:end_time": "endDate",
+    "og:street-address": "address",
+    "og:locality": "city",
+    "og:region": "region",
+    "og:postal-code": "postalCode",
+    "og:country-name": "country",
+}
+_CURRENCY_SYMBOLS = {"USD": "$", "EUR": "€", "GBP": "£", "JPY": "¥", "INR": "₹"}
+_KEY_CHARS = re.compile(r"[^a-z0-9]")
+_SPACES = re.compile(r"\s+")
+
+
+def _norm(name: str) -> str:
+    return _KEY_CHARS.sub("", name.lower())
+
+
+def _is_event_type(value) -> bool:
+    types = value if isinstance(value, list) else [value]
+    return any(isinstance(t, str) and t.rsplit("/", 1)[-1].endswith("Event") for t in types)
+
+
+class _StructuredDataParser(HTMLParser):
+    """Collects JSON-LD blocks, meta tags and schema.org microdata items"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.json_ld: list[str] = []
+        self.meta: dict[str, str] = {}
+        self.items: list[dict] = []
+        self._in_json_ld = False
+        self._tags: list[tuple[str, bool, str | None]] = []  # (tag, opened itemscope, itemprop capturing text)
+        self._scopes: list[dict] = []
+        self._text: list[list[str]] = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "meta":
+            key = attrs.get("property") or attrs.get("name")
+            content = attrs.get("content")
+            if key and content and key.lower() not in self.meta:
+                self.meta[key.lower()] = content.strip()
+            if attrs.get("itemprop") and content and self._scopes:
+                self._scopes[-1].setdefault(attrs["itemprop"], content.strip())
+            return
+        if tag == "script":
+            self._in_json_ld = "ld+json" in (attrs.get("type") or "").lower()
+            if self._in_json_ld:
+                self.json_ld.append("")
+            return
+
+        itemprop = attrs.get("itemprop")
+        value = attrs.get("content") or attrs.get("datetime")
+        if tag in ("a", "link") and itemprop and not value:
+            value = attrs.get("href")
+        if tag == "img" and itemprop and not value:
+            value = attrs.get("src")
+
+        if "itemscope" in attrs:
+            scope = {"@type": attrs.get("itemtype") or ""}
+            if itemprop and self._scopes:
+                self._scopes[-1].setdefault(itemprop, scope)
+            else:
+                self.items.append(scope)
+            self._scopes.append(scope)
+            self._tags.append((tag, True, None))
+            return
+        if itemprop and self._scopes:
+            if value:
+                self._scopes[-1].setdefault(itemprop, value.strip())
+            elif tag not in ("link", "img", "meta"):
+                self._tags.append((tag, False, itemprop))
+                self._text.append([])
+                return
+        if tag not in ("img", "link", "br", "hr", "input"):
+            self._tags.append((tag, False, None))
+
+    def handle_endtag(self, tag):
+        if tag == "script":
+            self._in_json_ld = False
+            return
+        if not any(open_tag == tag for open_tag, _, _ in self._tags):
+            return
+        while self._tags:
+            open_tag, scoped, itemprop = self._tags.pop()
+            if scoped:
+                self._scopes.pop()
+            elif itemprop:
+                text = _SPACES.sub(" ", "".join(self._text.pop())).strip()
+                if text and self._scopes:
+                    self._scopes[-1].setdefault(itemprop, text)
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if self._in_json_ld:
+            self.json_ld[-1] += data
+        for chunks in self._text:
+            chunks.append(data)
+
+
+def _json_ld_events(blocks: list[str]) -> list[dict]:
+    """Event objects in JSON-LD blocks (top level, lists and @graph)"""
+    events = []
+
+    def walk(node):
+        if isinstance(node, list):
+            for child in node:
+                walk(child)
+        elif isinstance(node, dict):
+            if _is_event_type(node.get("@type")):
+                events.append(node)
+            elif "@graph" in node:
+                walk(node["@graph"])
+
+    for block in blocks:
+        try:
+            walk(json.loads(block))
+        except ValueError:
+            logger.debug("Skipping JSON-LD block that does not parse")
+    return events
+
+
+def _first(value):
+    """First element of a list, or the value itself"""
+    while isinstance(value, list):
+        value = value[0] if value else None
+    return value
+
+
+def _text(value, prefer: str = "name") -> str | None:
+    value = _first(value)
+    if isinstance(value, dict):
+        value = value.get(prefer) or value.get("name") or value.get("@id") or value.get("url")
+    if value is None:
+        return None
+    value = _SPACES.sub(" ", str(value)).strip()
+    return value or None
+
+
+def _names(value) -> str | None:
+    """Comma-joined names of one or more schema.org things"""
+    values = value if isinstance(value, list) else [value]
+    names = [name for name in (_text(v) for v in values) if name]
+    return ", ".join(dict.fromkeys(names)) or None
+
+
+def _canonical(record: dict) -> dict:
+    """Flatten a schema.org Event (JSON-LD or microdata) into canonical keys"""
+    location = _first(record.get("location"))
+    address = location.get("address") if isinstance(location, dict) else None
+    address = _first(address)
+    offers = _first(record.get("offers"))
+
+    values = {
+        "name": _text(record.get("name")),
+        "description": _text(record.get("description")),
+        "startDate": _text(record.get("startDate")),
+        "endDate": _text(record.get("endDate")),
+        "doorTime": _text(record.get("doorTime")),
+        "image": _text(record.get("image"), prefer="url"),
+        "url": _text(record.get("url")),
+        "organizer": _names(record.get("organizer")),
+        "performer": _names(record.get("performer")),
+        "status": _text(record.get("eventStatus")),
+        "attendanceMode": _text(record.get("eventAttendanceMode")),
+    }
+    if isinstance(location, dict):
+        values["venue"] = _text(location.get("name"))
+    elif location:
+        values["venue"] = _text(location)
+    if isinstance(address, dict):
+        values.update({
+            "address": _text(address.get("streetAddress")),
+            "city": _text(address.get("addressLocality")),
+            "region": _text(address.get("addressRegion")),
+            "postalCode": _text(address.get("postalCode")),
+            "country": _text(address.get("addressCountry")),
+        })
+    elif address:
+        values["address"] = _text(address)
+    if isinstance(offers, dict):
+        values.update({
+            "price": _text(offers.get("price") or offers.get("lowPrice")),
+            "currency": _text(offers.get("priceCurrency")),
+            "ticketUrl": _text(offers.get("url")),
+        })
+
+    # schema.org enumerations arrive as URLs
+    for key in ("status", "attendanceMode"):
+        if values.get(key):
+            values[key] = values[key].rsplit("/", 1)[-1]
+    return {key: value for key, value in values.items() if value}
+
+
+def _opengraph(meta: dict) -> dict:
+    return {key: meta[tag] for tag, key in _OG_KEYS.items() if meta.get(tag)}
+
+
+def find_event_data(html: str) -> tuple[dict, dict]:
+    """
+    Collect the event data a page embeds, by canonical key.
+
+    JSON-LD wins over microdata, which wins over OpenGraph tags.
+    Returns:
+        (values, sources) - canonical key -> value and key -> source name
+    """
+    parser = _StructuredDataParser()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception as e:
+        logger.warning(f"Structured data parsing stopped early: {str(e)}")
+
+    candidates = [
+        ("json-ld", [_canonical(e) for e in _json_ld_events(parser.json_ld)]),
+        ("microdata", [_canonical(i) for i in parser.items if _is_event_type(i.get("@type"))]),
+        ("opengraph", [_opengraph(parser.meta)]),
+    ]
+    values: dict = {}
+    sources: dict = {}
+    for source, records in candidates:
+        # The richest record of a kind describes the page's main event
+        records = sorted((r for r in records if r), key=len, reverse=True)
+        for key, value in (records[0].items() if records else ()):
+            if key not in values:
+                values[key] = value
+                sources[key] = source
+    return values, sources
+
+
+def leaf_paths(structure: dict, prefix: str = "") -> list[tuple[str, object]]:
+    """(dot path, type) for every leaf field of an event structure"""
+    paths = []
+    for name, field_type in structure.items():
+        path = f"{prefix}{name}"
+        if isinstance(field_type, dict) and field_type:
+            paths.extend(leaf_paths(field_type, f"{path}."))
+        else:
+            paths.append((path, field_type))
+    return paths
+
+
+def _match_key(path: str) -> str | None:
+    """Canonical key a structure field stands for, if any"""
+    parts = path.split(".")
+    key = _ALIAS_TO_KEY.get(_norm(path))
+    if key:
+        return key
+    leaf = _ALIAS_TO_KEY.get(_norm(parts[-1]))
+    if len(parts) > 1 and leaf in ("name", "url", "venue"):
+        # location.name is the venue, organizer.url is not the event URL
+        parent = _ALIAS_TO_KEY.get(_norm(parts[-2]))
+        if parent in _NAMED_PARENTS:
+            return parent if leaf != "url" else None
+        if parent in ("venue", "address") and leaf == "venue":
+            return "venue"
+    return leaf
+
+
+def _price_text(values: dict) -> str | None:
+    price = values.get("price")
+    if price is None:
+        return None
+    currency = (values.get("currency") or "").upper()
+    try:
+        amount = float(price)
+    except ValueError:
+        return price
+    if amount == 0:
+        return "Free"
+    number = f"{amount:.2f}".rstrip("0").rstrip(".")
+    symbol = _CURRENCY_SYMBOLS.get(currency)
+    if symbol:
+        return f"{symbol}{number}"
+    return f"{number} {currency}".strip()
+
+
+def coerce_value(value, field_type, key: str | None = None, values: dict | None = None):
+    """
+    Convert a page value to the structure's field type.
+
+    Returns (value, derived) or (None, False) when it does not fit.
+    """
+    kind = field_type.lower() if isinstance(field_type, str) else "string"
+    if kind in ("datetime", "date", "time"):
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None, False
+        if kind == "date":
+            return parsed.date().isoformat(), False
+        return parsed.isoformat(), False
+    if kind in ("number", "float", "int", "integer"):
+        try:
+            number = float(re.sub(r"[^0-9.\-]", "", value))
+        except ValueError:
+            return None, False
+        return (int(number) if kind in ("int", "integer") else number), True
+    if kind in ("boolean", "bool"):
+        return None, False
+    if kind in ("array", "list") or isinstance(field_type, list):
+        return [part.strip() for part in value.split(",") if part.strip()], True
+    if key == "price" and values:
+        return _price_text(values), values.get("currency") is not None
+    return value, False
+
+
+def _set_path(data: dict, path: str, value):
+    parts = path.split(".")
+    node = data
+    for part in parts[:-1]:
+        node = node.setdefault(part, {})
+    node[parts[-1]] = value
+
+
+def empty_event(structure: dict) -> dict:
+    """The structure with every leaf set to None"""
+    return {
+        name: empty_event(field_type) if isinstance(field_type, dict) and field_type else None
+        for name, field_type in structure.items()
+    }
+
+
+def extract_structured(html: str, event_structure: dict, page_url: str | None = None) -> tuple[dict, list[str]]:
+    """
+    Map a page's embedded event data (JSON-LD, microdata, OpenGraph) onto
+    the event structure without AI.
+
+    Returns:
+        (result, missing) - result follows the map_to_structure contract
+        ({"event_data", "field_confidences", "notes"}); missing lists the
+        dot paths that could not be filled
+    """
+    values, sources = find_event_data(html)
+    if not values:
+        paths = [path for path, _ in leaf_paths(event_structure)]
+        return {"event_data": empty_event(event_structure), "field_confidences": {}, "notes": ""}, paths
+    if page_url and "url" not in values:
+        values["url"] = page_url
+        sources["url"] = "page"
+
+    event_data = empty_event(event_structure)
+    confidences = {}
+    missing = []
+    used = set()
+    for path, field_type in leaf_paths(event_structure):
+        key = _match_key(path)
+        value = values.get(key) if key else None
+        if value is None:
+            missing.append(path)
+            continue
+        value, derived = coerce_value(value, field_type, key, values)
+        if value is None or value == []:
+            missing.append(path)
+            continue
+        _set_path(event_data, path, value)
+        confidences[path] = SOURCE_CONFIDENCE[sources[key]] - (_DERIVED_PENALTY if derived else 0)
+        used.add(sources[key])
+
+    notes = ""
+    if confidences:
+        notes = f"Extracted from embedded {', '.join(sorted(used))} data"
+        if missing:
+            notes += f"; not found: {', '.join(missing)}"
+    return {"event_data": event_data, "field_confidences": confidences, "notes": notes}, missing
+
+
+def sub_structure(structure: dict, paths: list[str]) -> dict:
+    """The part of a structure that contains only the given leaf paths"""
+    subset: dict = {}
+    for path in paths:
+        node_in, node_out = structure, subset
+        parts = path.split(".")
+        for part in parts[:-1]:
+            node_in = node_in[part]
+            node_out = node_out.setdefault(part, {})
+        node_out[parts[-1]] = node_in[parts[-1]]
+    return subset
+
+
+def get_path(data: dict, path: str):
+    """Value at a dot path (None if absent)"""
+    node = data
+    for part in path.split("."):
+        node = node.get(part) if isinstance(node, dict) else None
+    return node
+
+
+def merge_results(base: dict, extra: dict, paths: list[str]) -> dict:
+    """Fill the given paths of a mapping result from another result (e.g. the AI's)"""
+    merged = json.loads(json.dumps(base["event_data"]))
+    confidences = dict(base["field_confidences"])
+    extra_confidences = extra.get("field_confidences") or {}
+    for path in paths:
+        _set_path(merged, path, get_path(extra.get("event_data") or {}, path))
+        confidences[path] = extra_confidences.get(path, 0)
+    notes = "; ".join(part for part in (base.get("notes"), extra.get("notes")) if part)
+    return {"event_data": merged, "field_confidences": confidences, "notes": notes}
@@ -0,0 +1,88 @@
+"""
+Standalone crawl worker.
+
+Run any number of these, on any node sharing the MongoDB database:
+
+    python -m app.worker
+
+Each worker claims pending CrawlJob documents under a renewable lease,
+processes them with its own browser pool, and re-queues jobs whose
+owner stopped heartbeating. Pair with CRAWL_DISPATCH_MODE=queue on the
+API so it only records jobs.
+"""
+import sys
+import signal
+import asyncio
+from app.database import connect_db, disconnect_db
+from app.services.browser_pool import start_browser_pool, close_browser_pool
+from app.services.http_fetcher import start_http_client, close_http_client
+from app.services.scheduler import start_scheduler, stop_scheduler
+from app.services.leases import feeder, release_leases, WORKER_ID
+from app.services.pipeline import pipeline
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def start_workers():
+    """Start the browser pool, pipeline, scheduler and job feeder for this process"""
+    logger.info("Starting browser pool...")
+    await start_browser_pool()
+    await start_http_client()
+    logger.info("Starting crawl pipeline...")
+    pipeline.start()
+    logger.info("Starting crawl scheduler...")
+    start_scheduler(pipeline.handle)
+    logger.info("Starting job feeder...")
+    feeder.start()
+
+
+async def stop_workers():
+    """Stop claiming, drain running jobs, and hand unfinished ones back"""
+    logger.info("Stopping job feeder...")
+    await feeder.stop_claiming()
+    logger.info("Draining crawl scheduler...")
+    await stop_scheduler()
+    logger.info("Draining crawl pipeline...")
+    await pipeline.stop()
+    released = await release_leases()
+    if released:
+        logger.info(f"Released {released} unfinished jobs back to the queue")
+    await feeder.stop()
+    logger.info("Closing browser pool...")
+    await close_browser_pool()
+    await close_http_client()
+
+
+async def main():
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            # Windows: fall back to KeyboardInterrupt
+            pass
+
+    logger.info("Connecting to database...")
+    await connect_db()
+    try:
+        await start_workers()
+        logger.info(f"Worker {WORKER_ID} running")
+        await stop.wait()
+    finally:
+        await stop_workers()
+        logger.info("Disconnecting from database...")
+        await disconnect_db()
+
+
+if __name__ == "__main__":
+    # Force WindowsSelectorEventLoopPolicy for Playwright compatibility
+    if sys.platform.startswith("win"):
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
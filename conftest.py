@@ -0,0 +1,8 @@
+import os
+
+# app.config insists on credentials; unit tests never call out
+os.environ.setdefault("GEMINI_API_KEY", "test")
+os.environ.setdefault("DATABASE_URL", "mongodb://localhost:27017/test")
+
+# Manual scripts that crawl a live site or call the Gemini API
+collect_ignore = ["test_crawl.py", "test_gemini.py"]
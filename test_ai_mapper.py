@@ -0,0 +1,172 @@
+import asyncio
+import copy
+import json
+import pytest
+from app.services import ai_mapper
+from app.services.ai_mapper import MapBatcher, escalation_reason, map_events, map_to_structure
+from app.services.llm_client import LLMRateLimitError
+
+STRUCTURE = {"title": "string", "start_date": "datetime", "venue": {"city": "string"}}
+
+
+def _answer(title="Jazz Night", start="2025-11-21T20:00:00", confidence=90) -> dict:
+    return {
+        "event_data": {"title": title, "start_date": start, "venue": {"city": "Lyon"}},
+        "field_confidences": {"title": confidence, "start_date": confidence, "venue.city": confidence},
+        "notes": "",
+    }
+
+
+class FakeLLM:
+    """Answers each tier from a queue of results (dicts, lists or exceptions)"""
+
+    def __init__(self, **answers):
+        self.answers = {tier: list(queue) for tier, queue in answers.items()}
+        self.calls = []
+
+    async def generate(self, tier, prompt, generation_config=None):
+        self.calls.append((tier, prompt))
+        answer = self.answers[tier].pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return json.dumps(answer)
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    monkeypatch.setattr(ai_mapper, "MAP_MODEL_TIERING", True)
+    monkeypatch.setattr(ai_mapper, "_stats", copy.deepcopy(ai_mapper._stats))
+
+    def install(**answers):
+        fake = FakeLLM(**answers)
+        monkeypatch.setattr(ai_mapper, "llm", fake)
+        return fake
+    return install
+
+
+def test_escalation_reason():
+    assert escalation_reason(_answer(), STRUCTURE) is None
+    assert escalation_reason(_answer(confidence=50), STRUCTURE) == "low_confidence"
+    assert escalation_reason(_answer(start=None), STRUCTURE) == "missing_required"
+
+
+def test_confident_fast_answer_is_kept(fake_llm):
+    fake = fake_llm(fast=[_answer()])
+    result = asyncio.run(map_to_structure("<page>", STRUCTURE))
+    assert result["tier"] == "fast"
+    assert result["event_data"]["title"] == "Jazz Night"
+    assert [tier for tier, _ in fake.calls] == ["fast"]
+
+
+@pytest.mark.parametrize("fast, reason", [
+    (_answer(confidence=40), "low_confidence"),
+    (_answer(title=None), "missing_required"),
+    (ValueError("bad JSON"), "error"),
+])
+def test_fast_answer_escalates_to_pro(fake_llm, fast, reason):
+    fake = fake_llm(fast=[fast], pro=[_answer(title="Pro Night")])
+    result = asyncio.run(map_to_structure("<page>", STRUCTURE))
+    assert result["tier"] == "pro" and result["event_data"]["title"] == "Pro Night"
+    assert [tier for tier, _ in fake.calls] == ["fast", "pro"]
+    assert ai_mapper._stats["escalations"][reason] == 1
+
+
+def test_fast_rate_limit_is_not_escalated(fake_llm):
+    fake = fake_llm(fast=[LLMRateLimitError("quota")])
+    with pytest.raises(LLMRateLimitError):
+        asyncio.run(map_to_structure("<page>", STRUCTURE))
+    assert [tier for tier, _ in fake.calls] == ["fast"]
+
+
+def test_without_tiering_only_pro_is_asked(fake_llm, monkeypatch):
+    fake = fake_llm(pro=[_answer(confidence=40)])
+    monkeypatch.setattr(ai_mapper, "MAP_MODEL_TIERING", False)
+    assert asyncio.run(map_to_structure("<page>", STRUCTURE))["tier"] == "pro"
+    assert [tier for tier, _ in fake.calls] == ["pro"]
+
+
+def test_pro_failure_is_reported(fake_llm):
+    fake_llm(fast=[ValueError("bad JSON")], pro=[ValueError("bad JSON")])
+    with pytest.raises(Exception, match="AI mapping failed"):
+        asyncio.run(map_to_structure("<page>", STRUCTURE))
+
+
+def test_listing_chunk_maps_every_event(fake_llm):
+    fake_llm(fast=[[_answer(title="One"), "garbage", _answer(title="Two")]])
+    results = asyncio.run(map_events("<chunk>", STRUCTURE))
+    assert [r["event_data"]["title"] for r in results] == ["One", "Two"]
+    assert {r["tier"] for r in results} == {"fast"}
+
+
+def test_listing_chunk_retries_on_pro(fake_llm):
+    fake_llm(fast=[ValueError("bad JSON")], pro=[[]])
+    assert asyncio.run(map_events("<chunk>", STRUCTURE)) == []
+    assert ai_mapper._stats["escalations"]["error"] == 1
+
+
+def _batch(*pages) -> list:
+    return [{"page": number, **answer} for number, answer in pages]
+
+
+def _map_pages(batcher, pages, group="site-1"):
+    async def run():
+        return await asyncio.gather(
+            *(batcher.map(page, STRUCTURE, group=group) for page in pages),
+            return_exceptions=True,
+        )
+    return asyncio.run(run())
+
+
+def test_batcher_sends_one_prompt_per_batch(fake_llm):
+    fake = fake_llm(fast=[_batch((2, _answer(title="B")), (1, _answer(title="A")))])
+    results = _map_pages(MapBatcher(size=2, window_ms=1000), ["page A", "page B"])
+    assert [r["event_data"]["title"] for r in results] == ["A", "B"]
+    assert len(fake.calls) == 1 and "page A" in fake.calls[0][1] and "page B" in fake.calls[0][1]
+    assert ai_mapper._stats["batching"] == {"batches": 1, "pages": 2, "fallbacks": 0}
+
+
+def test_batcher_flushes_after_the_window(fake_llm):
+    fake = fake_llm(fast=[_batch((1, _answer(title="A")), (2, _answer(title="B")))])
+    results = _map_pages(MapBatcher(size=5, window_ms=10), ["page A", "page B"])
+    assert [r["event_data"]["title"] for r in results] == ["A", "B"]
+    assert len(fake.calls) == 1
+
+
+def test_pages_missing_from_the_answer_are_mapped_alone(fake_llm):
+    fake = fake_llm(fast=[_batch((1, _answer(title="A"))), _answer(title="B alone")])
+    results = _map_pages(MapBatcher(size=2, window_ms=1000), ["page A", "page B"])
+    assert [r["event_data"]["title"] for r in results] == ["A", "B alone"]
+    assert "page B" in fake.calls[1][1] and "page A" not in fake.calls[1][1]
+    assert ai_mapper._stats["batching"]["fallbacks"] == 1
+
+
+def test_unsure_batched_page_escalates_alone(fake_llm):
+    fake = fake_llm(
+        fast=[_batch((1, _answer(title="A")), (2, _answer(title="B", confidence=30)))],
+        pro=[_answer(title="B pro")],
+    )
+    results = _map_pages(MapBatcher(size=2, window_ms=1000), ["page A", "page B"])
+    assert [(r["event_data"]["title"], r["tier"]) for r in results] == [("A", "fast"), ("B pro", "pro")]
+    assert [tier for tier, _ in fake.calls] == ["fast", "pro"]
+
+
+def test_batch_rate_limit_fails_every_page(fake_llm):
+    fake = fake_llm(fast=[LLMRateLimitError("quota")])
+    results = _map_pages(MapBatcher(size=2, window_ms=1000), ["page A", "page B"])
+    assert all(isinstance(r, LLMRateLimitError) for r in results)
+    assert len(fake.calls) == 1
+
+
+def test_websites_are_not_batched_together(fake_llm):
+    fake = fake_llm(fast=[_answer(title="A"), _answer(title="B")])
+    batcher = MapBatcher(size=2, window_ms=10)
+
+    async def run():
+        return await asyncio.gather(
+            batcher.map("page A", STRUCTURE, group="site-1"),
+            batcher.map("page B", STRUCTURE, group="site-2"),
+        )
+
+    assert sorted(r["event_data"]["title"] for r in asyncio.run(run())) == ["A", "B"]
+    assert len(fake.calls) == 2
+    assert ai_mapper._stats["batching"]["batches"] == 0
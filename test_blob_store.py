@@ -0,0 +1,105 @@
+import asyncio
+import base64
+import os
+from types import SimpleNamespace
+import pytest
+from app.services import blob_store
+from app.services.blob_store import get_html, put_html
+
+PAGE = "<html><body>" + "<p>Jazz Night at the Blue Room</p>" * 500 + "</body></html>"
+
+
+class FakeBlobs:
+    """In-memory db.htmlblob"""
+
+    def __init__(self):
+        self.rows = {}
+
+    async def find_unique(self, where):
+        return self.rows.get(where["hash"])
+
+    async def update(self, where, data):
+        self.rows[where["hash"]].refs += data["refs"]["increment"]
+
+    async def upsert(self, where, data):
+        if where["hash"] in self.rows:
+            await self.update(where, data["update"])
+        else:
+            self.rows[where["hash"]] = SimpleNamespace(refs=1, **data["create"])
+
+
+class FakeChunks:
+    """In-memory db.htmlblobchunk"""
+
+    def __init__(self):
+        self.rows = []
+
+    async def delete_many(self, where):
+        self.rows = [row for row in self.rows if row.hash != where["hash"]]
+
+    async def create_many(self, data):
+        self.rows += [SimpleNamespace(**row) for row in data]
+
+    async def find_many(self, where, order):
+        return sorted((row for row in self.rows if row.hash == where["hash"]), key=lambda row: row.n)
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    db = SimpleNamespace(htmlblob=FakeBlobs(), htmlblobchunk=FakeChunks())
+    monkeypatch.setattr(blob_store, "get_db", lambda: db)
+    monkeypatch.setattr(blob_store, "HTML_STORE", "disk")
+    monkeypatch.setattr(blob_store, "HTML_STORE_DIR", str(tmp_path))
+    monkeypatch.setattr(blob_store, "_stats", {"stored": 0, "deduplicated": 0, "raw_bytes": 0, "stored_bytes": 0, "errors": 0})
+    return db
+
+
+def test_disk_round_trip(store, tmp_path):
+    snapshot = asyncio.run(put_html(PAGE))
+    assert snapshot["size"] == len(PAGE)
+    assert snapshot["storedSize"] < snapshot["size"] / 10
+    path = tmp_path / snapshot["hash"][:2] / snapshot["hash"][2:4] / f"{snapshot['hash']}.html.zst"
+    assert path.exists()
+    assert asyncio.run(get_html(snapshot["hash"])) == PAGE
+    assert blob_store.store_stats()["compression_ratio"] > 10
+
+
+def test_same_page_is_stored_once(store):
+    async def run():
+        return await put_html(PAGE), await put_html(PAGE)
+
+    first, second = asyncio.run(run())
+    assert not first["deduplicated"] and second["deduplicated"]
+    assert second["hash"] == first["hash"]
+    assert store.htmlblob.rows[first["hash"]].refs == 2
+
+
+def test_database_backend_chunks_large_pages(store, monkeypatch):
+    monkeypatch.setattr(blob_store, "HTML_STORE", "db")
+    # Barely compressible, so the blob spans several chunks
+    page = base64.b64encode(os.urandom(600 * 1024)).decode()
+    snapshot = asyncio.run(put_html(page))
+    assert len(store.htmlblobchunk.rows) == -(-snapshot["storedSize"] // (255 * 1024)) > 1
+    assert asyncio.run(get_html(snapshot["hash"])) == page
+
+
+def test_missing_snapshots(store, tmp_path):
+    assert asyncio.run(get_html("0" * 64)) is None
+    # Registered but the file is gone
+    snapshot = asyncio.run(put_html(PAGE))
+    for path in tmp_path.rglob("*.zst"):
+        path.unlink()
+    assert asyncio.run(get_html(snapshot["hash"])) is None
+
+
+def test_store_off_or_failing(store, monkeypatch):
+    monkeypatch.setattr(blob_store, "HTML_STORE", "none")
+    assert asyncio.run(put_html(PAGE)) is None
+
+    async def broken(where):
+        raise RuntimeError("database down")
+
+    monkeypatch.setattr(blob_store, "HTML_STORE", "disk")
+    monkeypatch.setattr(store.htmlblob, "find_unique", broken)
+    assert asyncio.run(put_html(PAGE)) is None
+    assert blob_store.store_stats()["errors"] == 1
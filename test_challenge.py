@@ -0,0 +1,62 @@
+import time
+import pytest
+from app.services import challenge
+from app.services.challenge import BotChallengeError, check_cooldown, challenge_detected, classify_challenge
+
+
+def test_cloudflare_challenge_header():
+    assert classify_challenge(403, {"Server": "cloudflare", "cf-mitigated": "challenge"}) == "cloudflare_challenge"
+
+
+def test_cloudflare_challenge_markup():
+    html = '<html><head><title>Just a moment...</title></head><script src="/cdn-cgi/challenge-platform/h/b"></script>'
+    assert classify_challenge(403, {"Server": "cloudflare"}, html=html) == "cloudflare_challenge"
+
+
+def test_cloudflare_block_page():
+    html = "<title>Attention Required! | Cloudflare</title> Error code: 1020"
+    assert classify_challenge(403, {"Server": "cloudflare"}, html=html) == "cloudflare_block"
+
+
+def test_origin_outage_behind_cloudflare_is_not_a_challenge():
+    html = "<html><body><h1>503 Service Unavailable</h1></body></html>"
+    assert classify_challenge(503, {"Server": "cloudflare"}, html=html) is None
+    assert classify_challenge(403, {"Server": "cloudflare"}, html="<h1>Forbidden</h1>") is None
+
+
+def test_plain_rate_limit_is_not_a_challenge():
+    assert classify_challenge(429, {"Retry-After": "30"}, html="Too many requests") is None
+
+
+def test_datadome_and_other_vendors():
+    assert classify_challenge(403, {"X-DataDome": "protected"}) == "datadome"
+    assert classify_challenge(200, {}, html='<script src="https://ct.captcha-delivery.com/c.js">') == "datadome"
+    assert classify_challenge(200, {}, html='<div id="px-captcha"></div>') == "perimeterx"
+    assert classify_challenge(403, {"Server": "AkamaiGHost"}, html="<H1>Access Denied</H1>") == "akamai_block"
+
+
+def test_final_url():
+    assert classify_challenge(url="https://example.com/cdn-cgi/challenge-platform/x") == "cloudflare_challenge"
+
+
+def test_ordinary_page():
+    assert classify_challenge(200, {"Server": "nginx"}, "https://example.com/e/1", "<html><h1>Concert</h1>") is None
+
+
+def test_markers_past_the_scan_window_are_ignored():
+    html = "x" * challenge.SCAN_CHARS + "cf-chl-"
+    assert classify_challenge(200, {}, html=html) is None
+
+
+def test_cooldown(monkeypatch):
+    monkeypatch.setattr(challenge, "_cooldowns", {})
+    error = challenge_detected("datadome", "https://www.example.com/a")
+    assert isinstance(error, BotChallengeError) and error.domain == "example.com"
+    with pytest.raises(BotChallengeError):
+        check_cooldown("https://example.com/b")
+    check_cooldown("https://other.example/")
+
+    # An expired cooldown is dropped
+    challenge._cooldowns["example.com"] = (time.monotonic() - 1, "datadome")
+    check_cooldown("https://example.com/b")
+    assert "example.com" not in challenge._cooldowns
@@ -0,0 +1,70 @@
+import json
+from app.services.content import CHARS_PER_TOKEN, estimate_tokens, reduce_page
+
+EVENT_LD = {"@context": "https://schema.org", "@type": "MusicEvent", "name": "Jazz Night", "startDate": "2025-11-15T20:00"}
+
+PAGE = f"""<html><head>
+<title>Jazz Night</title>
+<meta property="og:title" content="Jazz Night at the Blue Room">
+<meta name="viewport" content="width=device-width">
+<script type="application/ld+json">{json.dumps(EVENT_LD, indent=2)}</script>
+<script>var tracking = "drop me";</script>
+<style>.x {{ color: red }}</style>
+</head><body>
+<header><nav>Home | Events | About</nav></header>
+<main>
+<h1>Jazz Night</h1>
+<p>Live jazz with the house trio, every Friday from 8pm.</p>
+<p>Tickets <a href="/tickets/42">on sale now</a>.</p>
+<time datetime="2025-11-15T20:00">Friday</time>
+</main>
+<footer>Copyright footer text</footer>
+</body></html>"""
+
+
+def test_keeps_structured_data_and_main_text():
+    content, stats = reduce_page(PAGE)
+    assert '"name":"Jazz Night"' in content  # JSON-LD compacted
+    assert "og:title: Jazz Night at the Blue Room" in content
+    assert "time: 2025-11-15T20:00" in content
+    assert "# Jazz Night" in content
+    assert "on sale now (/tickets/42)" in content
+    assert stats["jsonLdBlocks"] == 1
+    assert stats["jsonLdEvents"] == 1
+    assert not stats["truncated"]
+
+
+def test_drops_scripts_styles_and_chrome():
+    content, _ = reduce_page(PAGE)
+    for dropped in ("drop me", "color: red", "Home | Events", "Copyright footer", "viewport"):
+        assert dropped not in content
+
+
+def test_fits_the_token_budget():
+    long_page = "<html><body><main>" + "".join(
+        f"<p>Paragraph {n} about the festival programme and its artists.</p>" for n in range(2000)
+    ) + "</main></body></html>"
+    content, stats = reduce_page(long_page, token_budget=500)
+    assert len(content) <= 500 * CHARS_PER_TOKEN
+    assert stats["truncated"]
+    assert stats["reducedTokens"] == estimate_tokens(content) <= 500
+    assert stats["inputTokens"] > stats["reducedTokens"]
+
+
+def test_prefers_crawler_markdown():
+    markdown = "# Jazz Night\n" + "Live jazz with the house trio. " * 20
+    content, stats = reduce_page(PAGE, markdown)
+    assert stats["source"] == "markdown"
+    assert "Live jazz with the house trio." in content
+
+
+def test_repeated_lines_are_dropped():
+    page = "<html><body>" + "<p>Buy tickets</p>" * 50 + "</body></html>"
+    content, _ = reduce_page(page)
+    assert content.count("Buy tickets") == 1
+
+
+def test_malformed_markup():
+    content, stats = reduce_page("<html><body><main><p>Unclosed <b>tags <div>Event text")
+    assert "Event text" in content
+    assert stats["source"] == "html"
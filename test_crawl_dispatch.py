@@ -0,0 +1,63 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from app.api import crawl
+from app.services.scheduler import CrawlTask, QueueFullError
+
+
+@pytest.fixture
+def local(monkeypatch):
+    """Local dispatch mode with the job table and scheduler faked"""
+    state = {"pending": {"job-1"}, "released": [], "submitted": [], "full": False}
+
+    async def fake_claim_job(job_id):
+        if job_id not in state["pending"]:
+            return False
+        state["pending"].discard(job_id)
+        return True
+
+    async def fake_release_job(job_id):
+        state["released"].append(job_id)
+        state["pending"].add(job_id)
+
+    def submit(task):
+        if state["full"]:
+            raise QueueFullError("Crawl queue is full")
+        state["submitted"].append(task)
+
+    monkeypatch.setattr(crawl, "CRAWL_DISPATCH_MODE", "local")
+    monkeypatch.setattr(crawl, "claim_job", fake_claim_job)
+    monkeypatch.setattr(crawl, "release_job", fake_release_job)
+    monkeypatch.setattr(crawl, "scheduler", SimpleNamespace(submit=submit))
+    return state
+
+
+def _dispatch():
+    asyncio.run(crawl._dispatch(CrawlTask("job-1", "w1", "https://example.com/1")))
+
+
+def test_job_is_claimed_before_it_is_queued(local):
+    _dispatch()
+    [task] = local["submitted"]
+    assert task.claimed
+    # The job feeder can no longer claim it into a second slot
+    assert "job-1" not in local["pending"]
+
+
+def test_job_the_feeder_claimed_is_not_queued_twice(local):
+    local["pending"].clear()
+    _dispatch()
+    assert local["submitted"] == []
+
+
+def test_full_queue_hands_the_job_back(local):
+    local["full"] = True
+    _dispatch()
+    assert local["released"] == ["job-1"]
+    assert "job-1" in local["pending"]
+
+
+def test_queue_mode_leaves_jobs_to_the_workers(local, monkeypatch):
+    monkeypatch.setattr(crawl, "CRAWL_DISPATCH_MODE", "queue")
+    _dispatch()
+    assert local["submitted"] == [] and "job-1" in local["pending"]
@@ -0,0 +1,92 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from app.services import crawl_profiles
+from app.services.crawl_profiles import crawl_overrides, record_outcome
+
+
+class FakeProfiles:
+    """In-memory db.crawlprofile applying increments the way the database does"""
+
+    def __init__(self):
+        self.rows = {}
+
+    async def upsert(self, where, data):
+        row = self.rows.get(where["websiteId"])
+        if row is None:
+            defaults = dict.fromkeys(
+                ["fetchTier", "avgReadyMs", "peakReadyMs", "selector", "readyMaxWaitMs", "pageTimeoutMs"]
+            )
+            row = SimpleNamespace(**{**defaults, **data["create"]})
+            self.rows[where["websiteId"]] = row
+            return row
+        for name, value in data["update"].items():
+            if isinstance(value, dict):
+                value = getattr(row, name) + value["increment"]
+            setattr(row, name, value)
+        return row
+
+    async def update(self, where, data):
+        row = self.rows[where["websiteId"]]
+        for name, value in data.items():
+            setattr(row, name, value)
+        return row
+
+
+@pytest.fixture
+def profiles(monkeypatch):
+    table = FakeProfiles()
+    monkeypatch.setattr(crawl_profiles, "get_db", lambda: SimpleNamespace(crawlprofile=table))
+    monkeypatch.setattr(crawl_profiles, "PROFILE_MIN_SAMPLES", 3)
+    return table
+
+
+def test_concurrent_outcomes_are_all_counted(profiles):
+    async def run():
+        # Every crawl read the profile before any of them recorded its outcome
+        await asyncio.gather(*(
+            record_outcome("w1", None, success=n != 2, tier="http") for n in range(4)
+        ))
+
+    asyncio.run(run())
+    row = profiles.rows["w1"]
+    assert (row.samples, row.successes) == (4, 3)
+
+
+def test_cap_is_tuned_from_the_stored_count(profiles):
+    async def run():
+        for _ in range(3):
+            # A stale read: the profile did not exist yet when the job started
+            await record_outcome("w1", None, success=True, ready_reason="stable", ready_ms=1000)
+
+    asyncio.run(run())
+    row = profiles.rows["w1"]
+    assert row.samples == 3
+    assert row.readyMaxWaitMs is not None and row.pageTimeoutMs is not None
+    assert crawl_overrides(row)["page_timeout"] == row.pageTimeoutMs
+
+
+def test_timeout_drops_the_cap(profiles):
+    async def run():
+        for _ in range(3):
+            await record_outcome("w1", None, success=True, ready_reason="stable", ready_ms=1000)
+        await record_outcome("w1", profiles.rows["w1"], success=True, ready_reason="timeout", ready_ms=8000)
+
+    asyncio.run(run())
+    row = profiles.rows["w1"]
+    assert row.timeouts == 1
+    assert row.readyMaxWaitMs is None and row.pageTimeoutMs is None
+
+
+def test_failure_streak_resets_settings(profiles):
+    async def run():
+        for _ in range(3):
+            await record_outcome("w1", None, success=True, ready_ms=1000, selector=".event")
+        await record_outcome("w1", None, success=False)
+        assert profiles.rows["w1"].selector == ".event"
+        await record_outcome("w1", None, success=False)
+
+    asyncio.run(run())
+    row = profiles.rows["w1"]
+    assert row.failureStreak == 2
+    assert (row.readyMaxWaitMs, row.pageTimeoutMs, row.selector) == (None, None, None)
@@ -0,0 +1,81 @@
+import asyncio
+import pytest
+from app.services import crawler
+from app.services.http_fetcher import HttpFetchError
+
+
+@pytest.fixture
+def fetches(monkeypatch):
+    """Stub both tiers; records which were used"""
+    calls = []
+    answers = {}
+
+    async def fake_fetch_html(url):
+        calls.append("http")
+        answer = answers["http"]
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    async def fake_crawl(url, use_javascript=False, config=None, traffic=None, page=None):
+        calls.append("browser")
+        return "<html>rendered</html>"
+
+    monkeypatch.setattr(crawler, "fetch_html", fake_fetch_html)
+    monkeypatch.setattr(crawler, "crawl", fake_crawl)
+    return calls, answers
+
+
+def _fetch_once(page=None, tier=None):
+    return asyncio.run(crawler._fetch_once("https://example.com/e/1", False, tier, None, None, page))
+
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_overloaded_host_is_not_escalated(fetches, status):
+    calls, answers = fetches
+    answers["http"] = HttpFetchError(f"HTTP {status}", status)
+    with pytest.raises(HttpFetchError):
+        _fetch_once()
+    assert calls == ["http"]
+
+
+def test_transport_failure_still_escalates(fetches):
+    calls, answers = fetches
+    answers["http"] = HttpFetchError("HTTP fetch failed: RemoteProtocolError: peer closed connection")
+    page = {}
+    assert _fetch_once(page) == ("<html>rendered</html>", "browser")
+    assert calls == ["http", "browser"]
+    assert page["escalation"] == "http_error"
+
+
+def test_usable_page_stays_on_http(fetches):
+    calls, answers = fetches
+    answers["http"] = ("<html>server rendered</html>", None)
+    page = {"escalation": "stale"}
+    assert _fetch_once(page) == ("<html>server rendered</html>", "http")
+    assert calls == ["http"]
+    assert "escalation" not in page
+
+
+def test_js_page_escalates_with_its_reason(fetches):
+    calls, answers = fetches
+    answers["http"] = ('<div id="root"></div>', "empty_root")
+    page = {}
+    assert _fetch_once(page)[1] == "browser"
+    assert calls == ["http", "browser"]
+    assert page["escalation"] == "empty_root"
+
+
+def test_browser_sites_skip_http(fetches):
+    calls, _ = fetches
+    assert _fetch_once(tier="browser")[1] == "browser"
+    assert asyncio.run(crawler._fetch_once("https://example.com/e/1", True, None, None, None, None))[1] == "browser"
+    assert calls == ["browser", "browser"]
+
+
+def test_missing_page_is_not_escalated(fetches):
+    calls, answers = fetches
+    answers["http"] = HttpFetchError("HTTP 404", 404)
+    with pytest.raises(HttpFetchError):
+        _fetch_once()
+    assert calls == ["http"]
@@ -0,0 +1,91 @@
+import asyncio
+import csv
+import io
+import json
+from datetime import datetime
+from app.services import event_export
+from app.services.event_export import export_csv, export_ndjson
+
+STRUCTURE = {"title": "string", "venue": {"city": "string"}, "tags": ["string"]}
+
+
+def _event(n: int) -> dict:
+    return {
+        "id": f"event-{n}",
+        "crawlJobId": "job-1",
+        "websiteId": "site-1",
+        "sourceUrl": f"https://example.com/{n}",
+        "createdAt": datetime(2025, 11, 1, 12, n),
+        "reviewStatus": "pending",
+        "overallConfidence": 88.5,
+        "eventData": {"title": f"Jazz Night {n}", "venue": {"city": "Lyon"}, "tags": ["jazz", "live"]},
+        "fieldConfidences": {"title": 95, "venue.city": 80, "tags": 70},
+    }
+
+
+def _serve(monkeypatch, events):
+    seen = []
+
+    async def iter_events(where):
+        seen.append(where)
+        for event in events:
+            yield event
+
+    monkeypatch.setattr(event_export, "iter_events", iter_events)
+    return seen
+
+
+def _collect(chunks) -> list[str]:
+    async def run():
+        return [chunk async for chunk in chunks]
+    return asyncio.run(run())
+
+
+def test_ndjson_is_one_event_per_line(monkeypatch):
+    seen = _serve(monkeypatch, [_event(1), _event(2)])
+    lines = "".join(_collect(export_ndjson({"reviewStatus": "pending"}))).splitlines()
+    assert seen == [{"reviewStatus": "pending"}]
+    rows = [json.loads(line) for line in lines]
+    assert [row["id"] for row in rows] == ["event-1", "event-2"]
+    assert rows[0]["createdAt"] == "2025-11-01T12:01:00"
+    assert rows[0]["reviewedAt"] is None
+    assert rows[0]["eventData"]["venue"] == {"city": "Lyon"}
+
+
+def test_csv_has_a_column_per_structure_field(monkeypatch):
+    _serve(monkeypatch, [_event(1)])
+    rows = list(csv.DictReader(io.StringIO("".join(_collect(export_csv({}, STRUCTURE))))))
+    assert len(rows) == 1
+    row = rows[0]
+    assert row["id"] == "event-1"
+    assert row["eventData.venue.city"] == "Lyon"
+    assert json.loads(row["eventData.tags"]) == ["jazz", "live"]
+    assert row["confidence.venue.city"] == "80"
+    assert "eventData" not in row
+
+
+def test_csv_without_structure_uses_json_cells(monkeypatch):
+    _serve(monkeypatch, [_event(1)])
+    rows = list(csv.DictReader(io.StringIO("".join(_collect(export_csv({}, None))))))
+    assert json.loads(rows[0]["eventData"])["title"] == "Jazz Night 1"
+    assert json.loads(rows[0]["fieldConfidences"])["title"] == 95
+
+
+def test_empty_export_is_just_the_header(monkeypatch):
+    _serve(monkeypatch, [])
+    assert _collect(export_ndjson({})) == []
+    (chunk,) = _collect(export_csv({}, STRUCTURE))
+    assert chunk.splitlines()[0].startswith("id,crawlJobId,websiteId")
+
+
+def test_output_is_flushed_in_pieces(monkeypatch):
+    monkeypatch.setattr(event_export, "_FLUSH_BYTES", 512)
+    _serve(monkeypatch, [_event(n) for n in range(20)])
+    chunks = _collect(export_ndjson({}))
+    assert len(chunks) > 1
+    assert all(chunk.endswith("\n") for chunk in chunks)
+    assert len("".join(chunks).splitlines()) == 20
+
+    chunks = _collect(export_csv({}, STRUCTURE))
+    assert len(chunks) > 1
+    assert len(list(csv.DictReader(io.StringIO("".join(chunks))))) == 20
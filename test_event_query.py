@@ -0,0 +1,113 @@
+import asyncio
+from datetime import datetime
+import pytest
+from bson import ObjectId
+from app.services import event_query
+from app.services.event_query import build_filter, date_field, find_events, parse_pairs
+from app.services.pagination import encode_cursor
+
+STRUCTURE = {
+    "title": "string",
+    "published": "date",
+    "start_date": "datetime",
+    "venue": {"name": "string", "city": "string"},
+}
+WEBSITE = "6553f1a2b3c4d5e6f7a8b9c0"
+
+
+def test_date_field_prefers_required_fields():
+    assert date_field(STRUCTURE) == "start_date"
+    assert date_field({"title": "string", "on": "date"}) == "on"
+    assert date_field({"title": "string"}) is None
+
+
+def test_parse_pairs():
+    assert parse_pairs(["venue.city: francisco", "title:Jazz"], "field") == {"venue.city": "francisco", "title": "Jazz"}
+    with pytest.raises(ValueError, match="path:value"):
+        parse_pairs(["title"], "field")
+
+
+def test_plain_filters():
+    where = build_filter(STRUCTURE, website_id=WEBSITE, review_status="approved", min_confidence=80)
+    assert where == {
+        "websiteId": ObjectId(WEBSITE),
+        "reviewStatus": "approved",
+        "overallConfidence": {"$gte": 80},
+    }
+
+
+def test_date_range_includes_the_last_day():
+    where = build_filter(STRUCTURE, date_from="2025-11-01", date_to="2025-11-30")
+    assert where == {"eventData.start_date": {"$gte": "2025-11-01", "$lt": "2025-12-01"}}
+    where = build_filter(STRUCTURE, date_to="2025-11-30T18:00:00Z", date_path="published")
+    assert where == {"eventData.published": {"$lte": "2025-11-30T18:00:00Z"}}
+
+
+def test_field_text_and_confidence_filters():
+    where = build_filter(
+        STRUCTURE,
+        fields={"venue.city": "san francisco (ca)"},
+        confidences={"start_date": "90", "venue.city": "70"},
+    )
+    assert where["eventData.venue.city"] == {"$regex": r"san\ francisco\ \(ca\)", "$options": "i"}
+    first, second = where["$expr"]["$and"]
+    assert first == {"$gte": [{"$getField": {"field": "start_date", "input": "$fieldConfidences"}}, 90.0]}
+    assert second["$gte"][1] == 70.0
+
+
+@pytest.mark.parametrize("options", [
+    {"fields": {"price": "10"}},
+    {"confidences": {"title": "high"}},
+    {"date_from": "November"},
+    {"website_id": "not-an-id"},
+])
+def test_invalid_filters(options):
+    with pytest.raises(ValueError):
+        build_filter(STRUCTURE, **options)
+
+
+def test_date_filter_needs_a_date_field():
+    with pytest.raises(ValueError, match="no date field"):
+        build_filter({"title": "string"}, date_from="2025-11-01")
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, keys):
+        self.keys = keys
+        return self
+
+    def limit(self, take):
+        self.docs = self.docs[:take]
+        return self
+
+    async def __aiter__(self):
+        for doc in self.docs:
+            yield doc
+
+
+def test_find_events_returns_api_shaped_documents(monkeypatch):
+    queries = []
+    doc = {
+        "_id": ObjectId("6553f1a2b3c4d5e6f7a8b9c1"),
+        "crawlJobId": ObjectId("6553f1a2b3c4d5e6f7a8b9c2"),
+        "websiteId": ObjectId(WEBSITE),
+        "eventData": {"title": "Jazz Night"},
+    }
+
+    def find(where):
+        queries.append(where)
+        return FakeCursor([dict(doc), dict(doc)])
+
+    monkeypatch.setattr(event_query, "get_mongo", lambda: {"events": type("C", (), {"find": staticmethod(find)})})
+    cursor = encode_cursor(datetime(2025, 11, 1), "6553f1a2b3c4d5e6f7a8b9c3")
+    events = asyncio.run(find_events({"reviewStatus": "approved"}, 1, cursor))
+    assert events == [{
+        "id": "6553f1a2b3c4d5e6f7a8b9c1",
+        "crawlJobId": "6553f1a2b3c4d5e6f7a8b9c2",
+        "websiteId": WEBSITE,
+        "eventData": {"title": "Jazz Night"},
+    }]
+    assert queries[0]["reviewStatus"] == "approved" and "$or" in queries[0]
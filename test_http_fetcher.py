@@ -0,0 +1,77 @@
+import asyncio
+import httpx
+import pytest
+from app.services import challenge, http_fetcher
+from app.services.challenge import BotChallengeError
+from app.services.http_fetcher import HttpFetchError, escalation_reason, fetch_html
+
+ARTICLE = "<html><body><main><h1>Jazz Night</h1><p>" + "Live jazz with the house trio. " * 20 + "</p></main></body></html>"
+
+
+@pytest.fixture
+def serve(monkeypatch):
+    """Answer the shared client's requests with (status, html, headers)"""
+    monkeypatch.setattr(challenge, "_cooldowns", {})
+
+    def use(status: int, html: str = "", headers: dict | None = None):
+        headers = {"content-type": "text/html; charset=utf-8", **(headers or {})}
+        transport = httpx.MockTransport(lambda request: httpx.Response(status, text=html, headers=headers))
+        monkeypatch.setattr(http_fetcher, "_client", httpx.AsyncClient(transport=transport))
+
+    return use
+
+
+def _fetch():
+    return asyncio.run(fetch_html("https://example.com/e/1"))
+
+
+def test_server_rendered_page_needs_no_browser(serve):
+    serve(200, ARTICLE)
+    assert _fetch() == (ARTICLE, None)
+
+
+@pytest.mark.parametrize("html, reason", [
+    ('<html><body><div id="root"></div><script src="/app.js"></script></body></html>', "empty_root"),
+    ("<html><body><noscript>You need to enable JavaScript</noscript></body></html>", "noscript"),
+    ("<html><body><p>Loading...</p></body></html>", "no_content"),
+])
+def test_js_pages_are_escalated(serve, html, reason):
+    assert escalation_reason(html) == reason
+    serve(200, html)
+    assert _fetch() == (html, reason)
+
+
+def test_passable_challenge_is_escalated(serve):
+    serve(403, "<title>Just a moment...</title>", {"Server": "cloudflare", "cf-mitigated": "challenge"})
+    assert _fetch()[1] == "challenge"
+
+
+def test_hard_block_fails_fast(serve):
+    serve(403, "", {"X-DataDome": "protected"})
+    with pytest.raises(BotChallengeError):
+        _fetch()
+    assert "example.com" in challenge._cooldowns
+
+
+@pytest.mark.parametrize("status", [404, 429, 503])
+def test_error_status(serve, status):
+    serve(status, ARTICLE)
+    with pytest.raises(HttpFetchError) as error:
+        _fetch()
+    assert error.value.status_code == status
+
+
+def test_non_html_content(serve):
+    serve(200, "%PDF-1.7", {"content-type": "application/pdf"})
+    with pytest.raises(HttpFetchError, match="Unexpected content type"):
+        _fetch()
+
+
+def test_transport_error(monkeypatch):
+    def refuse(request):
+        raise httpx.ConnectError("connection refused")
+
+    monkeypatch.setattr(http_fetcher, "_client", httpx.AsyncClient(transport=httpx.MockTransport(refuse)))
+    with pytest.raises(HttpFetchError) as error:
+        _fetch()
+    assert error.value.status_code is None
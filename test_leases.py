@@ -0,0 +1,221 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+from app.services import leases
+from app.services.leases import (
+    WORKER_ID,
+    JobFeeder,
+    claim_job,
+    claim_pending,
+    release_job,
+    release_leases,
+    requeue_expired,
+    requeue_job,
+    update_leased,
+)
+from app.services.scheduler import QueueFullError
+
+_OPERATORS = {
+    "lt": lambda value, bound: value is not None and value < bound,
+    "gt": lambda value, bound: value is not None and value > bound,
+    "gte": lambda value, bound: value is not None and value >= bound,
+    "in": lambda value, options: value in options,
+    "not_in": lambda value, options: value not in options,
+}
+
+
+def _matches(job, where: dict) -> bool:
+    for name, condition in where.items():
+        if name == "NOT":
+            conditions = condition if isinstance(condition, list) else [condition]
+            if any(_matches(job, c) for c in conditions):
+                return False
+        elif isinstance(condition, dict):
+            value = getattr(job, name, None)
+            if not all(_OPERATORS[op](value, bound) for op, bound in condition.items()):
+                return False
+        elif getattr(job, name, None) != condition:
+            return False
+    return True
+
+
+class FakeJobs:
+    """In-memory db.crawljob with the filters and updates the lease code uses"""
+
+    def __init__(self, *jobs):
+        self.jobs = {job.id: job for job in jobs}
+        self.polls = 0
+
+    async def find_unique(self, where):
+        return self.jobs.get(where["id"])
+
+    async def find_many(self, where, order, take):
+        self.polls += 1
+        await asyncio.sleep(0)  # a database round trip
+        found = [job for job in self.jobs.values() if _matches(job, where)]
+        return sorted(found, key=lambda job: job.createdAt)[:take]
+
+    async def update_many(self, where, data):
+        found = [job for job in self.jobs.values() if _matches(job, where)]
+        for job in found:
+            for name, value in data.items():
+                if isinstance(value, dict):
+                    value = getattr(job, name) + value.get("increment", 0) - value.get("decrement", 0)
+                setattr(job, name, value)
+        return len(found)
+
+
+def _job(n: int, website: str = "w1", **fields) -> SimpleNamespace:
+    return SimpleNamespace(**{
+        "id": f"job-{n}",
+        "websiteId": website,
+        "url": f"https://{website}.example/{n}",
+        "useJavascript": False,
+        "status": "pending",
+        "attempts": 0,
+        "leaseOwner": None,
+        "leaseExpiresAt": None,
+        "createdAt": datetime(2025, 11, 1) + timedelta(minutes=n),
+        **fields,
+    })
+
+
+@pytest.fixture
+def jobs(monkeypatch):
+    table = FakeJobs()
+    monkeypatch.setattr(leases, "get_db", lambda: SimpleNamespace(crawljob=table))
+    return table
+
+
+def test_requeued_job_waits_out_its_delay(jobs, monkeypatch):
+    monkeypatch.setattr(leases, "JOB_RETRY_DELAY", 60)
+    jobs.jobs = {"job-1": _job(1)}
+
+    async def run():
+        assert await claim_job("job-1")
+        assert await requeue_job("job-1")
+        return await claim_pending(5)
+
+    assert asyncio.run(run()) == []
+    job = jobs.jobs["job-1"]
+    assert job.status == "pending" and job.leaseOwner is None
+    assert job.retryAfter > datetime.utcnow() + timedelta(seconds=50)
+
+    # Once the delay is over the job is claimed again
+    job.retryAfter = datetime.utcnow() - timedelta(seconds=1)
+    assert [claimed.id for claimed in asyncio.run(claim_pending(5))] == ["job-1"]
+    assert job.attempts == 2
+
+
+def test_requeue_delay_doubles_per_attempt(jobs, monkeypatch):
+    monkeypatch.setattr(leases, "JOB_RETRY_DELAY", 60)
+    monkeypatch.setattr(leases, "MAX_JOB_ATTEMPTS", 5)
+    jobs.jobs = {"job-1": _job(1, status="processing", leaseOwner=WORKER_ID, attempts=3)}
+    before = datetime.utcnow()
+    assert asyncio.run(requeue_job("job-1"))
+    assert timedelta(seconds=240) <= jobs.jobs["job-1"].retryAfter - before < timedelta(seconds=250)
+
+
+def test_job_out_of_attempts_is_not_requeued(jobs, monkeypatch):
+    monkeypatch.setattr(leases, "MAX_JOB_ATTEMPTS", 3)
+    jobs.jobs = {"job-1": _job(1, status="processing", leaseOwner=WORKER_ID, attempts=3)}
+    assert not asyncio.run(requeue_job("job-1"))
+    assert jobs.jobs["job-1"].status == "processing"
+
+
+def test_requeue_needs_the_lease(jobs):
+    jobs.jobs = {"job-1": _job(1, status="processing", leaseOwner="other:1", attempts=1)}
+    assert not asyncio.run(requeue_job("job-1"))
+    assert jobs.jobs["job-1"].leaseOwner == "other:1"
+
+
+def test_claim_is_compare_and_set(jobs):
+    jobs.jobs = {"job-1": _job(1)}
+
+    async def run():
+        return await claim_job("job-1"), await claim_job("job-1")
+
+    assert asyncio.run(run()) == (True, False)
+    job = jobs.jobs["job-1"]
+    assert job.status == "processing" and job.leaseOwner == WORKER_ID
+    assert job.attempts == 1
+
+
+def test_claim_pending_caps_each_website(jobs):
+    jobs.jobs = {job.id: job for job in [_job(1, "busy"), _job(2, "busy"), _job(3, "busy"), _job(4, "other")]}
+    claimed = asyncio.run(claim_pending(3, per_website=2))
+    assert [job.id for job in claimed] == ["job-1", "job-2", "job-4"]
+
+    # A website already at its limit here gets nothing
+    for job in jobs.jobs.values():
+        job.status = "pending"
+    claimed = asyncio.run(claim_pending(3, {"busy": 2}, per_website=2))
+    assert [job.id for job in claimed] == ["job-4"]
+
+
+def test_writes_are_fenced_by_the_lease(jobs):
+    jobs.jobs = {"job-1": _job(1, status="processing", leaseOwner="other:1")}
+    assert not asyncio.run(update_leased("job-1", {"status": "completed"}))
+    assert jobs.jobs["job-1"].status == "processing"
+
+    jobs.jobs["job-1"].leaseOwner = WORKER_ID
+    assert asyncio.run(update_leased("job-1", {"status": "completed"}))
+    assert jobs.jobs["job-1"].status == "completed"
+
+
+def test_expired_leases_are_requeued_or_failed(jobs, monkeypatch):
+    monkeypatch.setattr(leases, "MAX_JOB_ATTEMPTS", 3)
+    expired = datetime.utcnow() - timedelta(seconds=1)
+    live = datetime.utcnow() + timedelta(seconds=60)
+    jobs.jobs = {job.id: job for job in [
+        _job(1, status="processing", leaseOwner="dead:1", leaseExpiresAt=expired, attempts=1),
+        _job(2, status="processing", leaseOwner="dead:1", leaseExpiresAt=expired, attempts=3),
+        _job(3, status="processing", leaseOwner="live:1", leaseExpiresAt=live, attempts=1),
+    ]}
+    assert asyncio.run(requeue_expired()) == 1
+    assert jobs.jobs["job-1"].status == "pending" and jobs.jobs["job-1"].leaseOwner is None
+    assert jobs.jobs["job-2"].status == "failed"
+    assert jobs.jobs["job-3"].status == "processing"
+
+
+def test_released_jobs_get_their_attempt_back(jobs):
+    jobs.jobs = {job.id: job for job in [_job(1), _job(2)]}
+
+    async def run():
+        await claim_job("job-1")
+        await claim_job("job-2")
+        await release_job("job-1")
+        return await release_leases()
+
+    assert asyncio.run(run()) == 1
+    for job in jobs.jobs.values():
+        assert job.status == "pending" and job.attempts == 0
+
+
+def test_feeder_hands_back_jobs_the_scheduler_refuses(jobs):
+    jobs.jobs = {"job-1": _job(1)}
+
+    def submit(task):
+        raise QueueFullError("Crawl queue is full")
+
+    full = SimpleNamespace(
+        running=0, pending=0, parked=0, concurrency=2, per_website=0,
+        capacity=lambda: 2, website_load=lambda: {}, submit=submit,
+    )
+
+    async def run():
+        feeder = JobFeeder(full, poll_interval=0.01)
+        loop = asyncio.create_task(feeder._claim_loop())
+        await asyncio.sleep(0.05)
+        loop.cancel()
+        await asyncio.gather(loop, return_exceptions=True)
+        return feeder
+
+    feeder = asyncio.run(run())
+    job = jobs.jobs["job-1"]
+    # Bounced on every poll, yet no attempt was used up
+    assert job.status == "pending" and job.attempts == 0
+    # and the feeder waits between polls instead of spinning
+    assert 1 <= jobs.polls <= 10
+    assert feeder.stats["claimed"] == 0
@@ -0,0 +1,121 @@
+import asyncio
+import json
+import pytest
+from app.services import listing
+from app.services.content import CHARS_PER_TOKEN, chunk_page, reduce_page
+from app.services.listing import dedupe_events, map_listing
+from app.services.llm_client import LLMRateLimitError
+
+STRUCTURE = {"title": "string", "start_date": "datetime", "venue": "string"}
+
+
+def _listing_page(events: int) -> str:
+    items = [
+        {"@type": "ListItem", "item": {"@type": "Event", "name": f"Show {n}", "startDate": f"2025-11-{n + 1:02d}T20:00"}}
+        for n in range(events)
+    ]
+    ld = {"@context": "https://schema.org", "@type": "ItemList", "itemListElement": items}
+    body = "".join(
+        f"<h2>Show {n}</h2><p>Evening {n} of the autumn programme with guest artist number {n}.</p>"
+        for n in range(events)
+    )
+    return (
+        '<html><head><meta property="og:site_name" content="Blue Room">'
+        f'<script type="application/ld+json">{json.dumps(ld)}</script></head>'
+        f"<body><main>{body}</main></body></html>"
+    )
+
+
+def _result(title=None, start=None, venue=None, confidence=80):
+    data = {"title": title, "start_date": start, "venue": venue}
+    return {
+        "event_data": data,
+        "field_confidences": {path: confidence if value else 0 for path, value in data.items()},
+        "notes": "",
+        "tier": "fast",
+    }
+
+
+def test_listing_page_is_counted_and_chunked():
+    page = _listing_page(40)
+    _, stats = reduce_page(page)
+    assert stats["jsonLdEvents"] == 40
+
+    chunks, chunk_stats = chunk_page(page, token_budget=300, max_chunks=50)
+    assert len(chunks) == chunk_stats["chunks"] > 1
+    assert not chunk_stats["chunksTruncated"]
+    for number, chunk in enumerate(chunks, start=1):
+        # Page meta heads every chunk, and each chunk fits its budget
+        assert chunk.startswith("META:\nog:site_name: Blue Room")
+        assert f"(part {number} of {len(chunks)})" in chunk
+        assert len(chunk) <= 300 * CHARS_PER_TOKEN
+    # Every event ends up in some chunk
+    joined = "\n".join(chunks)
+    for n in range(40):
+        assert f'"name":"Show {n}"' in joined
+
+
+def test_chunks_are_capped():
+    chunks, stats = chunk_page(_listing_page(40), token_budget=200, max_chunks=3)
+    assert len(chunks) == 3
+    assert stats["chunksTruncated"]
+
+
+def test_duplicate_events_merge_by_key_fields():
+    results = [
+        _result("Jazz Night", "2025-11-15T20:00", None, 70),
+        # Same event from the overlapping chunk: same minute, different case
+        _result("jazz  night", "2025-11-15T20:00:00Z", "Blue Room", 90),
+        _result("Blues Night", "2025-11-16T20:00", "Blue Room"),
+    ]
+    events = dedupe_events(results, STRUCTURE)
+    assert len(events) == 2
+    jazz = events[0]
+    assert jazz["event_data"]["venue"] == "Blue Room"
+    assert jazz["field_confidences"]["venue"] == 90
+    # The more confident title wins
+    assert jazz["event_data"]["title"] == "jazz  night"
+
+
+def test_fragments_fold_into_the_only_event():
+    results = [
+        _result("Jazz Night", "2025-11-15T20:00"),
+        _result(None, None, "Blue Room"),
+    ]
+    events = dedupe_events(results, STRUCTURE)
+    assert len(events) == 1
+    assert events[0]["event_data"]["venue"] == "Blue Room"
+
+
+def test_fragments_are_dropped_on_listings():
+    results = [
+        _result("Jazz Night", "2025-11-15T20:00"),
+        _result("Blues Night", "2025-11-16T20:00"),
+        _result(None, None, "Blue Room"),
+    ]
+    assert len(dedupe_events(results, STRUCTURE)) == 2
+
+
+def test_map_listing_skips_failed_chunks(monkeypatch):
+    async def fake_map_events(chunk, structure, notes):
+        if chunk == "bad":
+            raise ValueError("bad answer")
+        return [_result(chunk, "2025-11-15T20:00")]
+
+    monkeypatch.setattr(listing, "map_events", fake_map_events)
+    events = asyncio.run(map_listing(["a", "bad", "b"], STRUCTURE))
+    assert sorted(e["event_data"]["title"] for e in events) == ["a", "b"]
+
+    with pytest.raises(ValueError):
+        asyncio.run(map_listing(["bad", "bad"], STRUCTURE))
+
+
+def test_map_listing_requeues_on_rate_limit(monkeypatch):
+    async def fake_map_events(chunk, structure, notes):
+        if chunk == "quota":
+            raise LLMRateLimitError("quota exhausted")
+        return [_result(chunk, "2025-11-15T20:00")]
+
+    monkeypatch.setattr(listing, "map_events", fake_map_events)
+    with pytest.raises(LLMRateLimitError):
+        asyncio.run(map_listing(["a", "quota"], STRUCTURE))
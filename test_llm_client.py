@@ -0,0 +1,131 @@
+import asyncio
+import pytest
+from app.services import llm_client
+from app.services.llm_client import LLMProvider, LLMRateLimitError, LLMRouter, RateLimiter, _Health
+
+
+class QuotaError(Exception):
+    pass
+
+
+class FakeProvider(LLMProvider):
+    """Answers from a script: a text, an exception to raise, or (seconds, text) to answer slowly"""
+
+    _rate_limited = (QuotaError,)
+    _retryable = (QuotaError, asyncio.TimeoutError)
+
+    def __init__(self, name: str, *script, max_retries: int = 0):
+        super().__init__({"fast": f"{name}-fast", "pro": f"{name}-pro"}, rpm=0, tpm=0, max_retries=max_retries)
+        self.name = name
+        self.script = list(script)
+        self.calls = 0
+
+    async def _call(self, model_name, prompt, generation_config):
+        self.calls += 1
+        answer = self.script.pop(0) if len(self.script) > 1 else self.script[0]
+        if isinstance(answer, Exception):
+            raise answer
+        if isinstance(answer, tuple):
+            seconds, answer = answer
+            await asyncio.sleep(seconds)
+        return answer, 10, 5
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(llm_client, "LLM_BACKOFF_BASE", 0)
+
+
+def _router(*providers, hedge=False) -> LLMRouter:
+    router = LLMRouter([], hedge=hedge)
+    router.providers = list(providers)
+    router._health = {provider.name: _Health(provider.name) for provider in providers}
+    return router
+
+
+def test_provider_retries_retryable_errors():
+    async def run():
+        provider = FakeProvider("a", asyncio.TimeoutError(), asyncio.TimeoutError(), "ok", max_retries=2)
+        return await provider.generate("fast", "prompt"), provider
+
+    text, provider = asyncio.run(run())
+    assert text == "ok" and provider.calls == 3
+    stats = provider.snapshot()["models"]["a-fast"]
+    assert (stats["retries"], stats["errors"], stats["output_tokens"]) == (2, 2, 5)
+
+
+def test_provider_raises_other_errors_at_once():
+    async def run():
+        provider = FakeProvider("a", ValueError("bad request"), max_retries=3)
+        with pytest.raises(ValueError):
+            await provider.generate("pro", "prompt")
+        return provider
+
+    assert asyncio.run(run()).calls == 1
+
+
+def test_exhausted_quota_is_reported_as_rate_limit():
+    async def run():
+        with pytest.raises(LLMRateLimitError):
+            await FakeProvider("a", QuotaError("429 quota exceeded")).generate("fast", "prompt")
+
+    asyncio.run(run())
+
+
+def test_failover_to_the_next_provider():
+    async def run():
+        router = _router(FakeProvider("a", ValueError("down")), FakeProvider("b", "from b"))
+        return await router.generate("fast", "prompt"), router
+
+    text, router = asyncio.run(run())
+    assert text == "from b"
+    assert router.snapshot()["failovers"] == 1
+
+
+def test_rate_limit_wins_over_other_errors():
+    async def run():
+        router = _router(FakeProvider("a", QuotaError("quota")), FakeProvider("b", ValueError("down")))
+        await router.generate("fast", "prompt")
+
+    # The job is re-queued rather than failed
+    with pytest.raises(LLMRateLimitError):
+        asyncio.run(run())
+
+
+def test_healthiest_provider_goes_first():
+    router = _router(FakeProvider("a", "x"), FakeProvider("b", "x"), FakeProvider("c", "x"))
+    router._health["a"].record(2.0)
+    router._health["b"].record(0.5)
+    assert [provider.name for provider in router._ranked()] == ["b", "a", "c"]
+
+    # A provider that keeps failing is skipped while its circuit is open
+    for _ in range(llm_client.LLM_PROVIDER_FAILURES):
+        router._health["b"].record(None)
+    assert [provider.name for provider in router._ranked()] == ["a", "c"]
+
+
+def test_slow_call_is_hedged(monkeypatch):
+    monkeypatch.setattr(llm_client, "LLM_HEDGE_DELAY_MS", 20)
+
+    async def run():
+        slow, fast = FakeProvider("slow", (5, "late")), FakeProvider("fast", "quick")
+        router = _router(slow, fast, hedge=True)
+        return await router.generate("fast", "prompt"), router
+
+    text, router = asyncio.run(run())
+    assert text == "quick"
+    stats = router.snapshot()
+    assert (stats["hedges"], stats["hedge_wins"]) == (1, 1)
+
+
+def test_rate_limiter_window():
+    limiter = RateLimiter(rpm=2, tpm=0)
+
+    async def run():
+        await limiter.acquire(100)
+        await limiter.acquire(100)
+
+    asyncio.run(run())
+    # A third request must wait for the window to move on
+    assert limiter._wait_time(llm_client.time.monotonic(), 100) > 50
+    assert limiter.snapshot()["requests_last_minute"] == 2
@@ -0,0 +1,119 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from app.services import lookup_cache
+from app.services.lookup_cache import STRUCTURE, WEBSITES, get_active_structure, get_website, invalidate
+
+STRUCTURE_DOC = {"title": "string", "start_date": "datetime", "venue": {"name": "string"}}
+
+
+class FakeDb:
+    """The eventstructure, targetwebsite and cachegeneration calls of the lookup cache"""
+
+    def __init__(self):
+        self.structure = SimpleNamespace(id="s1", version=1, structure=STRUCTURE_DOC)
+        self.websites = {"w1": SimpleNamespace(id="w1", name="Blue Room")}
+        self.generations = {}
+        self.reads = {"structure": 0, "website": 0}
+        self.eventstructure = SimpleNamespace(find_first=self._find_structure)
+        self.targetwebsite = SimpleNamespace(find_unique=self._find_website)
+        self.cachegeneration = SimpleNamespace(find_many=self._find_generations, upsert=self._bump)
+
+    async def _find_structure(self, where):
+        self.reads["structure"] += 1
+        return self.structure
+
+    async def _find_website(self, where):
+        self.reads["website"] += 1
+        return self.websites.get(where["id"])
+
+    async def _find_generations(self):
+        return [SimpleNamespace(name=name, generation=n) for name, n in self.generations.items()]
+
+    async def _bump(self, where, data):
+        self.generations[where["name"]] = self.generations.get(where["name"], 0) + 1
+        return SimpleNamespace(generation=self.generations[where["name"]])
+
+
+@pytest.fixture
+def db(monkeypatch):
+    fake = FakeDb()
+    monkeypatch.setattr(lookup_cache, "get_db", lambda: fake)
+    monkeypatch.setattr(lookup_cache, "LOOKUP_CACHE_CHECK_SECONDS", 0)
+    monkeypatch.setattr(lookup_cache, "_structure", None)
+    monkeypatch.setattr(lookup_cache, "_websites", {})
+    monkeypatch.setattr(lookup_cache, "_generations", {})
+    monkeypatch.setattr(lookup_cache, "_checked_at", 0.0)
+    monkeypatch.setattr(lookup_cache, "_synced", False)
+    monkeypatch.setattr(lookup_cache, "_epochs", {STRUCTURE: 0, WEBSITES: 0})
+    monkeypatch.setattr(lookup_cache, "_stats", {"hits": 0, "misses": 0, "invalidations": 0})
+    return fake
+
+
+def test_structure_is_loaded_once(db):
+    async def run():
+        return [await get_active_structure() for _ in range(3)]
+
+    first, *rest = asyncio.run(run())
+    assert first.version == 1
+    assert [path for path, _ in first.paths] == ["title", "start_date", "venue.name"]
+    assert all(active is first for active in rest)
+    assert db.reads["structure"] == 1
+    assert lookup_cache.lookup_stats()["hits"] == 2
+
+
+def test_local_invalidation_reloads(db):
+    async def run():
+        await get_active_structure()
+        db.structure = SimpleNamespace(id="s2", version=2, structure=STRUCTURE_DOC)
+        await invalidate(STRUCTURE)
+        return await get_active_structure()
+
+    assert asyncio.run(run()).version == 2
+    assert db.generations == {STRUCTURE: 1}
+
+
+def test_change_in_another_process_is_picked_up(db):
+    async def run():
+        await get_active_structure()
+        # Another process saved a new structure and bumped the generation
+        db.structure = SimpleNamespace(id="s2", version=2, structure=STRUCTURE_DOC)
+        db.generations[STRUCTURE] = 1
+        return await get_active_structure()
+
+    assert asyncio.run(run()).version == 2
+    assert db.reads["structure"] == 2
+
+
+def test_websites_are_cached_but_misses_are_not(db):
+    async def run():
+        await get_website("w1")
+        await get_website("w1")
+        await get_website("gone")
+        await get_website("gone")
+
+    asyncio.run(run())
+    # One read for the cached website, two for the missing one
+    assert db.reads["website"] == 3
+
+
+def test_entries_expire(db, monkeypatch):
+    monkeypatch.setattr(lookup_cache, "LOOKUP_CACHE_TTL", 0)
+
+    async def run():
+        await get_website("w1")
+        await get_website("w1")
+
+    asyncio.run(run())
+    assert db.reads["website"] == 2
+
+
+def test_load_racing_an_invalidation_is_not_kept(db):
+    async def slow_find(where):
+        # The website is edited while its old record is being read
+        await invalidate(WEBSITES)
+        return db.websites.get(where["id"])
+
+    db.targetwebsite.find_unique = slow_find
+    assert asyncio.run(get_website("w1")).name == "Blue Room"
+    assert lookup_cache._websites == {}
@@ -0,0 +1,92 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from app.services import mapping_cache
+from app.services.mapping_cache import cache_key, get_cached, store_cached
+
+RESULT = {"event_data": {"title": "Jazz Night"}, "field_confidences": {"title": 95}, "notes": ""}
+
+
+def test_key_is_stable():
+    assert cache_key("page", 3, "notes") == cache_key("page", 3, "notes")
+    assert len(cache_key("page", 3, "notes")) == 64
+
+
+def test_key_changes_with_each_input():
+    base = cache_key("page", 3, "notes")
+    assert cache_key("page 2", 3, "notes") != base
+    assert cache_key("page", 4, "notes") != base
+    assert cache_key("page", 3, "other notes") != base
+
+
+def test_key_parts_do_not_run_together():
+    assert cache_key("page1", 2, "") != cache_key("page", 12, "")
+    # Missing and empty notes are the same thing
+    assert cache_key("page", 1, None) == cache_key("page", 1, "")
+
+
+class FakeCache:
+    """The db.mappingcache calls used by get_cached/store_cached"""
+
+    def __init__(self):
+        self.rows = {}
+
+    async def find_unique(self, where):
+        return self.rows.get(where["key"])
+
+    async def update(self, where, data):
+        row = self.rows[where["key"]]
+        row.hits += data["hits"]["increment"]
+        row.lastUsedAt = data["lastUsedAt"]
+
+    async def upsert(self, where, data):
+        row = self.rows.get(where["key"])
+        values = data["update"] if row else {**data["create"], "hits": 0}
+        # Prisma hands datetimes back timezone-aware
+        values = {
+            name: value.replace(tzinfo=timezone.utc) if isinstance(value, datetime) and value.tzinfo is None else value
+            for name, value in values.items()
+        }
+        self.rows[where["key"]] = SimpleNamespace(**{**(vars(row) if row else {}), **values})
+
+
+def _fake_db(monkeypatch) -> FakeCache:
+    cache = FakeCache()
+    monkeypatch.setattr(mapping_cache, "get_db", lambda: SimpleNamespace(mappingcache=cache))
+    monkeypatch.setattr(mapping_cache, "_stats", {"hits": 0, "misses": 0, "stores": 0, "evicted": 0})
+    return cache
+
+
+def test_store_then_hit(monkeypatch):
+    cache = _fake_db(monkeypatch)
+    key = cache_key("page", 1, None)
+
+    async def run():
+        assert await get_cached(key) is None
+        await store_cached(key, 1, RESULT, "ai", "fast")
+        return await get_cached(key)
+
+    cached = asyncio.run(run())
+    assert cache.rows[key].expiresAt.tzinfo is not None
+    assert cached == {"result": RESULT, "extraction": "ai", "modelTier": "fast"}
+    assert cache.rows[key].hits == 1
+    assert mapping_cache.cache_stats()["hit_rate"] == 50.0
+
+
+def test_expired_entry_is_a_miss(monkeypatch):
+    cache = _fake_db(monkeypatch)
+    cache.rows["k"] = SimpleNamespace(
+        result=json.dumps(RESULT), extraction="ai", modelTier="fast", hits=0,
+        expiresAt=datetime.now(timezone.utc) - timedelta(minutes=1),
+    )
+    assert asyncio.run(get_cached("k")) is None
+
+
+def test_failing_lookup_is_a_miss(monkeypatch):
+    class Broken:
+        async def find_unique(self, where):
+            raise RuntimeError("database down")
+
+    monkeypatch.setattr(mapping_cache, "get_db", lambda: SimpleNamespace(mappingcache=Broken()))
+    assert asyncio.run(get_cached("k")) is None
@@ -0,0 +1,46 @@
+from datetime import datetime
+from types import SimpleNamespace
+import pytest
+from bson import ObjectId
+from app.services.pagination import after_cursor, after_cursor_mongo, decode_cursor, encode_cursor, paginate
+
+CREATED = datetime(2025, 11, 15, 20, 0, 0, 123000)
+ID = "6553f1a2b3c4d5e6f7a8b9c0"
+
+
+def test_round_trip():
+    cursor = encode_cursor(CREATED, ID)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (CREATED, ID)
+
+
+@pytest.mark.parametrize("cursor", ["", "not a cursor", encode_cursor(CREATED, "not-an-id"), "WyJ4IiwgInkiXQ"])
+def test_invalid_cursor(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor)
+
+
+def test_last_page_has_no_cursor():
+    rows = [{"createdAt": CREATED, "id": ID}]
+    assert paginate(rows, 1) == (rows, None)
+    assert paginate([], 10) == ([], None)
+
+
+def test_cursor_comes_from_the_last_row_served():
+    rows = [SimpleNamespace(createdAt=CREATED, id=str(n) * 24) for n in range(3)]
+    page, cursor = paginate(rows, 2)
+    assert page == rows[:2]
+    assert decode_cursor(cursor) == (CREATED, "1" * 24)
+
+    page, cursor = paginate([vars(row) for row in rows], 2)
+    assert len(page) == 2 and decode_cursor(cursor) == (CREATED, "1" * 24)
+
+
+def test_where_clauses():
+    cursor = encode_cursor(CREATED, ID)
+    assert after_cursor(cursor) == {
+        "OR": [{"createdAt": {"lt": CREATED}}, {"createdAt": CREATED, "id": {"lt": ID}}]
+    }
+    assert after_cursor_mongo(cursor) == {
+        "$or": [{"createdAt": {"$lt": CREATED}}, {"createdAt": CREATED, "_id": {"$lt": ObjectId(ID)}}]
+    }
@@ -0,0 +1,114 @@
+import asyncio
+import pytest
+from app.services import pipeline
+from app.services.leases import LeaseLostError
+from app.services.llm_client import LLMRateLimitError
+from app.services.pipeline import CrawlContext, JobNotClaimed, Stage
+from app.services.scheduler import CrawlTask
+
+
+@pytest.fixture
+def outcomes(monkeypatch):
+    """Record what the stage runner does with each job instead of writing it"""
+    recorded = {"failed": [], "requeued": []}
+    out_of_attempts = set()
+
+    async def fake_fail_job(job_id, error, history=None):
+        recorded["failed"].append((job_id, str(error)))
+
+    async def fake_requeue_job(job_id):
+        if job_id in out_of_attempts:
+            return False
+        recorded["requeued"].append(job_id)
+        return True
+
+    monkeypatch.setattr(pipeline, "fail_job", fake_fail_job)
+    monkeypatch.setattr(pipeline, "requeue_job", fake_requeue_job)
+    return recorded, out_of_attempts
+
+
+def _ctx(n: int = 1) -> CrawlContext:
+    return CrawlContext(CrawlTask(f"job-{n}", "w1", f"https://example.com/{n}"))
+
+
+def _raising(error: Exception):
+    async def handler(ctx):
+        raise error
+    return handler
+
+
+def test_success_is_timed():
+    async def handler(ctx):
+        ctx.content = "done"
+
+    stage = Stage("clean", handler)
+    ctx = _ctx()
+    assert asyncio.run(stage.run(ctx))
+    assert "clean" in ctx.timings
+    assert stage.snapshot()["processed"] == 1
+
+
+def test_failure_is_recorded_on_the_job(outcomes):
+    recorded, _ = outcomes
+    stage = Stage("map", _raising(ValueError("bad answer")))
+    assert not asyncio.run(stage.run(_ctx()))
+    assert recorded["failed"] == [("job-1", "bad answer")]
+    assert stage.snapshot()["failed"] == 1
+
+
+def test_lost_lease_discards_the_result(outcomes):
+    recorded, _ = outcomes
+    stage = Stage("persist", _raising(LeaseLostError("job-1")))
+    assert not asyncio.run(stage.run(_ctx()))
+    assert recorded == {"failed": [], "requeued": []}
+    assert stage.snapshot()["discarded"] == 1
+
+
+def test_job_claimed_elsewhere_is_skipped(outcomes):
+    recorded, _ = outcomes
+    stage = Stage("fetch", _raising(JobNotClaimed("job-1")))
+    assert not asyncio.run(stage.run(_ctx()))
+    assert recorded == {"failed": [], "requeued": []}
+
+
+def test_rate_limit_requeues_until_out_of_attempts(outcomes):
+    recorded, out_of_attempts = outcomes
+    stage = Stage("map", _raising(LLMRateLimitError("quota exhausted")))
+    out_of_attempts.add("job-2")
+
+    async def run():
+        await stage.run(_ctx(1))
+        await stage.run(_ctx(2))
+
+    asyncio.run(run())
+    assert recorded["requeued"] == ["job-1"]
+    assert recorded["failed"] == [("job-2", "quota exhausted")]
+    assert stage.snapshot()["requeued"] == 1
+
+
+def test_jobs_flow_through_queued_stages(outcomes):
+    recorded, _ = outcomes
+    seen = []
+
+    def record(name):
+        async def handler(ctx):
+            if ctx.task.job_id == "job-2" and name == "clean":
+                raise ValueError("challenge page")
+            seen.append((name, ctx.task.job_id))
+        return handler
+
+    async def run():
+        clean = Stage("clean", record("clean"), workers=2, queue_size=2)
+        persist = Stage("persist", record("persist"), workers=1, queue_size=2)
+        clean.next = persist
+        for stage in (clean, persist):
+            stage.start()
+        for n in range(1, 4):
+            await clean.put(_ctx(n))
+        for stage in (clean, persist):
+            await stage.drain(timeout=5)
+
+    asyncio.run(run())
+    # A job failing one stage never reaches the next
+    assert sorted(job for name, job in seen if name == "persist") == ["job-1", "job-3"]
+    assert recorded["failed"] == [("job-2", "challenge page")]
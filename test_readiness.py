@@ -0,0 +1,34 @@
+from app.services.readiness import CONTENT_SELECTORS, build_wait_condition, parse_readiness
+
+
+def test_parse_readiness_markers():
+    html = (
+        '<html data-crawl-ready="stable:1234" data-crawl-selector="%5Bclass*%3D\'event\'%5D">'
+        "<body></body></html>"
+    )
+    assert parse_readiness(html) == ("stable", 1234, "[class*='event']")
+
+
+def test_parse_readiness_without_selector():
+    assert parse_readiness('<html data-crawl-ready="timeout:8000"><body>') == ("timeout", 8000, None)
+
+
+def test_parse_readiness_unprobed_page():
+    assert parse_readiness("<html><body>plain</body></html>") == (None, None, None)
+
+
+def test_wait_condition_thresholds():
+    condition = build_wait_condition(selectors=[".event"], quiet_ms=300, max_wait_ms=5000)
+    assert condition.startswith("js:() =>")
+    assert '[".event"]' in condition
+    assert "now >= 5000" in condition
+    assert "quiet >= 300 && matched" in condition
+    # Without a content selector the page must be quiet four times as long
+    assert "quiet >= 1200" in condition
+    assert 'reason = "challenge"' in condition
+
+
+def test_wait_condition_default_selectors():
+    condition = build_wait_condition()
+    for selector in CONTENT_SELECTORS:
+        assert selector in condition
@@ -0,0 +1,89 @@
+import pytest
+from app.services.response_schema import describe_fields, response_schema, validate_result
+
+STRUCTURE = {
+    "title": "string",
+    "start_date": "datetime",
+    "price": "number",
+    "tags": ["string"],
+    "venue": {"name": "string", "city": "string"},
+}
+
+
+def test_single_schema():
+    schema = response_schema(STRUCTURE)
+    assert schema["type"] == "OBJECT"
+    assert schema["required"] == ["event_data", "field_confidences", "notes"]
+    fields = schema["properties"]["event_data"]["properties"]
+    assert fields["start_date"] == {"type": "STRING", "nullable": True, "description": "ISO 8601 datetime"}
+    assert fields["price"]["type"] == "NUMBER"
+    assert fields["tags"]["items"]["type"] == "STRING"
+    assert sorted(fields["venue"]["required"]) == ["city", "name"]
+    assert "venue.city" in schema["properties"]["field_confidences"]["required"]
+
+
+def test_batch_and_listing_schemas():
+    batch = response_schema(STRUCTURE, "batch")
+    assert batch["type"] == "ARRAY"
+    assert batch["items"]["required"][0] == "page"
+    listing = response_schema(STRUCTURE, "listing")
+    assert listing["type"] == "ARRAY"
+    assert "page" not in listing["items"]["properties"]
+
+
+def test_each_call_returns_a_fresh_copy():
+    schema = response_schema(STRUCTURE)
+    schema["properties"].clear()
+    assert response_schema(STRUCTURE)["properties"]
+
+
+def test_describe_fields():
+    lines = describe_fields(STRUCTURE).splitlines()
+    assert "- start_date: datetime (ISO 8601)" in lines
+    assert "- tags: array of string" in lines
+    assert "- venue.city: string" in lines
+
+
+def test_missing_and_unknown_fields():
+    result = validate_result(
+        {"event_data": {"title": "Jazz Night", "extra": "x"}, "field_confidences": {"title": 90, "price": 95}},
+        STRUCTURE,
+    )
+    assert "extra" not in result["event_data"]
+    assert result["event_data"]["price"] is None
+    assert result["event_data"]["venue"] == {"name": None, "city": None}
+    assert result["field_confidences"]["title"] == 90
+    assert result["field_confidences"]["price"] <= 40
+    assert result["notes"] == ""
+
+
+def test_values_are_converted_and_confidences_clamped():
+    result = validate_result(
+        {
+            "event_data": {"title": 42, "price": "12.5", "tags": "jazz"},
+            "field_confidences": {"title": 150, "price": -5, "tags": "high"},
+        },
+        STRUCTURE,
+    )
+    assert result["event_data"]["title"] == "42"
+    assert result["event_data"]["price"] == 12.5
+    assert result["event_data"]["tags"] == ["jazz"]
+    assert result["field_confidences"]["title"] == 100
+    assert result["field_confidences"]["price"] == 0
+    assert result["field_confidences"]["tags"] == 0
+
+
+def test_type_mismatch_caps_confidence():
+    result = validate_result(
+        {"event_data": {"start_date": "next Friday"}, "field_confidences": {"start_date": 95}, "notes": "ok"},
+        STRUCTURE,
+    )
+    assert result["event_data"]["start_date"] == "next Friday"
+    assert result["field_confidences"]["start_date"] == 40
+    assert result["notes"] == "ok; type mismatch: start_date"
+
+
+@pytest.mark.parametrize("result", [None, [], {"notes": "none"}, {"event_data": "text"}])
+def test_not_a_result(result):
+    with pytest.raises(ValueError):
+        validate_result(result, STRUCTURE)
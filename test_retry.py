@@ -0,0 +1,129 @@
+import asyncio
+import httpx
+import pytest
+from app.services import retry
+from app.services.challenge import BotChallengeError
+from app.services.retry import (
+    BLOCKED,
+    CIRCUIT_OPEN,
+    PERMANENT,
+    TRANSIENT,
+    CircuitBreaker,
+    CircuitOpenError,
+    classify_error,
+    run_with_retries,
+)
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+@pytest.mark.parametrize("error, expected", [
+    (StatusError(503), (TRANSIENT, "http_5xx")),
+    (StatusError(408), (TRANSIENT, "timeout")),
+    (StatusError(429), (TRANSIENT, "rate_limited")),
+    (StatusError(404), (PERMANENT, "not_found")),
+    (StatusError(403), (PERMANENT, "http_4xx")),
+    (httpx.TimeoutException("read timeout"), (TRANSIENT, "timeout")),
+    (Exception("net::ERR_NAME_NOT_RESOLVED at https://x"), (PERMANENT, "dns")),
+    (Exception("net::ERR_CERT_DATE_INVALID"), (PERMANENT, "tls")),
+    (Exception("net::ERR_CONNECTION_RESET"), (TRANSIENT, "connection")),
+    (Exception("Page.goto: Timeout 60000ms exceeded"), (TRANSIENT, "timeout")),
+    (Exception("something odd"), (TRANSIENT, "unknown")),
+    (BotChallengeError("datadome", "https://example.com"), (BLOCKED, "datadome")),
+    (CircuitOpenError("example.com", 10), (CIRCUIT_OPEN, "circuit_open")),
+])
+def test_classify_error(error, expected):
+    assert classify_error(error) == expected
+
+
+def test_breaker_opens_and_probes(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(retry.time, "monotonic", lambda: clock[0])
+    breaker = CircuitBreaker("example.com", threshold=2, open_seconds=30)
+
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    # After the open period a single probe goes through
+    clock[0] += 31
+    breaker.before_call()
+    assert breaker.state == "half_open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    # A failed probe re-opens the circuit, a successful one closes it
+    breaker.record_failure()
+    assert breaker.state == "open"
+    clock[0] += 31
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.failures == 0
+
+
+def test_breaker_release_frees_probe():
+    breaker = CircuitBreaker("example.com", threshold=1, open_seconds=0)
+    breaker.record_failure()
+    breaker.before_call()
+    breaker.release()
+    breaker.before_call()
+    assert breaker.state == "half_open"
+
+
+@pytest.fixture
+def no_wait(monkeypatch):
+    monkeypatch.setattr(retry, "_backoff", lambda attempt: 0)
+    monkeypatch.setattr(retry, "_breakers", {})
+
+
+def test_transient_errors_are_retried(no_wait):
+    calls = []
+
+    async def attempt():
+        calls.append(1)
+        if len(calls) < 3:
+            raise StatusError(503)
+        return "ok"
+
+    history = []
+    assert asyncio.run(run_with_retries("https://a.example/x", attempt, history, max_attempts=3)) == "ok"
+    assert len(calls) == 3
+    assert [h["reason"] for h in history] == ["http_5xx", "http_5xx"]
+
+
+def test_permanent_errors_fail_at_once(no_wait):
+    calls = []
+
+    async def attempt():
+        calls.append(1)
+        raise StatusError(404)
+
+    with pytest.raises(StatusError):
+        asyncio.run(run_with_retries("https://a.example/x", attempt, max_attempts=3))
+    assert len(calls) == 1
+
+
+def test_circuit_opening_mid_retry_keeps_real_error(no_wait, monkeypatch):
+    monkeypatch.setattr(retry, "breaker_for", lambda url: breaker)
+    breaker = CircuitBreaker("a.example", threshold=2, open_seconds=300)
+
+    async def attempt():
+        raise httpx.TimeoutException("read timeout")
+
+    history = []
+    with pytest.raises(httpx.TimeoutException):
+        asyncio.run(run_with_retries("https://a.example/x", attempt, history, max_attempts=5))
+    assert breaker.state == "open"
+    assert len(history) == 2
+
+    # Once open, the next job fails fast with CircuitOpenError
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(run_with_retries("https://a.example/y", attempt, max_attempts=5))
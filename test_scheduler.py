@@ -0,0 +1,113 @@
+import asyncio
+from app.services.scheduler import CrawlScheduler, CrawlTask, QueueFullError
+
+
+def _task(n: int, website: str) -> CrawlTask:
+    return CrawlTask(f"job-{n}", website, f"https://{website}/{n}")
+
+
+def test_per_website_limit():
+    """A busy website's extra jobs wait while other websites' jobs run"""
+    async def run():
+        scheduler = CrawlScheduler(concurrency=4, per_website=1, queue_size=10)
+        running: dict[str, int] = {}
+        peak: dict[str, int] = {}
+        order = []
+
+        async def handler(task: CrawlTask):
+            running[task.website_id] = running.get(task.website_id, 0) + 1
+            peak[task.website_id] = max(peak.get(task.website_id, 0), running[task.website_id])
+            order.append(task.job_id)
+            await asyncio.sleep(0.02)
+            running[task.website_id] -= 1
+
+        scheduler.start(handler)
+        for n in range(3):
+            scheduler.submit(_task(n, "busy.example"))
+        scheduler.submit(_task(9, "other.example"))
+        await asyncio.sleep(0.005)
+        # The other website is not stuck behind the busy one's backlog
+        assert "job-9" in order
+        assert scheduler.parked == 2
+        assert scheduler.website_load() == {"busy.example": 3, "other.example": 1}
+        await scheduler.stop(timeout=5)
+        return peak, order, scheduler
+
+    peak, order, scheduler = asyncio.run(run())
+    assert peak == {"busy.example": 1, "other.example": 1}
+    assert sorted(order) == ["job-0", "job-1", "job-2", "job-9"]
+    assert scheduler.stats["completed"] == 4
+    assert scheduler.website_load() == {}
+
+
+def test_queue_bound():
+    async def run():
+        scheduler = CrawlScheduler(concurrency=1, per_website=1, queue_size=2)
+        gate = asyncio.Event()
+
+        async def handler(task: CrawlTask):
+            await gate.wait()
+
+        scheduler.start(handler)
+        scheduler.submit(_task(0, "a.example"))
+        scheduler.submit(_task(1, "a.example"))
+        assert scheduler.capacity() == 0
+        try:
+            scheduler.submit(_task(2, "a.example"))
+            raise AssertionError("queue accepted a job over its size")
+        except QueueFullError:
+            pass
+        gate.set()
+        await scheduler.stop(timeout=5)
+        return scheduler
+
+    scheduler = asyncio.run(run())
+    assert scheduler.stats["rejected"] == 1
+    assert scheduler.stats["completed"] == 2
+
+
+def test_drain_finishes_queued_jobs():
+    """stop() stops accepting, but jobs already queued still run"""
+    async def run():
+        scheduler = CrawlScheduler(concurrency=2, per_website=2, queue_size=10)
+        done = []
+
+        async def handler(task: CrawlTask):
+            await asyncio.sleep(0.01)
+            done.append(task.job_id)
+
+        scheduler.start(handler)
+        for n in range(5):
+            scheduler.submit(_task(n, "a.example"))
+        await scheduler.stop(timeout=5)
+        try:
+            scheduler.submit(_task(9, "a.example"))
+            raise AssertionError("stopped scheduler accepted a job")
+        except QueueFullError:
+            pass
+        return done, scheduler
+
+    done, scheduler = asyncio.run(run())
+    assert len(done) == 5
+    assert scheduler.pending == 0 and scheduler.running == 0
+
+
+def test_failing_job_does_not_stop_worker():
+    async def run():
+        scheduler = CrawlScheduler(concurrency=1, per_website=1, queue_size=10)
+        done = []
+
+        async def handler(task: CrawlTask):
+            if task.job_id == "job-0":
+                raise RuntimeError("boom")
+            done.append(task.job_id)
+
+        scheduler.start(handler)
+        scheduler.submit(_task(0, "a.example"))
+        scheduler.submit(_task(1, "a.example"))
+        await scheduler.stop(timeout=5)
+        return done, scheduler
+
+    done, scheduler = asyncio.run(run())
+    assert done == ["job-1"]
+    assert scheduler.stats["failed"] == 1
@@ -0,0 +1,94 @@
+import asyncio
+import json
+from types import SimpleNamespace
+from app.services import site_templates
+from app.services.site_templates import apply_template, due_for_audit, learn_fields, record_template
+
+STRUCTURE = {"title": "string", "start_date": "datetime", "venue": "string"}
+PATHS = ["title", "start_date", "venue"]
+
+
+def _page(title: str, start: str, venue: str) -> str:
+    return (
+        '<html><body><div class="event-detail">'
+        f'<h1 class="event-title">{title}</h1>'
+        f'<time class="event-date" datetime="{start}">Friday</time>'
+        f'<p class="venue-name">{venue}</p>'
+        "</div></body></html>"
+    )
+
+
+def _ai(title: str, start: str, venue: str, confidence: int = 95) -> dict:
+    return {
+        "event_data": {"title": title, "start_date": start, "venue": venue},
+        "field_confidences": {path: confidence for path in PATHS},
+    }
+
+
+def _template(fields: dict, hits: int = 0) -> SimpleNamespace:
+    return SimpleNamespace(fields=json.dumps(fields), hits=hits)
+
+
+def _learned() -> dict:
+    fields = {}
+    for title, start in [("Jazz Night", "2025-11-15T20:00"), ("Blues Night", "2025-11-16T20:00")]:
+        learn_fields(fields, _page(title, start, "Blue Room"), STRUCTURE, _ai(title, start, "Blue Room"), PATHS)
+    return fields
+
+
+def test_selectors_are_learned_and_confirmed():
+    fields = _learned()
+    assert set(fields) == set(PATHS)
+    assert all(rule["confirmed"] == 2 for rule in fields.values())
+    assert fields["start_date"]["attr"] == "datetime"
+
+
+def test_unsure_ai_values_teach_nothing():
+    fields = {}
+    page = _page("Jazz Night", "2025-11-15T20:00", "Blue Room")
+    learn_fields(fields, page, STRUCTURE, _ai("Jazz Night", "2025-11-15T20:00", "Blue Room", confidence=60), PATHS)
+    assert fields == {}
+
+
+def test_confirmed_template_extracts_new_pages():
+    template = _template(_learned())
+    page = _page("Folk Evening", "2025-12-01T19:00", "Green Hall")
+    result, missing, failed = apply_template(page, template, STRUCTURE, PATHS)
+    assert result["event_data"] == {"title": "Folk Evening", "start_date": "2025-12-01T19:00:00", "venue": "Green Hall"}
+    assert missing == [] and failed == []
+    assert result["field_confidences"]["title"] == 95
+
+
+def test_unconfirmed_rules_are_not_used():
+    fields = {}
+    page = _page("Jazz Night", "2025-11-15T20:00", "Blue Room")
+    learn_fields(fields, page, STRUCTURE, _ai("Jazz Night", "2025-11-15T20:00", "Blue Room"), PATHS)
+    result, missing, failed = apply_template(page, _template(fields), STRUCTURE, PATHS)
+    assert result["field_confidences"] == {} and missing == PATHS and failed == []
+
+
+def test_redesigned_page_fails_the_selectors():
+    redesign = "<html><body><article><h2>Folk Evening</h2></article></body></html>"
+    result, missing, failed = apply_template(redesign, _template(_learned()), STRUCTURE, PATHS)
+    assert failed == PATHS and missing == PATHS
+
+
+def test_audit_schedule(monkeypatch):
+    monkeypatch.setattr(site_templates, "TEMPLATE_AUDIT_EVERY", 10)
+    assert not due_for_audit(_template({}, hits=0))
+    assert due_for_audit(_template({}, hits=20))
+    assert not due_for_audit(_template({}, hits=21))
+
+
+def test_counters_are_incremented_in_place(monkeypatch):
+    calls = []
+
+    async def upsert(where, data):
+        calls.append(data)
+
+    monkeypatch.setattr(site_templates, "get_db", lambda: SimpleNamespace(sitetemplate=SimpleNamespace(upsert=upsert)))
+    asyncio.run(record_template("w1", 1, _learned(), hit=True))
+    update = calls[0]["update"]
+    assert update["hits"] == {"increment": 1} and update["failures"] == {"increment": 0}
+    assert update["activeFields"] == 3
+    assert calls[0]["create"]["hits"] == 1
@@ -0,0 +1,98 @@
+import json
+from app.services.structured_data import extract_structured, find_event_data, merge_results, sub_structure
+
+STRUCTURE = {
+    "title": "string",
+    "start_date": "datetime",
+    "price": "string",
+    "location": {"name": "string", "city": "string"},
+    "performers": "array",
+    "description": "text",
+}
+
+EVENT_LD = {
+    "@context": "https://schema.org",
+    "@type": "MusicEvent",
+    "name": "Jazz Night",
+    "startDate": "2025-11-15T20:00:00Z",
+    "location": {"@type": "Place", "name": "Blue Room", "address": {"addressLocality": "Springfield"}},
+    "offers": {"@type": "Offer", "price": "12.50", "priceCurrency": "USD"},
+    "performer": [{"@type": "Person", "name": "Ann"}, {"@type": "Person", "name": "Bo"}],
+    "eventStatus": "https://schema.org/EventScheduled",
+}
+
+
+def _page(*blocks: str) -> str:
+    return "<html><head>" + "".join(blocks) + "</head><body><h1>Jazz Night</h1></body></html>"
+
+
+def _ld(data) -> str:
+    return f'<script type="application/ld+json">{json.dumps(data)}</script>'
+
+
+def test_json_ld_maps_onto_the_structure():
+    result, missing = extract_structured(_page(_ld(EVENT_LD)), STRUCTURE)
+    data = result["event_data"]
+    assert data["title"] == "Jazz Night"
+    assert data["start_date"] == "2025-11-15T20:00:00+00:00"
+    assert data["location"] == {"name": "Blue Room", "city": "Springfield"}
+    assert data["price"] == "$12.5"
+    assert data["performers"] == ["Ann", "Bo"]
+    assert missing == ["description"]
+    assert result["field_confidences"]["title"] == 95
+    # Assembled values score a little lower
+    assert result["field_confidences"]["price"] == 90
+    assert "json-ld" in result["notes"] and "not found: description" in result["notes"]
+
+
+def test_json_ld_beats_opengraph():
+    og = '<meta property="og:title" content="Jazz Night | Blue Room"><meta property="og:description" content="Live jazz">'
+    values, sources = find_event_data(_page(og, _ld(EVENT_LD)))
+    assert values["name"] == "Jazz Night" and sources["name"] == "json-ld"
+    assert values["description"] == "Live jazz" and sources["description"] == "opengraph"
+
+
+def test_event_inside_a_graph():
+    graph = {"@context": "https://schema.org", "@graph": [{"@type": "WebPage", "name": "Home"}, EVENT_LD]}
+    values, _ = find_event_data(_page(_ld(graph)))
+    assert values["name"] == "Jazz Night"
+
+
+def test_microdata():
+    html = (
+        '<div itemscope itemtype="https://schema.org/Event">'
+        '<span itemprop="name">Poetry Slam</span>'
+        '<time itemprop="startDate" datetime="2025-12-01T19:30">Dec 1</time>'
+        "</div>"
+    )
+    result, _ = extract_structured(html, STRUCTURE)
+    assert result["event_data"]["title"] == "Poetry Slam"
+    assert result["field_confidences"]["title"] == 90
+
+
+def test_page_without_event_data():
+    result, missing = extract_structured("<html><body><p>Nothing here</p></body></html>", STRUCTURE)
+    assert result["field_confidences"] == {}
+    assert len(missing) == 7
+
+
+def test_free_and_broken_values():
+    event = {**EVENT_LD, "startDate": "next Friday", "offers": {"price": "0", "priceCurrency": "EUR"}}
+    result, missing = extract_structured(_page(_ld(event)), STRUCTURE)
+    assert result["event_data"]["price"] == "Free"
+    assert "start_date" in missing
+
+
+def test_merge_fills_only_the_missing_paths():
+    base, missing = extract_structured(_page(_ld(EVENT_LD)), STRUCTURE)
+    assert sub_structure(STRUCTURE, missing) == {"description": "text"}
+    ai = {
+        "event_data": {"title": "Wrong", "description": "An evening of jazz"},
+        "field_confidences": {"title": 50, "description": 85},
+        "notes": "from AI",
+    }
+    merged = merge_results(base, ai, missing)
+    assert merged["event_data"]["title"] == "Jazz Night"
+    assert merged["event_data"]["description"] == "An evening of jazz"
+    assert merged["field_confidences"]["description"] == 85
+    assert merged["notes"].endswith("; from AI")